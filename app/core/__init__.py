@@ -1,18 +1,35 @@
 from .client import init_gateway_client, shutdown_gateway_client
 from .config import get_settings
+from .deadline import DeadlineExceeded, deadline_scope
 from .decorators import log_and_catch, route_handler
-from .dependencies import check_api_key, get_gateway_service
+from .dependencies import check_api_key, get_gateway_service, limit_client
+from .etag import etag_json_response
+from .json_codec import CodecJSONResponse
 from .logger_setup import logger
+from .loop_monitor import start_loop_monitor, stop_loop_monitor
+from .memory import start_memory_monitor, stop_memory_monitor
 from .notifier import send_telegram_alert
+from .offload import start_cpu_offload, stop_cpu_offload
 
 __all__ = [
-    "get_settings",
-    "logger",
-    "init_gateway_client",
-    "shutdown_gateway_client",
+    "CodecJSONResponse",
+    "DeadlineExceeded",
     "check_api_key",
+    "deadline_scope",
+    "etag_json_response",
     "get_gateway_service",
-    "route_handler",
+    "get_settings",
+    "init_gateway_client",
+    "limit_client",
     "log_and_catch",
+    "logger",
+    "route_handler",
     "send_telegram_alert",
+    "shutdown_gateway_client",
+    "start_cpu_offload",
+    "start_loop_monitor",
+    "start_memory_monitor",
+    "stop_cpu_offload",
+    "stop_loop_monitor",
+    "stop_memory_monitor",
 ]
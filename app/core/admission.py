@@ -0,0 +1,157 @@
+"""
+Контроль допуска входящих запросов: сброс лишней нагрузки на входе в воркер.
+
+Когда шлюз замедляется, запросы копятся в воркере, пока клиенты не отвалятся по таймауту, а
+шлюз тем временем тратит время на ответы, которых уже никто не ждет. Поэтому у каждого класса
+маршрутов (search, enrich, jobs, health — ADMISSION_LIMITS) есть предел одновременно
+обрабатываемых запросов и ограниченная очередь ожидания:
+
+- свободный слот — запрос обрабатывается сразу;
+- очередь заполнена — сразу 503 с Retry-After (reason=queue_full);
+- запрос прождал в очереди дольше порога класса — 503 с Retry-After (reason=timeout): пока он
+  ждал, клиент, скорее всего, уже сдался, и ходить за него в шлюз незачем.
+
+Очередь обслуживается по порядку, слот освобождается, когда ответ отправлен целиком (для
+потоковых ответов — после последней строки). Маршруты вне классов (/metrics, /debug,
+документация) не ограничиваются. Постановка и опрос заданий (jobs) — отдельный класс: они
+должны отвечать сразу и тогда, когда слоты синхронного обогащения заняты. Лимиты действуют
+в пределах одного воркера gunicorn.
+"""
+
+import asyncio
+import time
+from collections import deque
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.config import get_settings
+from app.core.json_codec import CodecJSONResponse
+from app.core.metrics import (
+    ADMISSION_IN_FLIGHT,
+    ADMISSION_QUEUE,
+    ADMISSION_QUEUE_WAIT_SECONDS,
+    ADMISSION_SHED,
+)
+
+settings = get_settings()
+
+# Путь (с вложенными путями) -> класс маршрутов
+ROUTE_CLASSES = (
+    ("/extension/search", "search"),
+    ("/extension/enrich-data", "enrich"),
+    ("/extension/enrich-jobs", "jobs"),
+    ("/health", "health"),
+)
+
+
+def route_class(path: str) -> str | None:
+    for prefix, name in ROUTE_CLASSES:
+        # Сравнение по целым сегментам пути: /extension/search не захватывает /extension/searchx
+        if path == prefix or path.startswith(prefix + "/"):
+            return name
+    return None
+
+
+class AdmissionGate:
+    """Слоты одновременной обработки одного класса маршрутов с ограниченной очередью."""
+
+    def __init__(self, name: str, limit: int, queue_size: int, max_wait: float):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self._in_use = 0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    @property
+    def in_use(self) -> int:
+        return self._in_use
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> str | None:
+        """Занимает слот (освобождать через release); иначе возвращает причину отказа."""
+        if self._in_use < self.limit and not self._waiters:
+            self._take()
+            return None
+        if len(self._waiters) >= self.queue_size:
+            return "queue_full"
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        ADMISSION_QUEUE.labels(route_class=self.name).inc()
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(future, self.max_wait)
+            return None
+        except TimeoutError:
+            self._discard(future)
+            return "timeout"
+        except BaseException:
+            if future.done() and not future.cancelled():
+                # Слот успели передать нам в момент отмены — возвращаем его следующему
+                self.release()
+            else:
+                self._discard(future)
+            raise
+        finally:
+            ADMISSION_QUEUE.labels(route_class=self.name).dec()
+            ADMISSION_QUEUE_WAIT_SECONDS.labels(route_class=self.name).observe(
+                time.perf_counter() - started
+            )
+
+    def _take(self) -> None:
+        self._in_use += 1
+        ADMISSION_IN_FLIGHT.labels(route_class=self.name).inc()
+
+    def release(self) -> None:
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                # Слот переходит ожидающему, счетчик занятых не меняется
+                future.set_result(None)
+                return
+        self._in_use -= 1
+        ADMISSION_IN_FLIGHT.labels(route_class=self.name).dec()
+
+    def _discard(self, future: asyncio.Future) -> None:
+        try:
+            self._waiters.remove(future)
+        except ValueError:
+            pass
+
+
+class AdmissionMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.gates = {
+            name: AdmissionGate(name, limit, queue_size, max_wait)
+            for name, (limit, queue_size, max_wait) in settings.admission_limits.items()
+        }
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # Предзапросы CORS ничего не стоят и не должны получать 503 вместо заголовков
+        if scope["type"] != "http" or scope.get("method") == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+        gate = self.gates.get(route_class(scope.get("path", "")))
+        if gate is None:
+            await self.app(scope, receive, send)
+            return
+
+        reason = await gate.acquire()
+        if reason is not None:
+            ADMISSION_SHED.labels(route_class=gate.name, reason=reason).inc()
+            response = CodecJSONResponse(
+                status_code=503,
+                content={"detail": "Сервис перегружен, повторите позже"},
+                headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER)},
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release()
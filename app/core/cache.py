@@ -0,0 +1,72 @@
+"""
+Простой in-memory кэш с временем жизни записей.
+
+Живет в памяти конкретного воркера gunicorn, между воркерами не разделяется.
+Не потокобезопасен — рассчитан на использование из одного event loop.
+"""
+
+import time
+from collections import OrderedDict
+from collections.abc import Hashable, Iterator
+from typing import Any
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Кэш с ограничением по времени жизни (ttl, секунды) и по количеству записей (maxsize).
+
+    При переполнении вытесняются самые старые по времени записи.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING:
+            return default
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return default
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        self._data.pop(key, None)
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._evict()
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[1]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def items(self) -> Iterator[tuple[Hashable, Any]]:
+        """Итерирует по живым (не истекшим) записям."""
+        now = time.monotonic()
+        for key, (expires_at, value) in list(self._data.items()):
+            if expires_at > now:
+                yield key, value
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        # Сначала выбрасываем истекшие записи, затем — самые старые, если все еще тесно
+        if len(self._data) > self.maxsize:
+            for key in [k for k, (exp, _) in self._data.items() if exp <= now]:
+                del self._data[key]
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
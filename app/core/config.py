@@ -1,5 +1,4 @@
 from functools import lru_cache
-from typing import Optional
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -9,17 +8,133 @@ class Settings(BaseSettings):
     GATEWAY_URL: str
     GATEWAY_REQUEST_ENDPOINT: str
     REQUEST_TIMEOUT: float = 30.0
+    # Пакетная отправка вызовов в шлюз: вызовы, сделанные в пределах окна (мс), уходят одним
+    # POST {"batch": [...]}. Если шлюз пакеты не поддерживает, вызовы идут по одному, а
+    # поддержка перепроверяется через GATEWAY_BATCH_RECHECK_INTERVAL (сек)
+    GATEWAY_BATCH_ENABLED: bool = False
+    GATEWAY_BATCH_WINDOW_MS: float = 5
+    GATEWAY_BATCH_MAX_SIZE: int = 16
+    GATEWAY_BATCH_RECHECK_INTERVAL: int = 600
+    # Фоновая проверка шлюза для /health: период и таймаут проверки (сек), число неудач подряд,
+    # после которого шлюз считается недоступным, и предел очереди вызовов к шлюзу для /health/ready
+    GATEWAY_PROBE_ENABLED: bool = True
+    GATEWAY_PROBE_INTERVAL: float = 15
+    GATEWAY_PROBE_TIMEOUT: float = 5
+    GATEWAY_PROBE_FAILURE_THRESHOLD: int = 3
+    HEALTH_READY_MAX_GATEWAY_QUEUE: int = 64
+    # Журнал медленных вызовов (/debug/slow-calls): пороги (мс) для вызова шлюза и обогащения,
+    # размер кольцевого буфера и необязательный файл NDJSON для записей
+    SLOW_CALLS_ENABLED: bool = True
+    SLOW_GATEWAY_CALL_MS: float = 2000
+    SLOW_ENRICH_MS: float = 5000
+    SLOW_CALLS_CAPACITY: int = 500
+    SLOW_CALLS_SPILL_PATH: str = ""
+    # Ключ HMAC для отпечатков запросов в журнале: с ним отпечатки совпадают между воркерами и
+    # перезапусками; без него ключ случайный в каждом процессе
+    SLOW_CALLS_FINGERPRINT_KEY: str = ""
+    # Профилирование запросов (cProfile): по заголовку X-Profile с X-API-KEY или случайно с долей
+    # PROFILE_SAMPLE_RATE; профили хранятся в PROFILE_DIR, не больше PROFILE_MAX_FILES файлов
+    PROFILE_ENABLED: bool = True
+    PROFILE_SAMPLE_RATE: float = 0.0
+    PROFILE_DIR: str = "data/profiles"
+    PROFILE_MAX_FILES: int = 50
+    # Диагностика памяти: период обновления метрик RSS и кучи (сек, 0 — выключено) и число
+    # хранимых снимков tracemalloc
+    MEMORY_GAUGE_INTERVAL: float = 30
+    MEMORY_MAX_SNAPSHOTS: int = 5
+    # Вынос CPU-тяжелого разбора (шаблон эпикриза) из цикла событий: пул thread, process или off,
+    # число воркеров пула и размер входа (байт), начиная с которого разбор уходит в пул
+    CPU_OFFLOAD_EXECUTOR: str = "thread"
+    CPU_OFFLOAD_WORKERS: int = 2
+    CPU_OFFLOAD_MIN_BYTES: int = 64 * 1024
+    # Кэш ответов шлюза для редко меняющихся данных: методы и время свежести (c.m=сек через
+    # запятую); после него запись отдается сразу с фоновым обновлением еще STALE_WHILE_REVALIDATE
+    # секунд, а при недоступности шлюза — еще STALE_IF_ERROR секунд с отметкой stale
+    GATEWAY_CACHE_ENABLED: bool = True
+    GATEWAY_CACHE_METHODS: str = (
+        "Org.getOrgList=3600,Common.loadPersonData=300,EvnSection.loadEvnSectionGrid=120"
+    )
+    GATEWAY_CACHE_STALE_WHILE_REVALIDATE: float = 60
+    GATEWAY_CACHE_STALE_IF_ERROR: float = 1800
+    GATEWAY_CACHE_MAX_ENTRIES: int = 5000
+    # Допуск входящих запросов по классам маршрутов: класс=одновременно/очередь/ожидание мс через
+    # запятую. Сверх очереди и после ожидания дольше порога запрос получает 503 с Retry-After (сек)
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_LIMITS: str = (
+        "search=16/32/3000,enrich=8/16/5000,jobs=32/64/1000,health=4/8/1000"
+    )
+    ADMISSION_RETRY_AFTER: int = 2
+    # Монитор цикла событий: период пульса (сек) для гистограммы задержки и порог блокировки (мс),
+    # после которого в лог пишется стек занятого цикла событий с маршрутом и методом шлюза
+    LOOP_MONITOR_ENABLED: bool = True
+    LOOP_LAG_INTERVAL: float = 0.1
+    LOOP_STALL_THRESHOLD_MS: float = 200
 
     LOGS_LEVEL: str = "DEBUG"
 
     CORS_ALLOW_REGEX: str = r"^chrome-extension://[a-z]{32}$"
 
+    # Сжатие JSON-ответов расширению (gzip, brotli — если установлен) от указанного размера, байт
+    RESPONSE_COMPRESSION_MIN_SIZE: int = 1024
+
     MO_REGISTRY_NUMBER: str
     LPU_ID: str
     KSG_YEAR: str
     SEARCH_PERIOD_START_DATE: str
     SEARCH_PAY_TYPE_ID: str
     SEARCH_LPU_DIVISION_CIDS: str
+    # Потоковый разбор ответа Search.searchData (строки читаются по одной, без буферизации тела)
+    SEARCH_STREAM_PARSE: bool = True
+    # Оставлять в строках поиска только поля, которые использует расширение
+    SEARCH_ROW_PROJECTION: bool = True
+    # Постраничная выдача /extension/search: размер страницы по умолчанию и время жизни курсора (сек)
+    SEARCH_PAGE_SIZE: int = 50
+    SEARCH_CURSOR_TTL: int = 300
+    # Кэш результатов поиска по подразделениям (сек); суженные диапазоны дат фильтруются из кэша
+    SEARCH_CACHE_ENABLED: bool = True
+    SEARCH_CACHE_TTL: int = 120
+    # Деление диапазона поиска на календарные месяцы: шарды запрашиваются параллельно,
+    # закрытые месяцы кэшируются надолго (сек), в шлюз ходит в основном текущий месяц.
+    # По умолчанию выключено: кэш ведется по фамилии, а фамилии редко ищут повторно, поэтому
+    # первый поиск по полному диапазону стоит по вызову шлюза на каждый месяц с
+    # SEARCH_PERIOD_START_DATE на подразделение вместо одного. Включать, когда одни и те же
+    # фамилии ищут много раз за SEARCH_CLOSED_MONTH_CACHE_TTL
+    SEARCH_MONTH_SHARDING: bool = False
+    SEARCH_CLOSED_MONTH_CACHE_TTL: int = 21600
+    SEARCH_SHARD_CONCURRENCY: int = 6
+    # Окна прогрессивного поиска в днях до сегодня (через запятую), после них — полный диапазон
+    SEARCH_PROGRESSIVE_WINDOWS: str = "14,90,365"
+    # Локальный индекс госпитализаций: окно последних выписок (дн.) и период обновления (сек).
+    # Из шлюза индекс строит один воркер gunicorn (блокировка <снимок>.lock) и сохраняет снимок,
+    # остальные воркеры загружают его. Пустой путь снимка — каждый воркер строит свой индекс,
+    # и нагрузка на шлюз растет кратно числу воркеров
+    SEARCH_INDEX_ENABLED: bool = False
+    SEARCH_INDEX_WINDOW_DAYS: int = 30
+    SEARCH_INDEX_REFRESH_INTERVAL: int = 600
+    SEARCH_INDEX_SNAPSHOT_PATH: str = "data/search_index.json.z"
+
+    # Постоянное хранилище итогов обогащения выписанных случаев (SQLite)
+    ENRICH_STORE_ENABLED: bool = True
+    ENRICH_STORE_PATH: str = "data/enrich_store.sqlite3"
+    ENRICH_STORE_MAX_AGE_DAYS: int = 30
+    # Бюджет времени на обогащение (сек): значение по умолчанию и верхняя граница для
+    # deadline_ms из запроса. По истечении необязательные части отбрасываются (partial)
+    ENRICH_DEADLINE_SECONDS: float = 20.0
+    # Очередь заданий на обогащение (SQLite): число воркеров в каждом процессе, период опроса
+    # очереди (сек), время хранения готовых результатов (сек) и число попыток после сбоя воркера
+    ENRICH_JOBS_ENABLED: bool = True
+    ENRICH_JOBS_PATH: str = "data/enrich_jobs.sqlite3"
+    ENRICH_JOBS_WORKERS: int = 4
+    ENRICH_JOBS_POLL_INTERVAL: float = 1.0
+    ENRICH_JOBS_RESULT_TTL: int = 3600
+    ENRICH_JOBS_MAX_ATTEMPTS: int = 3
+    # Справедливость между клиентами: токен-бакет на клиента для /extension (запросов в секунду
+    # и запас) и число одновременных вызовов шлюза на процесс, которые раздаются ожидающим
+    # клиентам по кругу (0 — без ограничения)
+    CLIENT_RATE_LIMIT_ENABLED: bool = True
+    CLIENT_RATE_PER_SECOND: float = 5.0
+    CLIENT_RATE_BURST: int = 20
+    GATEWAY_FAIR_SLOTS: int = 32
 
     EKO_DIVISION_ID: str
     EKO_DEPARTMENT_ID: str
@@ -30,22 +145,55 @@ class Settings(BaseSettings):
     DEBUG_HTTP: bool
     LOGS_LEVEL: str
 
-    TELEGRAM_BOT_TOKEN: Optional[str] = None
-    TELEGRAM_CHAT_ID: Optional[str] = None
+    TELEGRAM_BOT_TOKEN: str | None = None
+    TELEGRAM_CHAT_ID: str | None = None
 
     model_config = SettingsConfigDict(
-        env_file=".env",
-        env_file_encoding="utf-8",
-        extra="ignore"
+        env_file=".env", env_file_encoding="utf-8", extra="ignore"
     )
 
     @property
     def lpu_building_cids_list(self) -> list[str]:
         if not self.SEARCH_LPU_DIVISION_CIDS:
             return []
-        return [cid.strip() for cid in self.SEARCH_LPU_DIVISION_CIDS.split(',') if cid.strip()]
+        return [
+            cid.strip()
+            for cid in self.SEARCH_LPU_DIVISION_CIDS.split(",")
+            if cid.strip()
+        ]
+
+    @property
+    def gateway_cache_ttls(self) -> dict[str, float]:
+        ttls = {}
+        for item in self.GATEWAY_CACHE_METHODS.split(","):
+            method, _, ttl = item.partition("=")
+            if method.strip() and ttl.strip():
+                ttls[method.strip()] = float(ttl)
+        return ttls
+
+    @property
+    def admission_limits(self) -> dict[str, tuple[int, int, float]]:
+        limits = {}
+        for item in self.ADMISSION_LIMITS.split(","):
+            route_class, _, value = item.partition("=")
+            if route_class.strip() and value.strip():
+                in_flight, queue, wait_ms = value.split("/")
+                limits[route_class.strip()] = (
+                    int(in_flight),
+                    int(queue),
+                    float(wait_ms) / 1000,
+                )
+        return limits
+
+    @property
+    def progressive_windows_list(self) -> list[int]:
+        return sorted(
+            int(days)
+            for days in self.SEARCH_PROGRESSIVE_WINDOWS.split(",")
+            if days.strip()
+        )
 
 
 @lru_cache
 def get_settings() -> Settings:
-    return Settings()  # noqa
+    return Settings()
@@ -0,0 +1,50 @@
+"""
+Сквозной бюджет времени (дедлайн) на обработку запроса.
+
+Дедлайн задается на входе в роут через deadline_scope() и хранится в contextvar, поэтому
+без явной передачи доходит до каждого make_request, в том числе в задачах, созданных
+внутри запроса. Таймаут каждого вызова шлюза — это min(REQUEST_TIMEOUT, остаток бюджета),
+то есть он сжимается по мере расходования бюджета.
+"""
+
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_deadline: ContextVar[float | None] = ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Бюджет времени запроса исчерпан."""
+
+
+@contextmanager
+def deadline_scope(seconds: float | None) -> Iterator[None]:
+    """Устанавливает дедлайн через seconds секунд на время блока (None — без дедлайна)."""
+    deadline = time.monotonic() + seconds if seconds is not None else None
+    # Вложенный дедлайн не может быть позже внешнего
+    outer = _deadline.get()
+    if outer is not None and (deadline is None or outer < deadline):
+        deadline = outer
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> float | None:
+    """Остаток бюджета в секундах или None, если дедлайн не задан."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def timeout_for(default: float) -> float:
+    """Таймаут очередного вызова: не больше default и не больше остатка бюджета."""
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceeded("Бюджет времени запроса исчерпан")
+    return min(default, left)
@@ -1,12 +1,14 @@
 import functools
 import time
 import traceback
-from typing import Any, Awaitable, Callable, Dict, ParamSpec, Type, TypeVar
+from collections.abc import Awaitable, Callable
+from typing import Any, ParamSpec, TypeVar
 
 import httpx
 from fastapi import HTTPException, Request, status
 
 from app.core import get_settings
+from app.core.deadline import DeadlineExceeded
 from app.core.logger_setup import logger
 from app.core.notifier import send_telegram_alert
 
@@ -155,6 +157,13 @@ def log_and_catch(
                 )
                 raise
 
+            except DeadlineExceeded:
+                # Исчерпан бюджет времени запроса — это не сбой шлюза, решение принимает вызывающий
+                logger.warning(
+                    f"[DEADLINE] {func_name}: бюджет времени запроса исчерпан"
+                )
+                raise
+
             except Exception as e:
                 # Обработка непредвиденных ошибок
                 duration = round(time.perf_counter() - start_time, 2)
@@ -167,7 +176,10 @@ def log_and_catch(
                 # Проверяем, является ли ошибка сетевой
                 if isinstance(e, httpx.RequestError):
                     # Это ошибка соединения, таймаут и т.д.
-                    user_message = "Не удалось связаться со шлюзом ЕВМИАС. Пожалуйста, проверьте соединение и попробуйте позже."
+                    user_message = (
+                        "Не удалось связаться со шлюзом ЕВМИАС. "
+                        "Пожалуйста, проверьте соединение и попробуйте позже."
+                    )
 
                     # Формируем сообщение для себя в Telegram
                     alert_message = (
@@ -206,7 +218,7 @@ def log_and_catch(
                 # Пробрасываем ошибку как HTTPException
                 raise HTTPException(
                     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail=f"Ошибка в {func_name} (строка {lineno}) при запросе {method} {url}: {str(e)}",
+                    detail=f"Ошибка в {func_name} (строка {lineno}) при запросе {method} {url}: {e!s}",
                 )
 
         return wrapper
@@ -215,7 +227,7 @@ def log_and_catch(
 
 
 def route_handler(
-    debug: bool = True, custom_errors: Dict[Type[Exception], int] = None
+    debug: bool = True, custom_errors: dict[type[Exception], int] = None
 ) -> Callable[..., Awaitable[Any]]:
     """Декоратор для логирования и обработки ошибок в роутах FastAPI.
 
@@ -289,7 +301,8 @@ def route_handler(
                     logger.debug(
                         f"[ROUTE] {method} {route_path} — успех за {duration}s"
                     )
-                    result_info = f"type={type(result).__name__}, len={len(result) if hasattr(result, '__len__') else 'N/A'}"
+                    length = len(result) if hasattr(result, "__len__") else "N/A"
+                    result_info = f"type={type(result).__name__}, len={length}"
                     logger.debug(f"[ROUTE] результат: {result_info}")
                 return result
 
@@ -300,6 +313,15 @@ def route_handler(
                 )
                 raise
 
+            except DeadlineExceeded as e:
+                # Бюджет времени исчерпан до ответа: клиенту — таймаут, а не внутренняя ошибка
+                logger.warning(
+                    f"[DEADLINE] {method} {route_path}: бюджет времени запроса исчерпан"
+                )
+                raise HTTPException(
+                    status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=str(e)
+                )
+
             except Exception as e:
                 # Обработка непредвиденных ошибок
                 duration = round(time.perf_counter() - start_time, 2)
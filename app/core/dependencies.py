@@ -1,10 +1,14 @@
-from typing import Annotated, Optional
+import math
+from typing import Annotated
 
 import httpx
 from fastapi import Depends, HTTPException, Request, Security, status
 from fastapi.security import APIKeyHeader
 
 from app.core import get_settings
+from app.core.fairness import client_kind, current_client, identify_client, rate_limiter
+from app.core.logger_setup import logger
+from app.core.metrics import CLIENT_THROTTLED
 from app.service.gateway.gateway_service import GatewayService
 
 API_KEY_HEADER_SCHEME = APIKeyHeader(name="X-API-KEY", auto_error=False)
@@ -16,12 +20,15 @@ async def get_base_http_client(request: Request) -> httpx.AsyncClient:
 
 
 async def get_gateway_service(
+    request: Request,
     client: Annotated[httpx.AsyncClient, Depends(get_base_http_client)],
 ) -> GatewayService:
-    return GatewayService(client=client)
+    return GatewayService(
+        client=client, batcher=getattr(request.app.state, "gateway_batcher", None)
+    )
 
 
-async def check_api_key(api_key: Optional[str] = Security(API_KEY_HEADER_SCHEME)):
+async def check_api_key(api_key: str | None = Security(API_KEY_HEADER_SCHEME)):
     if api_key and api_key == settings.GATEWAY_API_KEY:
         return api_key
 
@@ -33,3 +40,27 @@ async def check_api_key(api_key: Optional[str] = Security(API_KEY_HEADER_SCHEME)
             "remedy": "Please include a valid 'X-API-KEY' header in your request.",
         },
     )
+
+
+async def limit_client(request: Request) -> str:
+    """
+    Определяет клиента для справедливой очереди шлюза и списывает токен из его бакета.
+    При исчерпании лимита отвечает 429 с Retry-After.
+    """
+    client = identify_client(request)
+    current_client.set(client)
+    if rate_limiter is None:
+        return client
+
+    retry_after = rate_limiter.acquire(client)
+    if retry_after:
+        CLIENT_THROTTLED.labels(client_kind=client_kind(client)).inc()
+        logger.info(
+            f"Клиент {client} превысил лимит запросов, повтор через {math.ceil(retry_after)} с"
+        )
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Слишком много запросов, повторите позже",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+    return client
@@ -0,0 +1,89 @@
+"""
+ETag / If-None-Match и сжатие JSON-ответов расширению.
+
+ETag — хэш сериализованного тела ответа. Если клиент прислал совпадающий If-None-Match,
+отдается пустой 304 Not Modified, и расширение использует сохраненную у себя копию.
+Тела больше RESPONSE_COMPRESSION_MIN_SIZE сжимаются brotli (если установлен) или gzip
+в зависимости от Accept-Encoding; у сжатого представления свой ETag с суффиксом кодировки.
+"""
+
+import gzip
+import hashlib
+from typing import Any
+
+from fastapi import Request, Response, status
+
+from app.core import json_codec
+from app.core.config import get_settings
+from app.core.metrics import RESPONSE_PAYLOAD_BYTES
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - зависит от окружения
+    brotli = None
+
+settings = get_settings()
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Проверяет If-None-Match (список через запятую, слабые W/-теги, '*')."""
+    if not if_none_match:
+        return False
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+def _choose_encoding(accept_encoding: str) -> str | None:
+    """Выбирает кодировку по Accept-Encoding; кодировки с q=0 считаются запрещенными."""
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(name.strip())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=4)
+    return gzip.compress(body, compresslevel=5)
+
+
+def etag_json_response(
+    request: Request, content: Any, headers: dict[str, str] | None = None
+) -> Response:
+    """
+    Сериализует content кодеком приложения и отдает его с ETag (при необходимости сжатым)
+    или 304, если он не изменился.
+    """
+    body = json_codec.dumps(content)
+    route = request.url.path
+    RESPONSE_PAYLOAD_BYTES.labels(route=route, stage="serialized").observe(len(body))
+
+    encoding = None
+    if len(body) >= settings.RESPONSE_COMPRESSION_MIN_SIZE:
+        encoding = _choose_encoding(request.headers.get("accept-encoding", ""))
+
+    etag = make_etag(body)
+    if encoding:
+        etag = f'{etag[:-1]}-{encoding}"'
+    headers = {**(headers or {}), "ETag": etag, "Vary": "Accept-Encoding"}
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if encoding:
+        body = _compress(body, encoding)
+        headers["Content-Encoding"] = encoding
+    RESPONSE_PAYLOAD_BYTES.labels(route=route, stage="wire").observe(len(body))
+
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,165 @@
+"""
+Справедливое распределение ресурсов между клиентами расширения.
+
+Клиент определяется по X-API-KEY, затем по ID расширения из Origin
+(chrome-extension://<id>), затем по IP. Это разделение для справедливости, а не
+аутентификация: заголовки можно подделать, поэтому лимиты защищают от случайной
+перегрузки одним оператором, а не от злоумышленника.
+
+- ClientRateLimiter — токен-бакет на клиента для роутов /extension: при исчерпании
+  запросы получают 429 с Retry-After.
+- FairScheduler — ограничивает число одновременных вызовов шлюза в процессе и раздает
+  освободившиеся слоты клиентам по кругу, а не в порядке очереди. Поэтому серия поисков
+  одного оператора или пакетное задание не занимают все слоты: интерактивный запрос другого
+  клиента ждет не дольше одного освободившегося слота.
+
+Текущий клиент хранится в contextvar и доходит до GatewayService.make_request без явной передачи.
+"""
+
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+
+from fastapi import Request
+
+from app.core.config import get_settings
+from app.core.metrics import CLIENT_GATEWAY_QUEUE, GATEWAY_SLOT_WAIT_SECONDS
+
+settings = get_settings()
+
+# Клиент, от имени которого выполняются вызовы шлюза (фоновые задачи — "system")
+current_client: ContextVar[str] = ContextVar("fairness_client", default="system")
+
+_EXTENSION_ORIGIN = "chrome-extension://"
+
+
+def client_kind(client: str) -> str:
+    """Вид клиента для меток метрик: key, ext, ip, jobs или system."""
+    return client.partition(":")[0]
+
+
+def identify_client(request: Request) -> str:
+    """Идентификатор клиента: key:<хэш ключа>, ext:<ID расширения> или ip:<адрес>."""
+    api_key = request.headers.get("X-API-KEY")
+    if api_key:
+        # Сам ключ в метки метрик и логи не попадает
+        return "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:12]
+
+    origin = request.headers.get("origin", "")
+    if origin.startswith(_EXTENSION_ORIGIN):
+        return "ext:" + origin[len(_EXTENSION_ORIGIN) :][:32]
+
+    forwarded = request.headers.get("x-forwarded-for")
+    if forwarded:
+        return "ip:" + forwarded.split(",")[0].strip()
+    return "ip:" + (request.client.host if request.client else "unknown")
+
+
+class ClientRateLimiter:
+    """Токен-бакеты по клиентам; хранит не больше max_clients последних клиентов."""
+
+    def __init__(self, rate: float, burst: int, max_clients: int = 10_000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        # client -> (токены, время последнего пополнения)
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    def acquire(self, client: str) -> float:
+        """Берет токен; возвращает 0 или через сколько секунд появится следующий токен."""
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(client, (float(self.burst), now))
+        tokens = min(float(self.burst), tokens + (now - updated) * self.rate)
+
+        retry_after = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / self.rate
+
+        self._buckets[client] = (tokens, now)
+        if len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+
+class FairScheduler:
+    """Слоты одновременных вызовов шлюза, раздаваемые ожидающим клиентам по кругу."""
+
+    def __init__(self, slots: int):
+        self.slots = slots
+        self._in_use = 0
+        # Очередь ожидающих по клиентам; порядок ключей — порядок обхода по кругу
+        self._waiters: OrderedDict[str, deque[asyncio.Future]] = OrderedDict()
+
+    @property
+    def in_use(self) -> int:
+        return self._in_use
+
+    @property
+    def waiting(self) -> int:
+        return sum(len(queue) for queue in self._waiters.values())
+
+    async def acquire(self, client: str, timeout: float | None = None) -> None:
+        """Занимает слот (освобождать через release). Не дождались за timeout — asyncio.TimeoutError."""
+        # Свободный слот берем сразу, только если никто не ждет, иначе встаем в очередь
+        if self._in_use < self.slots and not self._waiters:
+            self._in_use += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(client, deque()).append(future)
+        CLIENT_GATEWAY_QUEUE.labels(client_kind=client_kind(client)).inc()
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(future, timeout)
+        except BaseException:
+            if future.done() and not future.cancelled():
+                # Слот успели передать нам в момент отмены — возвращаем его следующему
+                self.release()
+            else:
+                self._discard(client, future)
+            raise
+        finally:
+            CLIENT_GATEWAY_QUEUE.labels(client_kind=client_kind(client)).dec()
+            GATEWAY_SLOT_WAIT_SECONDS.observe(time.perf_counter() - started)
+
+    def release(self) -> None:
+        while self._waiters:
+            client, queue = next(iter(self._waiters.items()))
+            future = queue.popleft()
+            # Обслуженный клиент уходит в конец круга
+            if queue:
+                self._waiters.move_to_end(client)
+            else:
+                del self._waiters[client]
+            if not future.done():
+                # Слот переходит ожидающему, счетчик занятых не меняется
+                future.set_result(None)
+                return
+        self._in_use -= 1
+
+    def _discard(self, client: str, future: asyncio.Future) -> None:
+        queue = self._waiters.get(client)
+        if queue is None:
+            return
+        try:
+            queue.remove(future)
+        except ValueError:
+            pass
+        if not queue:
+            del self._waiters[client]
+
+
+rate_limiter = (
+    ClientRateLimiter(settings.CLIENT_RATE_PER_SECOND, settings.CLIENT_RATE_BURST)
+    if settings.CLIENT_RATE_LIMIT_ENABLED
+    else None
+)
+gateway_scheduler = (
+    FairScheduler(settings.GATEWAY_FAIR_SLOTS)
+    if settings.GATEWAY_FAIR_SLOTS > 0
+    else None
+)
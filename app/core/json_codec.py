@@ -0,0 +1,66 @@
+"""
+Единый JSON-кодек приложения.
+
+Используется и клиентом шлюза (разбор ответов ЕВМИАС), и роутами (сериализация ответов
+расширению). Если установлен orjson — работаем через него, иначе автоматически
+откатываемся на стандартный json. Снаружи API одинаковый: loads() принимает bytes/str,
+dumps() всегда возвращает bytes в UTF-8.
+"""
+
+import json
+from typing import Any
+
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - зависит от окружения
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+def _default(obj: Any) -> Any:
+    """Приводит нестандартные типы к JSON-совместимым (вызывается обоими бэкендами)."""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    raise TypeError(f"Тип {type(obj).__name__} не сериализуется в JSON")
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def loads(data: bytes | bytearray | memoryview | str) -> Any:
+        return orjson.loads(data)
+
+    def dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+
+else:
+
+    def loads(data: bytes | bytearray | memoryview | str) -> Any:
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        return json.loads(data)
+
+    def dumps(obj: Any) -> bytes:
+        return json.dumps(
+            obj, ensure_ascii=False, separators=(",", ":"), default=_default
+        ).encode("utf-8")
+
+
+class CodecJSONResponse(Response):
+    """
+    JSON-ответ, сериализуемый напрямую в bytes через кодек приложения.
+
+    Если роут возвращает этот объект, FastAPI не прогоняет результат через
+    jsonable_encoder/response_model, а отдает готовые байты.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
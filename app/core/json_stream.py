@@ -0,0 +1,132 @@
+"""
+Инкрементальный разбор больших JSON-ответов шлюза.
+
+Ответ Search.searchData имеет вид {"data": [{...}, {...}, ...]} и для распространенных
+фамилий занимает мегабайты. Парсер получает тело ответа кусками и отдает элементы массива
+по одному, как только они полностью пришли, поэтому в памяти держится только текущий
+недочитанный кусок, а не весь ответ.
+"""
+
+import codecs
+import json
+import re
+from collections.abc import AsyncIterator
+from typing import Any
+
+_WHITESPACE = " \t\n\r"
+_DELIMITERS = ",]" + _WHITESPACE
+# Объект, массив и строка заканчиваются своей закрывающей скобкой или кавычкой
+_SELF_DELIMITED = '{["'
+
+
+class JSONArrayStreamParser:
+    """
+    Потоковый парсер элементов массива по ключу верхнего уровня.
+
+    Поддерживает ответы вида {"<key>": [...]} и просто [...]. Если в ответе нет массива
+    по ключу (например, пришла ошибка), парсер ничего не вернет — ``found`` останется False;
+    iter_json_array в этом случае бросает ValueError.
+    """
+
+    def __init__(self, key: str = "data"):
+        self._key_pattern = re.compile(rf'"{re.escape(key)}"\s*:\s*\[')
+        self._decoder = json.JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._pos = 0
+        self._state = "seek"  # seek -> items -> done
+        self.found = False
+
+    @property
+    def done(self) -> bool:
+        return self._state == "done"
+
+    def feed(self, chunk: bytes) -> list[Any]:
+        """Принимает очередной кусок тела ответа и возвращает полностью пришедшие элементы."""
+        if self._state == "done":
+            return []
+
+        self._buffer = self._buffer[self._pos :] + self._text_decoder.decode(chunk)
+        self._pos = 0
+
+        if self._state == "seek" and not self._seek_array():
+            return []
+
+        return self._read_items()
+
+    def _seek_array(self) -> bool:
+        stripped = self._buffer.lstrip(_WHITESPACE)
+        if not stripped:
+            return False
+
+        # Шлюз может вернуть массив сразу, без обертки в объект
+        if stripped[0] == "[":
+            self._pos = len(self._buffer) - len(stripped) + 1
+        else:
+            match = self._key_pattern.search(self._buffer)
+            if not match:
+                return False
+            self._pos = match.end()
+
+        self._state = "items"
+        self.found = True
+        return True
+
+    def _read_items(self) -> list[Any]:
+        items = []
+        buffer = self._buffer
+        length = len(buffer)
+
+        while True:
+            while self._pos < length and buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos >= length:
+                break
+
+            char = buffer[self._pos]
+            if char == "]":
+                self._state = "done"
+                break
+            if char == ",":
+                self._pos += 1
+                continue
+
+            try:
+                item, end = self._decoder.raw_decode(buffer, self._pos)
+            except json.JSONDecodeError:
+                # Элемент пришел не целиком — ждем следующий кусок
+                break
+
+            # Число или литерал на границе куска может быть обрезан ("12" + "3", "1." + "5"):
+            # raw_decode вернет его начало, поэтому принимаем его только перед разделителем
+            if char not in _SELF_DELIMITED and (
+                end >= length or buffer[end] not in _DELIMITERS
+            ):
+                break
+
+            items.append(item)
+            self._pos = end
+
+        return items
+
+
+async def iter_json_array(
+    chunks: AsyncIterator[bytes], key: str = "data"
+) -> AsyncIterator[Any]:
+    """
+    Отдает элементы массива по ключу ``key`` из потока байтов по мере их поступления.
+
+    Если поток закончился, а массив так и не начался (ответ не того вида) или не закрылся
+    (соединение оборвалось), бросает ValueError: иначе обрезанный ответ выглядел бы как
+    полный, но короткий список.
+    """
+    parser = JSONArrayStreamParser(key)
+    async for chunk in chunks:
+        for item in parser.feed(chunk):
+            yield item
+        if parser.done:
+            return
+
+    if not parser.found:
+        raise ValueError(f'В ответе нет массива "{key}"')
+    raise ValueError(f'Ответ оборвался до конца массива "{key}"')
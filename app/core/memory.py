@@ -0,0 +1,191 @@
+"""
+Диагностика памяти воркера: снимки tracemalloc и периодические метрики RSS и кучи Python.
+
+tracemalloc включается и выключается через /debug/memory (он замедляет выделение памяти,
+поэтому по умолчанию выключен). Снимки хранятся в памяти процесса (последние
+MEMORY_MAX_SNAPSHOTS); по ним отдаются топ мест выделения и разница между двумя снимками.
+Все это относится к одному воркеру gunicorn: в ответах есть pid, и сравнивать снимки имеет
+смысл только из одного процесса.
+
+Метрики worker_rss_bytes, python_allocated_blocks и tracemalloc_traced_bytes обновляются
+раз в MEMORY_GAUGE_INTERVAL секунд фоновой задачей. Рост кучи Python оценивается по числу
+выделенных блоков (sys.getallocatedblocks, доли миллисекунды), а не по
+len(gc.get_objects()): обход всех объектов держит GIL и на большой куче останавливает цикл
+событий на сотни миллисекунд.
+"""
+
+import asyncio
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from collections import OrderedDict
+from typing import Any, Literal
+
+from fastapi import FastAPI
+
+from app.core.config import get_settings
+from app.core.logger_setup import logger
+from app.core.metrics import (
+    PYTHON_ALLOCATED_BLOCKS,
+    TRACEMALLOC_TRACED_BYTES,
+    WORKER_RSS_BYTES,
+)
+
+settings = get_settings()
+
+GroupBy = Literal["lineno", "filename", "traceback"]
+
+# Выделения самого tracemalloc и импорта модулей в топе не интересны
+_SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def rss_bytes() -> int | None:
+    """Текущий RSS процесса (Linux, /proc/self/statm) или None, если недоступен."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _stat_dict(
+    stat: tracemalloc.Statistic | tracemalloc.StatisticDiff, group_by: GroupBy
+) -> dict[str, Any]:
+    frames = (
+        stat.traceback.format() if group_by == "traceback" else [str(stat.traceback[0])]
+    )
+    result = {
+        "where": frames,
+        "size_kb": round(stat.size / 1024, 1),
+        "count": stat.count,
+    }
+    if isinstance(stat, tracemalloc.StatisticDiff):
+        result["size_diff_kb"] = round(stat.size_diff / 1024, 1)
+        result["count_diff"] = stat.count_diff
+    return result
+
+
+class MemoryProfiler:
+    def __init__(self, max_snapshots: int = 5):
+        self.max_snapshots = max_snapshots
+        self._snapshots: OrderedDict[int, tuple[float, tracemalloc.Snapshot]] = (
+            OrderedDict()
+        )
+        self._next_id = 1
+
+    def status(self) -> dict[str, Any]:
+        traced, peak = (
+            tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+        )
+        return {
+            "pid": os.getpid(),
+            "rss_bytes": rss_bytes(),
+            "allocated_blocks": sys.getallocatedblocks(),
+            "gc_counts": gc.get_count(),
+            "gc_collections": [
+                generation["collections"] for generation in gc.get_stats()
+            ],
+            "tracemalloc": {
+                "tracing": tracemalloc.is_tracing(),
+                "frames": tracemalloc.get_traceback_limit(),
+                "traced_bytes": traced,
+                "peak_bytes": peak,
+            },
+            "snapshots": [
+                {"id": snapshot_id, "taken_at": taken_at}
+                for snapshot_id, (taken_at, _) in self._snapshots.items()
+            ],
+        }
+
+    def start(self, frames: int = 1) -> None:
+        if tracemalloc.is_tracing():
+            return
+        tracemalloc.start(frames)
+        logger.info(f"tracemalloc включен (pid {os.getpid()}, кадров: {frames})")
+
+    def stop(self) -> None:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+            logger.info(f"tracemalloc выключен (pid {os.getpid()})")
+        # Без трассировки старые снимки с новыми не сравнить
+        self._snapshots.clear()
+
+    def take_snapshot(self) -> int:
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc не включен")
+        snapshot = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+        snapshot_id = self._next_id
+        self._next_id += 1
+        self._snapshots[snapshot_id] = (time.time(), snapshot)
+        while len(self._snapshots) > self.max_snapshots:
+            self._snapshots.popitem(last=False)
+        return snapshot_id
+
+    def _get(self, snapshot_id: int) -> tracemalloc.Snapshot:
+        try:
+            return self._snapshots[snapshot_id][1]
+        except KeyError:
+            raise KeyError(f"Снимок {snapshot_id} не найден") from None
+
+    def top(
+        self, snapshot_id: int, limit: int = 20, group_by: GroupBy = "lineno"
+    ) -> list[dict[str, Any]]:
+        stats = self._get(snapshot_id).statistics(group_by)
+        return [_stat_dict(stat, group_by) for stat in stats[:limit]]
+
+    def diff(
+        self,
+        first_id: int,
+        second_id: int,
+        limit: int = 20,
+        group_by: GroupBy = "lineno",
+    ) -> list[dict[str, Any]]:
+        """Места, где выделение выросло сильнее всего между снимками first_id и second_id."""
+        stats = self._get(second_id).compare_to(self._get(first_id), group_by)
+        return [_stat_dict(stat, group_by) for stat in stats[:limit]]
+
+
+memory_profiler = MemoryProfiler(settings.MEMORY_MAX_SNAPSHOTS)
+
+
+def update_memory_gauges() -> None:
+    pid = str(os.getpid())
+    rss = rss_bytes()
+    if rss is not None:
+        WORKER_RSS_BYTES.labels(pid=pid).set(rss)
+    PYTHON_ALLOCATED_BLOCKS.labels(pid=pid).set(sys.getallocatedblocks())
+    traced = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+    TRACEMALLOC_TRACED_BYTES.labels(pid=pid).set(traced)
+
+
+async def _memory_gauge_loop() -> None:
+    while True:
+        try:
+            update_memory_gauges()
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f"Не удалось обновить метрики памяти: {e}")
+        await asyncio.sleep(settings.MEMORY_GAUGE_INTERVAL)
+
+
+async def start_memory_monitor(app: FastAPI) -> None:
+    """Запускает периодическое обновление метрик памяти (MEMORY_GAUGE_INTERVAL > 0)."""
+    if settings.MEMORY_GAUGE_INTERVAL <= 0:
+        return
+    app.state.memory_monitor_task = asyncio.create_task(_memory_gauge_loop())
+
+
+async def stop_memory_monitor(app: FastAPI) -> None:
+    task = getattr(app.state, "memory_monitor_task", None)
+    if task:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
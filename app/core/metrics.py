@@ -0,0 +1,189 @@
+"""
+Прикладные метрики Prometheus.
+
+Регистрируются в стандартном реестре prometheus_client, поэтому автоматически отдаются
+на /metrics вместе с метриками Instrumentator. Значения считаются отдельно в каждом воркере.
+"""
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# Размеры тел от 1 КБ до 16 МБ
+_BYTES_BUCKETS = tuple(1024 * 2**i for i in range(15))
+
+SEARCH_CACHE_LOOKUPS = Counter(
+    "search_cache_lookups_total",
+    "Обращения к кэшу поиска по подразделениям",
+    ["building", "result"],  # result: hit | superset_hit | negative_hit | miss
+)
+
+SEARCH_INDEX_QUERIES = Counter(
+    "search_index_queries_total",
+    "Поисковые запросы к локальному индексу госпитализаций",
+    ["mode", "result"],  # result: served | fallback
+)
+
+SEARCH_INDEX_ROWS = Gauge(
+    "search_index_rows",
+    "Количество госпитализаций в локальном индексе",
+)
+
+SEARCH_PROGRESSIVE_RESULTS = Counter(
+    "search_progressive_results_total",
+    "Прогрессивный поиск: в каком окне подразделение нашло результаты",
+    ["building", "window"],  # window: метка окна (14d, 90d, ...), full или none
+)
+
+GATEWAY_RESPONSE_BYTES = Histogram(
+    "gateway_response_bytes",
+    "Размер тела ответа шлюза по методам ЕВМИАС (c.m)",
+    ["method"],
+    buckets=_BYTES_BUCKETS,
+)
+
+RESPONSE_PAYLOAD_BYTES = Histogram(
+    "response_payload_bytes",
+    "Размер JSON-ответа расширению до (serialized) и после сжатия (wire)",
+    ["route", "stage"],
+    buckets=_BYTES_BUCKETS,
+)
+
+GATEWAY_BATCH_SIZE = Histogram(
+    "gateway_batch_size",
+    "Число вызовов ЕВМИАС в одном пакетном запросе к шлюзу",
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+
+GATEWAY_BATCH_FALLBACKS = Counter(
+    "gateway_batch_fallbacks_total",
+    "Вызовы шлюза, отправленные по одному вместо пакета",
+    ["reason"],  # reason: unsupported | batch_error | call_error
+)
+
+ENRICH_JOBS = Counter(
+    "enrich_jobs_total",
+    "Задания на обогащение по классу приоритета и исходу",
+    ["priority", "status"],  # status: queued | done | failed
+)
+
+ENRICH_JOB_WAIT_SECONDS = Histogram(
+    "enrich_job_wait_seconds",
+    "Время ожидания задания на обогащение в очереди до начала выполнения",
+    ["priority"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300),
+)
+
+# Метка — вид клиента (key | ext | ip | jobs | system), а не сам клиент: число клиентов не
+# ограничено. Конкретный клиент пишется в лог
+CLIENT_THROTTLED = Counter(
+    "client_throttled_total",
+    "Запросы к /extension, отклоненные лимитом клиента (429)",
+    ["client_kind"],
+)
+
+CLIENT_GATEWAY_QUEUE = Gauge(
+    "client_gateway_queue",
+    "Вызовы шлюза, ожидающие свободного слота, по виду клиента",
+    ["client_kind"],
+)
+
+GATEWAY_SLOT_WAIT_SECONDS = Histogram(
+    "gateway_slot_wait_seconds",
+    "Время ожидания слота вызова шлюза в справедливой очереди",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+GATEWAY_PROBE_SECONDS = Histogram(
+    "gateway_probe_seconds",
+    "Задержка фоновой проверки шлюза (Common.getCurrentDateTime)",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+GATEWAY_CIRCUIT_OPEN = Gauge(
+    "gateway_circuit_open",
+    "1, если фоновые проверки шлюза не проходят и шлюз считается недоступным",
+)
+
+WORKER_RSS_BYTES = Gauge(
+    "worker_rss_bytes",
+    "Resident set size процесса воркера",
+    ["pid"],
+)
+
+PYTHON_ALLOCATED_BLOCKS = Gauge(
+    "python_allocated_blocks",
+    "Блоки памяти, выделенные интерпретатором Python (sys.getallocatedblocks)",
+    ["pid"],
+)
+
+TRACEMALLOC_TRACED_BYTES = Gauge(
+    "tracemalloc_traced_bytes",
+    "Память, выделенная с момента включения tracemalloc (0, если выключен)",
+    ["pid"],
+)
+
+CPU_OFFLOAD_IN_FLIGHT = Gauge(
+    "cpu_offload_in_flight",
+    "Задачи разбора, отправленные в пул выноса CPU-работы и еще не завершенные",
+    ["stage"],
+)
+
+CPU_OFFLOAD_SECONDS = Histogram(
+    "cpu_offload_seconds",
+    "Время задачи в пуле выноса CPU-работы: ожидание свободного воркера и сам разбор",
+    ["stage", "phase"],  # phase: queue | run
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "event_loop_lag_seconds",
+    "Опоздание пробуждения пульса цикла событий: сколько цикл был занят другим кодом",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+EVENT_LOOP_STALLS = Counter(
+    "event_loop_stalls_total",
+    "Блокировки цикла событий дольше LOOP_STALL_THRESHOLD_MS (стек записан в лог)",
+)
+
+GATEWAY_CACHE_LOOKUPS = Counter(
+    "gateway_cache_lookups_total",
+    "Обращения к кэшу ответов шлюза по методам",
+    ["method", "result"],  # result: hit | stale | miss
+)
+
+GATEWAY_CACHE_STALE_SERVED = Counter(
+    "gateway_cache_stale_served_total",
+    "Ответы шлюза, отданные из устаревшей записи кэша",
+    [
+        "method",
+        "reason",
+    ],  # reason: revalidate (обновляется в фоне) | error (шлюз недоступен)
+)
+
+ADMISSION_IN_FLIGHT = Gauge(
+    "admission_in_flight",
+    "Входящие запросы, допущенные к обработке, по классу маршрутов",
+    ["route_class"],
+)
+
+ADMISSION_QUEUE = Gauge(
+    "admission_queue",
+    "Входящие запросы, ожидающие допуска, по классу маршрутов",
+    ["route_class"],
+)
+
+ADMISSION_QUEUE_WAIT_SECONDS = Histogram(
+    "admission_queue_wait_seconds",
+    "Время ожидания допуска входящего запроса (и допущенного, и сброшенного)",
+    ["route_class"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+ADMISSION_SHED = Counter(
+    "admission_shed_total",
+    "Входящие запросы, отклоненные контролем допуска (503)",
+    [
+        "route_class",
+        "reason",
+    ],  # reason: queue_full (очередь заполнена) | timeout (ждал дольше порога)
+)
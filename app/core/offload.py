@@ -0,0 +1,150 @@
+"""
+Вынос CPU-тяжелого разбора из цикла событий в пул потоков или процессов.
+
+Пока цикл событий воркера разбирает большой шаблон эпикриза регулярками, остальные
+запросы этого воркера стоят. run_cpu отправляет такую работу в пул (CPU_OFFLOAD_EXECUTOR),
+если ее вход не меньше CPU_OFFLOAD_MIN_BYTES; маленькие входы разбираются на месте —
+передача в пул стоила бы дороже самого разбора.
+
+Пул потоков дешев, но отдает циклу событий только промежутки между вызовами, держащими GIL
+(одна регулярка или orjson.loads целиком держат его), поэтому хвост задержек сокращается, но
+не исчезает. Пул процессов разбирает действительно параллельно, но аргументы и результат
+передаются через pickle: это выгодно для этапов «большой вход — маленький результат» (шаблон
+эпикриза), а для разбора JSON распаковка результата в цикле событий стоит столько же, сколько
+сам разбор. Такие этапы (large_result=True) всегда идут в пул потоков. Сравнение —
+benchmarks/bench_offload.py.
+
+Отмена ожидающей корутины снимает задачу, еще стоящую в очереди пула; уже начатую задачу
+прервать нельзя — она доработает, а результат будет выброшен. Функции для пула процессов
+должны быть определены на уровне модуля.
+"""
+
+import asyncio
+import multiprocessing
+import time
+from collections.abc import Callable
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, TypeVar
+
+from fastapi import FastAPI
+
+from app.core.config import get_settings
+from app.core.logger_setup import logger
+from app.core.metrics import CPU_OFFLOAD_IN_FLIGHT, CPU_OFFLOAD_SECONDS
+
+settings = get_settings()
+
+T = TypeVar("T")
+
+
+def _timed_call(func: Callable[..., T], args: tuple) -> tuple[T, float, float]:
+    # Время по time.time(): perf_counter в дочернем процессе с родительским несравним
+    started = time.time()
+    result = func(*args)
+    return result, started, time.time()
+
+
+class CpuOffloader:
+    def __init__(
+        self, kind: str = "thread", workers: int = 2, min_bytes: int = 64 * 1024
+    ):
+        self.kind = kind
+        self.workers = workers
+        self.min_bytes = min_bytes
+        self._executor: Executor | None = None
+        # Пул потоков для этапов с большим результатом, если основной пул — процессы
+        self._thread_executor: Executor | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._executor is not None
+
+    def start(self) -> None:
+        if self.kind == "off" or self._executor is not None:
+            return
+        if self.kind == "process":
+            # spawn, а не fork: воркер к этому моменту уже держит потоки и открытые соединения
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            self._thread_executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="cpu-offload"
+            )
+        else:
+            self._executor = self._thread_executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="cpu-offload"
+            )
+        logger.info(
+            f"Вынос CPU-разбора включен: {self.kind}, воркеров {self.workers}, от {self.min_bytes} байт"
+        )
+
+    def shutdown(self) -> None:
+        for executor in {self._executor, self._thread_executor} - {None}:
+            executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = self._thread_executor = None
+
+    async def run(
+        self,
+        stage: str,
+        func: Callable[..., T],
+        *args: Any,
+        size: int,
+        large_result: bool = False,
+    ) -> T:
+        """
+        Выполняет func(*args) в пуле, если size >= min_bytes, иначе прямо в цикле событий.
+
+        large_result — результат сравним по размеру со входом (разбор JSON): такой этап идет
+        в пул потоков, даже если основной пул — процессы.
+        """
+        executor = self._thread_executor if large_result else self._executor
+        if executor is None or size < self.min_bytes:
+            return func(*args)
+
+        submitted = time.time()
+        future = executor.submit(_timed_call, func, args)
+        CPU_OFFLOAD_IN_FLIGHT.labels(stage=stage).inc()
+        # Счетчик уменьшается, когда пул действительно освободился, а не когда нас отменили
+        future.add_done_callback(
+            lambda _: CPU_OFFLOAD_IN_FLIGHT.labels(stage=stage).dec()
+        )
+        try:
+            result, started, finished = await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # wrap_future передает отмену и сам, но явная отмена не зависит от этой детали
+            future.cancel()
+            raise
+        CPU_OFFLOAD_SECONDS.labels(stage=stage, phase="queue").observe(
+            max(0.0, started - submitted)
+        )
+        CPU_OFFLOAD_SECONDS.labels(stage=stage, phase="run").observe(finished - started)
+        return result
+
+
+cpu_offloader = CpuOffloader(
+    settings.CPU_OFFLOAD_EXECUTOR,
+    settings.CPU_OFFLOAD_WORKERS,
+    settings.CPU_OFFLOAD_MIN_BYTES,
+)
+
+
+async def run_cpu(
+    stage: str,
+    func: Callable[..., T],
+    *args: Any,
+    size: int,
+    large_result: bool = False,
+) -> T:
+    return await cpu_offloader.run(
+        stage, func, *args, size=size, large_result=large_result
+    )
+
+
+async def start_cpu_offload(app: FastAPI) -> None:
+    """Создает пул в процессе воркера (после fork gunicorn), если вынос включен."""
+    cpu_offloader.start()
+
+
+async def stop_cpu_offload(app: FastAPI) -> None:
+    cpu_offloader.shutdown()
@@ -0,0 +1,97 @@
+"""
+Профилирование отдельных запросов по требованию (cProfile -> файл pstats).
+
+Запрос профилируется, если в нем есть заголовок X-Profile: 1 и верный X-API-KEY, либо
+случайно с вероятностью PROFILE_SAMPLE_RATE. Профиль сохраняется в PROFILE_DIR (хранятся
+последние PROFILE_MAX_FILES файлов), а ссылка на него возвращается в заголовке
+X-Profile-Url (см. /debug/profiles).
+
+cProfile профилирует поток целиком: пока запрос ждет шлюз, в профиль попадает и работа
+других запросов этого воркера. Поэтому одновременно профилируется только один запрос,
+а профиль стоит смотреть по tottime: CPU-горячие места (регулярки, JSON, логирование,
+pydantic) видны независимо от того, какой запрос их вызвал.
+"""
+
+import asyncio
+import cProfile
+import random
+import re
+import time
+import uuid
+from pathlib import Path
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import get_settings
+from app.core.logger_setup import logger
+
+settings = get_settings()
+
+PROFILE_NAME_RE = re.compile(r"^[\w.-]+\.pstats$")
+
+
+def profile_dir() -> Path:
+    return Path(settings.PROFILE_DIR)
+
+
+def _save_profile(profiler: cProfile.Profile, name: str) -> None:
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    profiler.dump_stats(directory / name)
+    # Каталог ограничен: удаляем самые старые профили сверх PROFILE_MAX_FILES
+    profiles = sorted(directory.glob("*.pstats"), key=lambda path: path.stat().st_mtime)
+    for path in profiles[: max(0, len(profiles) - settings.PROFILE_MAX_FILES)]:
+        path.unlink(missing_ok=True)
+
+
+class ProfilingMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        # cProfile нельзя включить дважды в одном потоке
+        self._busy = False
+
+    def _requested(self, scope: Scope) -> bool:
+        headers = dict(scope.get("headers") or [])
+        if headers.get(b"x-profile") in (b"1", b"true"):
+            api_key = headers.get(b"x-api-key", b"").decode("latin-1")
+            return bool(api_key) and api_key == settings.GATEWAY_API_KEY
+        return (
+            settings.PROFILE_SAMPLE_RATE > 0
+            and random.random() < settings.PROFILE_SAMPLE_RATE
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self._busy or not self._requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        path = scope.get("path", "")
+        slug = re.sub(r"[^\w]+", "_", path).strip("_") or "root"
+        method = scope.get("method", "GET").lower()
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        name = f"{stamp}-{method}-{slug}-{uuid.uuid4().hex[:6]}.pstats"
+
+        async def send_with_link(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-url", f"/debug/profiles/{name}".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        profiler = cProfile.Profile()
+        self._busy = True
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send_with_link)
+        finally:
+            profiler.disable()
+            self._busy = False
+            try:
+                await asyncio.to_thread(_save_profile, profiler, name)
+                logger.info(
+                    f"[PROFILE] {scope.get('method')} {path} — "
+                    f"{round((time.perf_counter() - started) * 1000)} мс, профиль {name}"
+                )
+            except OSError as e:
+                logger.warning(f"Не удалось сохранить профиль {name}: {e}")
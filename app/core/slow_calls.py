@@ -0,0 +1,201 @@
+"""
+Журнал медленных вызовов: ограниченный кольцевой буфер в памяти (и, по желанию, файл NDJSON).
+
+Вызов шлюза дольше SLOW_GATEWAY_CALL_MS или обогащение дольше SLOW_ENRICH_MS сохраняются
+с методом (c.m), отпечатком запроса, длительностью этапов и размером ответа. По журналу
+ищутся «тяжелые» пациенты и шаблоны, которые не видно по строке лога из log_and_catch.
+
+Персональные данные в журнал не попадают: из тела запроса сохраняются только
+идентификаторы (ключи *_id), остальные значения заменяются на тип и длину. Отпечаток —
+HMAC полного тела с секретным ключом, поэтому повторы одного и того же запроса видны без
+самих данных, а фамилию по отпечатку не подобрать перебором словаря. Ключ задается в
+SLOW_CALLS_FINGERPRINT_KEY, иначе он случайный, и отпечатки сравнимы только в пределах
+одного воркера.
+
+Этапы запроса собираются в contextvar (stage_scope/record_stage): запись о медленном
+вызове шлюза содержит и этапы, завершенные к его началу в рамках того же обогащения.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import secrets
+import time
+from collections import deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, NamedTuple
+
+from app.core import json_codec
+from app.core.config import get_settings
+from app.core.logger_setup import logger
+
+settings = get_settings()
+
+_FINGERPRINT_KEY = settings.SLOW_CALLS_FINGERPRINT_KEY.encode() or secrets.token_bytes(
+    32
+)
+
+_stages: ContextVar[dict[str, float] | None] = ContextVar(
+    "request_stages", default=None
+)
+
+
+@contextmanager
+def stage_scope() -> Iterator[dict[str, float]]:
+    """Начинает сбор длительностей этапов (мс) для текущего запроса и задач, созданных в нем."""
+    stages: dict[str, float] = {}
+    token = _stages.set(stages)
+    try:
+        yield stages
+    finally:
+        _stages.reset(token)
+
+
+def record_stage(name: str, seconds: float) -> None:
+    stages = _stages.get()
+    if stages is not None:
+        stages[name] = round(seconds * 1000, 1)
+
+
+def current_stages() -> dict[str, float]:
+    return dict(_stages.get() or {})
+
+
+def scrub(value: Any, key: str = "") -> Any:
+    """Оставляет структуру и идентификаторы, остальные значения заменяет на '<тип:длина>'."""
+    if isinstance(value, dict):
+        return {k: scrub(v, str(k)) for k, v in value.items()}
+    if isinstance(value, list):
+        return [scrub(item, key) for item in value[:20]]
+    if value is None or isinstance(value, bool):
+        return value
+    if key.lower().endswith("id"):
+        return value
+    return f"<{type(value).__name__}:{len(str(value))}>"
+
+
+def fingerprint(payload: Any) -> str:
+    return hmac.new(
+        _FINGERPRINT_KEY, json_codec.dumps(payload), hashlib.sha256
+    ).hexdigest()[:16]
+
+
+class SlowCall(NamedTuple):
+    kind: str  # gateway | enrich
+    method: str
+    duration_ms: float
+    started_at: float
+    fingerprint: str
+    request: Any
+    stages: dict[str, float]
+    preceding_stages: dict[str, float]
+    response_bytes: int | None
+    client: str | None
+    error: str | None
+
+
+class SlowCallLog:
+    def __init__(
+        self,
+        capacity: int,
+        spill_path: str | None = None,
+        spill_max_bytes: int = 50 * 2**20,
+    ):
+        self._records: deque[SlowCall] = deque(maxlen=capacity)
+        self.spill_path = Path(spill_path) if spill_path else None
+        self.spill_max_bytes = spill_max_bytes
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def record(self, call: SlowCall) -> None:
+        self._records.append(call)
+        logger.warning(
+            f"[SLOW] {call.kind} {call.method} — {call.duration_ms} мс, этапы {call.stages}, "
+            f"отпечаток {call.fingerprint}"
+        )
+        if self.spill_path is not None:
+            line = json_codec.dumps(call._asdict()) + b"\n"
+            try:
+                asyncio.get_running_loop().run_in_executor(None, self._spill, line)
+            except RuntimeError:
+                self._spill(line)
+
+    def _spill(self, line: bytes) -> None:
+        try:
+            self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+            # Файл ограничен по размеру: старый уходит в .1 и перезаписывается при следующей ротации
+            if (
+                self.spill_path.exists()
+                and self.spill_path.stat().st_size > self.spill_max_bytes
+            ):
+                self.spill_path.replace(
+                    self.spill_path.with_suffix(self.spill_path.suffix + ".1")
+                )
+            with self.spill_path.open("ab") as file:
+                file.write(line)
+        except OSError as e:
+            logger.warning(
+                f"Не удалось записать медленный вызов в {self.spill_path}: {e}"
+            )
+
+    def slowest(
+        self, limit: int = 10, method: str | None = None, kind: str | None = None
+    ) -> dict[str, list[dict[str, Any]]]:
+        """Самые медленные вызовы: до limit на каждый метод, по убыванию длительности."""
+        by_method: dict[str, list[SlowCall]] = {}
+        for call in self._records:
+            if (method and call.method != method) or (kind and call.kind != kind):
+                continue
+            by_method.setdefault(call.method, []).append(call)
+        return {
+            name: [
+                call._asdict()
+                for call in sorted(calls, key=lambda c: -c.duration_ms)[:limit]
+            ]
+            for name, calls in sorted(by_method.items())
+        }
+
+    def clear(self) -> None:
+        self._records.clear()
+
+
+slow_calls = SlowCallLog(
+    settings.SLOW_CALLS_CAPACITY, spill_path=settings.SLOW_CALLS_SPILL_PATH or None
+)
+
+
+def record_if_slow(
+    kind: str,
+    method: str,
+    started: float,
+    threshold_ms: float,
+    request: Any,
+    stages: dict[str, float] | None = None,
+    preceding_stages: dict[str, float] | None = None,
+    response_bytes: int | None = None,
+    client: str | None = None,
+    error: BaseException | None = None,
+) -> None:
+    """Сохраняет вызов в журнал, если он длился дольше threshold_ms (started — time.perf_counter())."""
+    duration_ms = (time.perf_counter() - started) * 1000
+    if not settings.SLOW_CALLS_ENABLED or duration_ms < threshold_ms:
+        return
+    slow_calls.record(
+        SlowCall(
+            kind=kind,
+            method=method,
+            duration_ms=round(duration_ms, 1),
+            started_at=time.time() - duration_ms / 1000,
+            fingerprint=fingerprint(request),
+            request=scrub(request),
+            stages=stages or {},
+            preceding_stages=preceding_stages or {},
+            response_bytes=response_bytes,
+            client=client,
+            error=f"{type(error).__name__}: {error}" if error is not None else None,
+        )
+    )
@@ -0,0 +1,83 @@
+"""
+Конфигурация gunicorn для продакшена.
+
+Профиль выбирается переменной окружения RUNTIME_PROFILE:
+
+* ``default`` — как раньше: 4 воркера uvicorn на asyncio и h11;
+* ``performance`` — uvloop и httptools (если установлены), число воркеров по числу ядер,
+  перезапуск воркеров через max_requests (с jitter, чтобы не перезапускались разом)
+  против медленного роста памяти.
+
+Модуль читается мастер-процессом gunicorn до импорта приложения, поэтому настройки
+берутся напрямую из окружения, а не из app.core.config.
+
+Запуск:
+    gunicorn -c app/gunicorn_conf.py app.main:app
+"""
+
+import importlib.util
+import multiprocessing
+import os
+
+from uvicorn.workers import UvicornWorker
+
+RUNTIME_PROFILE = os.getenv("RUNTIME_PROFILE", "default").strip().lower()
+if RUNTIME_PROFILE not in ("default", "performance"):
+    raise ValueError(
+        f"Неизвестный RUNTIME_PROFILE '{RUNTIME_PROFILE}', ожидается default или performance"
+    )
+
+HAS_UVLOOP = importlib.util.find_spec("uvloop") is not None
+HAS_HTTPTOOLS = importlib.util.find_spec("httptools") is not None
+
+
+class StandardUvicornWorker(UvicornWorker):
+    """
+    Воркер uvicorn на стандартных asyncio и h11 — так прод работал до появления профилей.
+
+    Обычный UvicornWorker с loop/http="auto" подхватил бы uvloop/httptools, как только они
+    оказались в зависимостях, и профиль default перестал бы быть базой для сравнения.
+    """
+
+    CONFIG_KWARGS = {  # noqa: RUF012 — атрибут класса, который читает uvicorn
+        **UvicornWorker.CONFIG_KWARGS,
+        "loop": "asyncio",
+        "http": "h11",
+    }
+
+
+class PerformanceUvicornWorker(UvicornWorker):
+    """Воркер uvicorn с явным выбором uvloop/httptools и откатом на asyncio/h11."""
+
+    CONFIG_KWARGS = {  # noqa: RUF012 — атрибут класса, который читает uvicorn
+        **UvicornWorker.CONFIG_KWARGS,
+        "loop": "uvloop" if HAS_UVLOOP else "asyncio",
+        "http": "httptools" if HAS_HTTPTOOLS else "h11",
+    }
+
+
+def _int_env(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+
+if RUNTIME_PROFILE == "performance":
+    # Нагрузка — асинхронный ввод-вывод к шлюзу, поэтому одного воркера на ядро достаточно
+    workers = _int_env("WEB_CONCURRENCY", max(2, multiprocessing.cpu_count()))
+    worker_class = "app.gunicorn_conf.PerformanceUvicornWorker"
+    max_requests = _int_env("MAX_REQUESTS", 2000)
+    max_requests_jitter = _int_env("MAX_REQUESTS_JITTER", 200)
+    keepalive = 5
+    graceful_timeout = 30
+else:
+    workers = _int_env("WEB_CONCURRENCY", 4)
+    worker_class = "app.gunicorn_conf.StandardUvicornWorker"
+
+
+def on_starting(server) -> None:
+    server.log.info(
+        f"Профиль запуска: {RUNTIME_PROFILE}, воркеров: {workers}, "
+        f"uvloop: {HAS_UVLOOP}, httptools: {HAS_HTTPTOOLS}"
+    )
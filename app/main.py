@@ -4,16 +4,55 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from prometheus_fastapi_instrumentator import Instrumentator
 
-from app.core import get_settings, init_gateway_client, shutdown_gateway_client
+from app.core import (
+    CodecJSONResponse,
+    get_settings,
+    init_gateway_client,
+    shutdown_gateway_client,
+    start_cpu_offload,
+    start_loop_monitor,
+    start_memory_monitor,
+    stop_cpu_offload,
+    stop_loop_monitor,
+    stop_memory_monitor,
+)
+from app.core.admission import AdmissionMiddleware
+from app.core.loop_monitor import RouteLabelMiddleware
+from app.core.profiling import ProfilingMiddleware
 from app.route import router as api_router
+from app.service import (
+    init_gateway_batcher,
+    shutdown_gateway_batcher,
+    start_enrich_jobs,
+    start_gateway_prober,
+    start_search_indexer,
+    stop_enrich_jobs,
+    stop_gateway_prober,
+    stop_search_indexer,
+)
 
 settings = get_settings()
 tags_metadata = []
 
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_gateway_client(app)
+    await start_cpu_offload(app)
+    await init_gateway_batcher(app)
+    await start_gateway_prober(app)
+    await start_search_indexer(app)
+    await start_enrich_jobs(app)
+    await start_memory_monitor(app)
+    await start_loop_monitor(app)
     yield
+    await stop_loop_monitor(app)
+    await stop_memory_monitor(app)
+    await stop_enrich_jobs(app)
+    await stop_search_indexer(app)
+    await shutdown_gateway_batcher(app)
+    await stop_gateway_prober(app)
+    await stop_cpu_offload(app)
     await shutdown_gateway_client(app)
 
 
@@ -22,20 +61,37 @@ app = FastAPI(
     title="АПИ для браузерного расширения ЕВМИАС -> ОМС",
     description="[CМП] АПИ для сбора данных из ЕВМИАС и заполнения формы ГИС ОМС. {gateway version}",
     lifespan=lifespan,
-    version="0.2.0"
+    version="0.2.0",
+    default_response_class=CodecJSONResponse,
 )
 
+if settings.ADMISSION_ENABLED:
+    # Внутри метрик и CORS: сброшенные 503 попадают в http-метрики и получают заголовки CORS
+    app.add_middleware(AdmissionMiddleware)
+
 instrumentator = Instrumentator()
 instrumentator.instrument(app).expose(app)
 
 app.add_middleware(
-    CORSMiddleware,  # noqa
+    CORSMiddleware,
     allow_origin_regex=settings.CORS_ALLOW_REGEX,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],  # Разрешить все методы (GET, POST, и т.д.)
     allow_headers=["*"],  # Разрешить все заголовки
+    expose_headers=[
+        "ETag",
+        "X-Search-Window",
+        "Retry-After",
+    ],  # Заголовки ответа, доступные расширению
 )
 
 
+if settings.PROFILE_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+
+if settings.LOOP_MONITOR_ENABLED:
+    # Внешний слой: маршрут запроса нужен монитору цикла событий при любой блокировке ниже
+    app.add_middleware(RouteLabelMiddleware)
+
 app.include_router(api_router)
@@ -1,4 +1,9 @@
-from .extension import EnrichmentRequestData, ExtensionStartedData
+from .extension import EnrichmentJobRequest, EnrichmentRequestData, ExtensionStartedData
 from .gateway_request import GatewayRequest
 
-__all__ = ["GatewayRequest", "ExtensionStartedData", "EnrichmentRequestData"]
+__all__ = [
+    "EnrichmentJobRequest",
+    "EnrichmentRequestData",
+    "ExtensionStartedData",
+    "GatewayRequest",
+]
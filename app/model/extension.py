@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Any, Dict, Optional
+from typing import Any, Literal
 
 from pydantic import BaseModel, Field, model_validator
 
@@ -8,17 +8,47 @@ class ExtensionStartedData(BaseModel):
     """Модель для стартовых данных"""
 
     last_name: str = Field(..., description="Фамилия пациента", examples=["АЛЕЙНИКОВ"])
-    start_date: Optional[str] = Field(
+    start_date: str | None = Field(
         None, description="Дата начала периода в формате YYYY-MM-DD", examples=[""]
     )
-    end_date: Optional[str] = Field(
+    end_date: str | None = Field(
         None, description="Дата окончания периода в формате YYYY-MM-DD", examples=[""]
     )
-    dis_date_range: Optional[str] = Field(
+    dis_date_range: str | None = Field(
         None, description="Диапазон дат госпитализации", examples=[""]
     )
+    limit: int | None = Field(
+        None,
+        ge=1,
+        le=500,
+        description="Размер страницы. Если задан (или передан cursor), ответ отдается постранично",
+        examples=[None],
+    )
+    cursor: str | None = Field(
+        None,
+        description=(
+            "Курсор следующей страницы из предыдущего ответа. Действует только для того же "
+            "запроса и того же результата поиска, иначе 400"
+        ),
+        examples=[None],
+    )
+    progressive: bool = Field(
+        False,
+        description=(
+            "Прогрессивный поиск (только без явных дат): сначала последние дни, "
+            "окно расширяется, только если подразделение ничего не нашло"
+        ),
+    )
+    search_mode: Literal["exact", "prefix", "fuzzy"] = Field(
+        "exact",
+        description=(
+            "Режим поиска по фамилии: точный, по началу фамилии или с допуском опечаток. "
+            "Префиксный и нечеткий поиск работают по локальному индексу последних выписок; "
+            "если диапазон дат шире окна индекса, в X-Search-Window подразделение помечается как index"
+        ),
+    )
 
-    @model_validator(mode="before")  # noqa
+    @model_validator(mode="before")
     @classmethod
     def validate_and_format_date_range(cls, data: dict) -> dict:
         start_date = data.get("start_date")
@@ -44,6 +74,31 @@ class ExtensionStartedData(BaseModel):
 class EnrichmentRequestData(BaseModel):
     """Модель данных для получения данных от фронтенда"""
 
-    started_data: Dict[str, Any] = Field(
+    started_data: dict[str, Any] = Field(
         ..., description="Оригинальные данные о событии/пациенте из ЕВМИАС"
     )
+    force_refresh: bool = Field(
+        False,
+        description=(
+            "Пересчитать обогащение, не используя сохраненный результат и кэш ответов шлюза "
+            "(если шлюз недоступен, данные все равно берутся из кэша с отметкой stale)"
+        ),
+    )
+    deadline_ms: int | None = Field(
+        None,
+        ge=100,
+        description=(
+            "Бюджет времени на обогащение, мс (не больше ENRICH_DEADLINE_SECONDS). "
+            "Части, не успевшие загрузиться (в том числе основные: person, movement, referral, "
+            "disease), перечисляются в partial, их поля формы остаются пустыми"
+        ),
+    )
+
+
+class EnrichmentJobRequest(EnrichmentRequestData):
+    """Задание на обогащение, выполняемое в фоне"""
+
+    priority: Literal["interactive", "bulk"] = Field(
+        "interactive",
+        description="Класс приоритета: интерактивные задания выполняются раньше пакетных",
+    )
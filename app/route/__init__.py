@@ -1,8 +1,10 @@
 from fastapi import APIRouter
 
+from .debug import router as debug_router
 from .extension import router as extension_router
 from .health import router as health_router
 
 router = APIRouter()
 router.include_router(health_router)
 router.include_router(extension_router)
+router.include_router(debug_router)
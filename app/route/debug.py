@@ -0,0 +1,193 @@
+import asyncio
+import io
+import pstats
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import FileResponse, PlainTextResponse
+
+from app.core import check_api_key, get_settings, json_codec
+from app.core.memory import GroupBy, memory_profiler
+from app.core.profiling import PROFILE_NAME_RE, profile_dir
+from app.core.slow_calls import slow_calls
+
+settings = get_settings()
+router = APIRouter(
+    prefix="/debug", tags=["Диагностика"], dependencies=[Depends(check_api_key)]
+)
+
+
+@router.get(
+    path="/slow-calls",
+    summary="Самые медленные вызовы",
+    description=(
+        "Медленные вызовы шлюза и обогащения из кольцевого буфера процесса: до limit на каждый "
+        "метод (c.m или enrich_data), по убыванию длительности. Тела запросов без персональных "
+        "данных, с отпечатком и длительностями этапов."
+    ),
+)
+async def list_slow_calls(
+    limit: int = Query(10, ge=1, le=500),
+    method: str | None = Query(
+        None, description="Метод, например EvnXml6E.loadStacEvnXmlList"
+    ),
+    kind: Literal["gateway", "enrich"] | None = Query(None),
+):
+    return {
+        "recorded": len(slow_calls),
+        "thresholds_ms": {
+            "gateway": settings.SLOW_GATEWAY_CALL_MS,
+            "enrich": settings.SLOW_ENRICH_MS,
+        },
+        "calls": slow_calls.slowest(limit=limit, method=method, kind=kind),
+    }
+
+
+@router.get(
+    path="/slow-calls/download",
+    summary="Выгрузить медленные вызовы",
+    description="Те же записи, что и /debug/slow-calls, файлом NDJSON (по записи в строке).",
+)
+async def download_slow_calls(
+    limit: int = Query(100, ge=1, le=500),
+    method: str | None = Query(None),
+    kind: Literal["gateway", "enrich"] | None = Query(None),
+):
+    calls = slow_calls.slowest(limit=limit, method=method, kind=kind)
+    body = b"".join(
+        json_codec.dumps(call) + b"\n" for records in calls.values() for call in records
+    )
+    return Response(
+        body,
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="slow-calls.ndjson"'},
+    )
+
+
+@router.get(
+    path="/profiles",
+    summary="Сохраненные профили запросов",
+    description=(
+        "Профили cProfile запросов с заголовком X-Profile: 1 (или попавших в выборку "
+        "PROFILE_SAMPLE_RATE), новые сначала."
+    ),
+)
+async def list_profiles():
+    directory = profile_dir()
+    profiles = []
+    for path in directory.glob("*.pstats") if directory.exists() else []:
+        stat = path.stat()
+        profiles.append(
+            {"name": path.name, "size": stat.st_size, "created_at": stat.st_mtime}
+        )
+    return sorted(profiles, key=lambda profile: profile["created_at"], reverse=True)
+
+
+@router.get(
+    path="/profiles/{name}",
+    summary="Скачать профиль запроса",
+    description=(
+        "format=pstats — файл для pstats/snakeviz, format=text — топ функций "
+        "(sort: tottime или cumulative)."
+    ),
+)
+async def get_profile(
+    name: str,
+    format: Literal["pstats", "text"] = Query("pstats"),
+    sort: Literal["tottime", "cumulative"] = Query("tottime"),
+    limit: int = Query(50, ge=1, le=500),
+):
+    path = profile_dir() / name
+    if not PROFILE_NAME_RE.match(name) or not path.is_file():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Профиль не найден"
+        )
+
+    if format == "pstats":
+        return FileResponse(path, media_type="application/octet-stream", filename=name)
+
+    output = io.StringIO()
+    pstats.Stats(str(path), stream=output).sort_stats(sort).print_stats(limit)
+    return PlainTextResponse(output.getvalue())
+
+
+@router.get(
+    path="/memory",
+    summary="Память воркера",
+    description=(
+        "RSS, выделенные блоки кучи Python, счетчики GC, состояние tracemalloc и список снимков. "
+        "Все относится к воркеру (pid), который обработал запрос."
+    ),
+)
+async def memory_status():
+    return memory_profiler.status()
+
+
+@router.post(
+    path="/memory/tracemalloc/start",
+    summary="Включить tracemalloc",
+    description="frames — глубина стека выделения (больше — точнее и дороже).",
+)
+async def start_tracemalloc(frames: int = Query(1, ge=1, le=50)):
+    memory_profiler.start(frames)
+    return memory_profiler.status()
+
+
+@router.post(
+    path="/memory/tracemalloc/stop",
+    summary="Выключить tracemalloc",
+    description="Выключает трассировку и удаляет снимки.",
+)
+async def stop_tracemalloc():
+    memory_profiler.stop()
+    return memory_profiler.status()
+
+
+@router.post(
+    path="/memory/snapshots",
+    summary="Снять снимок tracemalloc",
+    description="Возвращает id снимка для /memory/snapshots/{id} и /memory/diff.",
+)
+async def take_memory_snapshot():
+    try:
+        snapshot_id = await asyncio.to_thread(memory_profiler.take_snapshot)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    return {"id": snapshot_id, **memory_profiler.status()["tracemalloc"]}
+
+
+@router.get(
+    path="/memory/snapshots/{snapshot_id}",
+    summary="Топ мест выделения памяти",
+    description="group_by: lineno (строка), filename (файл) или traceback (стек).",
+)
+async def memory_snapshot_top(
+    snapshot_id: int,
+    limit: int = Query(20, ge=1, le=200),
+    group_by: GroupBy = Query("lineno"),  # noqa: B008
+):
+    try:
+        return await asyncio.to_thread(
+            memory_profiler.top, snapshot_id, limit, group_by
+        )
+    except KeyError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=e.args[0])
+
+
+@router.get(
+    path="/memory/diff",
+    summary="Разница между снимками",
+    description="Места, где выделение выросло сильнее всего между снимками first и second.",
+)
+async def memory_snapshot_diff(
+    first: int,
+    second: int,
+    limit: int = Query(20, ge=1, le=200),
+    group_by: GroupBy = Query("lineno"),  # noqa: B008
+):
+    try:
+        return await asyncio.to_thread(
+            memory_profiler.diff, first, second, limit, group_by
+        )
+    except KeyError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=e.args[0])
@@ -1,10 +1,27 @@
-from typing import Annotated, Any, Dict
+from collections.abc import AsyncIterator
+from typing import Annotated, Any
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
 
-from app.core import get_gateway_service, get_settings, logger, route_handler
-from app.model import EnrichmentRequestData, ExtensionStartedData
-from app.service import GatewayService, enrich_data, fetch_started_data
+from app.core import (
+    etag_json_response,
+    get_gateway_service,
+    get_settings,
+    json_codec,
+    limit_client,
+    logger,
+    route_handler,
+)
+from app.model import EnrichmentJobRequest, EnrichmentRequestData, ExtensionStartedData
+from app.service import (
+    GatewayService,
+    enrich_data,
+    enrich_data_events,
+    fetch_started_data,
+    fetch_started_data_page,
+    summarize_search_windows,
+)
 
 settings = get_settings()
 router = APIRouter(prefix="/extension", tags=["Расширение"])
@@ -12,35 +29,76 @@ router = APIRouter(prefix="/extension", tags=["Расширение"])
 
 @router.post(
     path="/search",
+    dependencies=[Depends(limit_client)],
     summary="Получить список пациентов по фильтру",
-    description="Получить список пациентов по фильтру",
+    description=(
+        "Получить список пациентов по фильтру, отсортированный по дате выписки (сначала новые). "
+        "При передаче limit/cursor ответ отдается постранично: items, total, "
+        "totals_by_building и next_cursor для следующей страницы."
+    ),
 )
 @route_handler(debug=True)
 async def search_patients_hospitals(
-        patient: ExtensionStartedData,
-        gateway_service: Annotated[GatewayService, Depends(get_gateway_service)],
+    request: Request,
+    patient: ExtensionStartedData,
+    gateway_service: Annotated[GatewayService, Depends(get_gateway_service)],
 ):
     logger.info("Запрос на поиск пациентов")
+
+    # Постраничный режим включается параметрами limit/cursor, без них — весь список, как раньше
+    if patient.limit or patient.cursor:
+        page = await fetch_started_data_page(patient, gateway_service)
+        if not page["total"]:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Данные не найдены"
+            )
+        return etag_json_response(
+            request,
+            page,
+            headers=_search_window_headers(page.get("search_windows", {})),
+        )
+
     result = await fetch_started_data(patient, gateway_service)
 
     if not result:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Данные не найдены"
         )
-    return result
+
+    return etag_json_response(
+        request,
+        result,
+        headers=_search_window_headers(summarize_search_windows(result)),
+    )
+
+
+def _search_window_headers(search_windows: dict[str, str]) -> dict[str, str]:
+    """
+    Какое окно поиска сработало: "cid=14d, cid=full" для прогрессивного поиска,
+    "cid=index", если искали только по окну локального индекса.
+    """
+    if not search_windows:
+        return {}
+    return {
+        "X-Search-Window": ", ".join(
+            f"{cid}={window}" for cid, window in search_windows.items()
+        )
+    }
 
 
 @router.post(
     path="/enrich-data",
+    dependencies=[Depends(limit_client)],
     summary="Обогатить данные для фронта",
     description="Обогатить данные для фронта",
-    response_model=Dict[str, Any],
+    response_model=dict[str, Any],
 )
 @route_handler(debug=True)
 async def enrich_started_data_for_front(
-        enrich_request: EnrichmentRequestData,
-        gateway_service: Annotated[GatewayService, Depends(get_gateway_service)],
-) -> Dict[str, Any]:
+    request: Request,
+    enrich_request: EnrichmentRequestData,
+    gateway_service: Annotated[GatewayService, Depends(get_gateway_service)],
+) -> Response:
     logger.info("Обащение данных для фронта")
     result = await enrich_data(enrich_request, gateway_service)
 
@@ -48,4 +106,83 @@ async def enrich_started_data_for_front(
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Не удалось обогатить данные"
         )
-    return result
+    # Отдаем готовые байты (минуя jsonable_encoder и response_model) или 304 по ETag
+    return etag_json_response(request, result)
+
+
+@router.post(
+    path="/enrich-data/stream",
+    dependencies=[Depends(limit_client)],
+    summary="Обогатить данные для фронта потоком",
+    description=(
+        "То же обогащение, но в формате NDJSON (по событию JSON в строке): сначала core "
+        "с полями формы input[name=...], затем medical_service_data, "
+        "additional_diagnosis_data и discharge_summary по мере загрузки, в конце done "
+        "со списком partial (и stale — методы шлюза, данные которых взяты из устаревшего "
+        "кэша). Ошибка после начала потока приходит событием error."
+    ),
+)
+@route_handler(debug=True)
+async def enrich_started_data_stream(
+    enrich_request: EnrichmentRequestData,
+    gateway_service: Annotated[GatewayService, Depends(get_gateway_service)],
+) -> StreamingResponse:
+    logger.info("Потоковое обогащение данных для фронта")
+
+    async def ndjson() -> AsyncIterator[bytes]:
+        async for event in enrich_data_events(enrich_request, gateway_service):
+            yield json_codec.dumps(event) + b"\n"
+
+    return StreamingResponse(
+        ndjson(),
+        media_type="application/x-ndjson",
+        # Отключаем буферизацию прокси, иначе события придут одним куском в конце
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _enrich_jobs(request: Request):
+    workers = getattr(request.app.state, "enrich_jobs", None)
+    if workers is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Очередь заданий обогащения отключена",
+        )
+    return workers
+
+
+@router.post(
+    path="/enrich-jobs",
+    dependencies=[Depends(limit_client)],
+    summary="Поставить обогащение в очередь",
+    description=(
+        "Ставит обогащение в очередь и сразу возвращает job_id. Статус и результат "
+        "запрашиваются через GET /extension/enrich-jobs/{job_id}. Интерактивные задания "
+        "выполняются раньше пакетных (priority=bulk)."
+    ),
+    status_code=status.HTTP_202_ACCEPTED,
+)
+@route_handler(debug=True)
+async def create_enrich_job(request: Request, job: EnrichmentJobRequest):
+    job_id = await _enrich_jobs(request).submit(job)
+    logger.info(f"Задание обогащения {job_id} поставлено в очередь ({job.priority})")
+    return {"job_id": job_id, "status": "queued"}
+
+
+@router.get(
+    path="/enrich-jobs/{job_id}",
+    summary="Статус задания на обогащение",
+    description=(
+        "Статус задания: queued, running, done (с result) или failed (с error). "
+        "Готовые результаты хранятся ENRICH_JOBS_RESULT_TTL секунд, после чего отдается 404."
+    ),
+)
+@route_handler(debug=True)
+async def get_enrich_job(request: Request, job_id: str):
+    job = await _enrich_jobs(request).queue.get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Задание не найдено или устарело",
+        )
+    return job
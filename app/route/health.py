@@ -1,10 +1,11 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request, status
 
-from app.core import check_api_key, get_gateway_service
+from app.core import CodecJSONResponse, check_api_key, get_gateway_service
 from app.model import GatewayRequest
 from app.service import GatewayService
+from app.service.gateway.prober import PROBE_PAYLOAD
 
 router = APIRouter(
     prefix="/health", tags=["Проверка здоровья"], dependencies=[Depends(check_api_key)]
@@ -23,20 +24,58 @@ async def check():
 @router.post(
     path="/gateway",
     summary="Проверка связи со шлюзом API",
-    description="Отправляет тестовый запрос на API-шлюз для проверки связи и аутентификации.",
+    description=(
+        "Состояние шлюза по фоновым проверкам: задержки p50/p95/p99, последний ответ и "
+        "последняя ошибка, состояние цепи. Шлюз при этом не вызывается; если фоновая "
+        "проверка отключена, отправляет тестовый запрос на API-шлюз."
+    ),
 )
 async def check_gateway_connection(
+    request: Request,
     gateway_service: Annotated[GatewayService, Depends(get_gateway_service)],
 ):
-    payload_dict = {
-        "params": {"c": "Common", "m": "getCurrentDateTime"},
-        "data": {"is_activerulles": "true"},
-    }
+    prober = getattr(request.app.state, "gateway_prober", None)
+    if prober is not None:
+        snapshot = prober.snapshot()
+        return CodecJSONResponse(
+            snapshot,
+            status_code=(
+                status.HTTP_503_SERVICE_UNAVAILABLE
+                if prober.circuit_open
+                else status.HTTP_200_OK
+            ),
+        )
 
-    validated_payload = GatewayRequest.model_validate(payload_dict)
+    validated_payload = GatewayRequest.model_validate(PROBE_PAYLOAD)
 
     response = await gateway_service.make_request(
         method="post", json=validated_payload.model_dump()
     )
 
     return response
+
+
+@router.get(
+    path="/ready",
+    summary="Готовность к приему запросов",
+    description=(
+        "200, если шлюз отвечает на фоновые проверки и очередь вызовов к шлюзу не переполнена, "
+        "иначе 503. Отвечает из состояния фоновой проверки, шлюз не вызывается."
+    ),
+)
+async def check_ready(request: Request):
+    prober = getattr(request.app.state, "gateway_prober", None)
+    if prober is None:
+        return {
+            "ready": True,
+            "checks": {},
+            "detail": "Фоновая проверка шлюза отключена",
+        }
+
+    ready, details = prober.readiness()
+    return CodecJSONResponse(
+        {"ready": ready, **details},
+        status_code=(
+            status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE
+        ),
+    )
@@ -1,37 +1,73 @@
-from .extension.enrich import enrich_data
-from .extension.request import (fetch_disease_data,
-                                fetch_patient_discharge_summary,
-                                fetch_person_data, fetch_referral_data)
+from .extension.enrich import enrich_data, enrich_data_events
+from .extension.indexer import start_search_indexer, stop_search_indexer
+from .extension.jobs import start_enrich_jobs, stop_enrich_jobs
+from .extension.mapping import CaseRecords, map_case, map_cases
+from .extension.pagination import fetch_started_data_page
+from .extension.request import (
+    fetch_disease_data,
+    fetch_patient_discharge_summary,
+    fetch_person_data,
+    fetch_referral_data,
+)
 from .extension.sanitaizer import filter_operations_from_services
-from .extension.started import fetch_started_data
-from .extension.utils import (get_bed_profile_code, get_department_code,
-                              get_department_name, get_direction_date,
-                              get_disease_type_code,
-                              get_medical_care_condition,
-                              get_medical_care_form, get_medical_care_profile,
-                              get_outcome_code, get_referred_organization,
-                              safe_gather, correct_medical_profile)
+from .extension.started import fetch_started_data, summarize_search_windows
+from .extension.utils import (
+    correct_medical_profile,
+    get_bed_profile_code,
+    get_department_code,
+    get_department_name,
+    get_direction_date,
+    get_disease_type_code,
+    get_medical_care_condition,
+    get_medical_care_form,
+    get_medical_care_profile,
+    get_outcome_code,
+    get_referred_organization,
+    safe_gather,
+)
+from .gateway.batcher import (
+    GatewayBatcher,
+    init_gateway_batcher,
+    shutdown_gateway_batcher,
+)
 from .gateway.gateway_service import GatewayService
+from .gateway.prober import GatewayProber, start_gateway_prober, stop_gateway_prober
 
 __all__ = [
+    "CaseRecords",
+    "GatewayBatcher",
+    "GatewayProber",
     "GatewayService",
-    "fetch_started_data",
+    "correct_medical_profile",
     "enrich_data",
+    "enrich_data_events",
+    "fetch_disease_data",
+    "fetch_patient_discharge_summary",
     "fetch_person_data",
     "fetch_referral_data",
+    "fetch_started_data",
+    "fetch_started_data_page",
     "filter_operations_from_services",
-    "fetch_patient_discharge_summary",
-    "safe_gather",
-    "get_referred_organization",
-    "fetch_disease_data",
-    "get_department_name",
-    "get_department_code",
     "get_bed_profile_code",
-    "get_medical_care_profile",
+    "get_department_code",
+    "get_department_name",
     "get_direction_date",
+    "get_disease_type_code",
     "get_medical_care_condition",
     "get_medical_care_form",
+    "get_medical_care_profile",
     "get_outcome_code",
-    "get_disease_type_code",
-    "correct_medical_profile"
+    "get_referred_organization",
+    "init_gateway_batcher",
+    "map_case",
+    "map_cases",
+    "safe_gather",
+    "shutdown_gateway_batcher",
+    "start_enrich_jobs",
+    "start_gateway_prober",
+    "start_search_indexer",
+    "stop_enrich_jobs",
+    "stop_gateway_prober",
+    "stop_search_indexer",
+    "summarize_search_windows",
 ]
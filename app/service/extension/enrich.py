@@ -1,150 +1,406 @@
-import re
+import asyncio
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from typing import Any
 
-from app.core import get_settings
+from app.core import get_settings, json_codec
+from app.core.deadline import DeadlineExceeded, deadline_scope
+from app.core.fairness import current_client
 from app.core.logger_setup import logger
+from app.core.slow_calls import record_if_slow, record_stage, stage_scope
 from app.model import EnrichmentRequestData
-from app.service.gateway.gateway_service import GatewayService
-from app.mapper import (
-    division_addresses,
-    DEFAULT_DIVISION_ADDRESS,
-    division_structure_names,
-    DEFAULT_DIVISION_STRUCTURE_NAME,
+from app.service.extension.enrich_store import EnrichmentStore, started_data_fingerprint
+from app.service.extension.mapping import (
+    SECTION_KEYS,
+    CaseRecords,
+    map_case,
+    map_discharge_summary,
 )
 from app.service.extension.request import (
-    fetch_and_process_additional_diagnosis, fetch_disease_data,
-    fetch_movement_data, fetch_operations_data,
-    fetch_patient_discharge_summary, fetch_person_data, fetch_referral_data)
-from app.service.extension.utils import (get_bed_profile_code,
-                                         get_department_code,
-                                         get_department_name,
-                                         get_direction_date,
-                                         get_disease_type_code,
-                                         get_medical_care_condition,
-                                         get_medical_care_form,
-                                         get_medical_care_profile,
-                                         get_outcome_code,
-                                         get_referred_organization,
-                                         safe_gather, correct_medical_profile)
+    fetch_and_process_additional_diagnosis,
+    fetch_disease_data,
+    fetch_movement_data,
+    fetch_operations_data,
+    fetch_patient_discharge_summary,
+    fetch_person_data,
+    fetch_referral_data,
+)
+from app.service.extension.utils import fetch_referred_org_name, safe_gather
+from app.service.gateway.batcher import batch_lane
+from app.service.gateway.gateway_service import GatewayService
+from app.service.gateway.response_cache import revalidate_scope, stale_scope
 
 settings = get_settings()
 
 
+enrichment_store = EnrichmentStore(
+    settings.ENRICH_STORE_PATH,
+    max_age_seconds=settings.ENRICH_STORE_MAX_AGE_DAYS * 86400,
+)
+
+
+# Колбэк потоковой выдачи: (имя события, данные)
+EventCallback = Callable[[str, Any], None]
+
+
+def _deadline_budget(enrich_request: EnrichmentRequestData) -> float:
+    budget = settings.ENRICH_DEADLINE_SECONDS
+    if enrich_request.deadline_ms is not None:
+        budget = min(budget, enrich_request.deadline_ms / 1000)
+    return budget
+
+
+def _store_key(enrich_request: EnrichmentRequestData) -> tuple[str, str] | None:
+    """(EvnPS_id, отпечаток) для постоянного хранилища или None, если случай не хранится."""
+    started_data = enrich_request.started_data
+    event_id = started_data.get("EvnPS_id")
+    # Храним только выписанные случаи: у незакрытых данные еще меняются
+    if not (
+        settings.ENRICH_STORE_ENABLED and event_id and started_data.get("EvnPS_disDate")
+    ):
+        return None
+    return str(event_id), started_data_fingerprint(started_data)
+
+
+async def _load_stored(enrich_request: EnrichmentRequestData) -> dict | None:
+    store_key = _store_key(enrich_request)
+    if store_key is None or enrich_request.force_refresh:
+        return None
+    started = time.perf_counter()
+    stored = await enrichment_store.get(*store_key)
+    record_stage("store", time.perf_counter() - started)
+    if stored is not None:
+        logger.info(f"Обогащение для event_id={store_key[0]} взято из хранилища")
+    return stored
+
+
+async def _save_enriched(
+    enrich_request: EnrichmentRequestData, enriched_data: dict
+) -> None:
+    store_key = _store_key(enrich_request)
+    # Неполный итог (бюджет времени исчерпан) и итог из устаревшего кэша шлюза не сохраняем,
+    # чтобы не закрепить их надолго
+    if (
+        store_key is not None
+        and enriched_data
+        and not enriched_data.get("partial")
+        and not enriched_data.get("stale")
+    ):
+        await enrichment_store.put(*store_key, enriched_data)
+
+
 async def enrich_data(
     enrich_request: EnrichmentRequestData, gateway_service: GatewayService
 ):
+    """
+    Обогащает данные случая в пределах бюджета времени (deadline_ms из запроса, не больше
+    ENRICH_DEADLINE_SECONDS). Для выписанных случаев итог берется из постоянного хранилища,
+    если отпечаток started_data не изменился и не запрошено принудительное обновление.
+    """
     logger.info("Запрос на обогащение получен.")
-    started_data = enrich_request.started_data
+    started = time.perf_counter()
+    enriched_data, error = None, None
+    with deadline_scope(_deadline_budget(enrich_request)), stage_scope() as stages:
+        try:
+            enriched_data = await _load_stored(enrich_request)
+            if enriched_data is not None:
+                return enriched_data
+
+            with revalidate_scope(enrich_request.force_refresh):
+                enriched_data = await _build_enriched_data(
+                    enrich_request.started_data, gateway_service
+                )
+            await _save_enriched(enrich_request, enriched_data)
+            return enriched_data
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            _record_slow_enrichment(
+                "enrich_data", enrich_request, started, stages, enriched_data, error
+            )
+
+
+async def enrich_data_events(
+    enrich_request: EnrichmentRequestData, gateway_service: GatewayService
+) -> AsyncIterator[dict[str, Any]]:
+    """
+    Потоковое обогащение: сначала событие core с полями формы, затем разделы
+    (medical_service_data, additional_diagnosis_data, discharge_summary) по мере загрузки
+    и в конце done со списком partial (и stale, если часть данных взята из устаревшего кэша
+    шлюза). Ошибка после начала выдачи приходит событием error.
+    """
+    logger.info("Запрос на потоковое обогащение получен.")
+    queue: asyncio.Queue[dict[str, Any] | None] = asyncio.Queue()
+
+    def emit(event: str, data: Any) -> None:
+        queue.put_nowait({"event": event, "data": data})
+
+    async def produce() -> None:
+        started = time.perf_counter()
+        error = None
+        with stage_scope() as stages:
+            try:
+                with deadline_scope(_deadline_budget(enrich_request)):
+                    await _produce_enrichment_events(
+                        enrich_request, gateway_service, emit
+                    )
+            except Exception as e:  # noqa: BLE001
+                error = e
+                logger.exception(f"Ошибка потокового обогащения: {e}")
+                emit("error", {"detail": getattr(e, "detail", None) or str(e)})
+            finally:
+                queue.put_nowait(None)
+                _record_slow_enrichment(
+                    "enrich_data_stream", enrich_request, started, stages, None, error
+                )
+
+    producer = asyncio.create_task(produce())
+    try:
+        while (event := await queue.get()) is not None:
+            yield event
+    finally:
+        # Клиент отключился — загрузку дальше не продолжаем и дожидаемся снятия ее задач
+        if not producer.done():
+            producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+
+
+def _record_slow_enrichment(
+    method: str,
+    enrich_request: EnrichmentRequestData,
+    started: float,
+    stages: dict[str, float],
+    enriched_data: dict | None,
+    error: BaseException | None,
+) -> None:
+    # Размер итога считаем только для медленных обогащений, чтобы не сериализовать каждый ответ
+    if (time.perf_counter() - started) * 1000 < settings.SLOW_ENRICH_MS:
+        return
+    record_if_slow(
+        "enrich",
+        method,
+        started,
+        settings.SLOW_ENRICH_MS,
+        request=enrich_request.started_data,
+        stages=stages,
+        response_bytes=len(json_codec.dumps(enriched_data)) if enriched_data else None,
+        client=current_client.get(),
+        error=error,
+    )
+
+
+async def _produce_enrichment_events(
+    enrich_request: EnrichmentRequestData,
+    gateway_service: GatewayService,
+    emit: EventCallback,
+) -> None:
+    stored = await _load_stored(enrich_request)
+    if stored is not None:
+        emit("core", {k: v for k, v in stored.items() if k not in SECTION_KEYS})
+        for key in SECTION_KEYS:
+            emit(key, stored.get(key))
+        emit("done", {"partial": []})
+        return
+
+    with revalidate_scope(enrich_request.force_refresh), stale_scope() as stale:
+        records, partial = await fetch_case_records(
+            enrich_request.started_data, gateway_service, on_event=emit
+        )
+    enriched_data = map_case(records)
+    done = {"partial": partial}
+    if partial:
+        enriched_data["partial"] = partial
+    if stale:
+        enriched_data["stale"] = done["stale"] = stale
+    emit("done", done)
+    await _save_enriched(enrich_request, enriched_data)
+
+
+async def _build_enriched_data(started_data: dict, gateway_service: GatewayService):
+    with stale_scope() as stale:
+        records, partial = await fetch_case_records(started_data, gateway_service)
+    started = time.perf_counter()
+    enriched_data = map_case(records)
+    record_stage("mapping", time.perf_counter() - started)
+    if partial:
+        logger.warning(
+            f"Обогащение event_id={started_data.get('EvnPS_id')} неполное: {partial}"
+        )
+        enriched_data["partial"] = partial
+    if stale:
+        # Шлюз не ответил, часть данных взята из кэша: расширение покажет, что они могли устареть
+        logger.warning(
+            f"Обогащение event_id={started_data.get('EvnPS_id')} с устаревшими данными: {stale}"
+        )
+        enriched_data["stale"] = stale
+    return enriched_data
+
+
+async def _within_budget(
+    part: str, coroutine: Awaitable[Any], partial: list[str], optional: bool = False
+) -> Any:
+    """
+    Выполняет загрузку части данных; если бюджет времени исчерпан — отмечает часть в partial.
+    Так ведут себя и основные части (person, movement, referral, disease): форма отдается
+    с пустыми полями этих частей, а не ошибкой, и клиент видит их в partial. Отдельный резерв
+    бюджета под основную цепочку не выделяется — она и так идет первой и в своей полосе
+    пакетирования. Вызовы необязательных частей пакетируются отдельно от основных.
+    """
+    token = batch_lane.set("optional") if optional else None
+    started = time.perf_counter()
+    try:
+        return await coroutine
+    except DeadlineExceeded:
+        partial.append(part)
+        return None
+    finally:
+        record_stage(part, time.perf_counter() - started)
+        if token is not None:
+            batch_lane.reset(token)
+
+
+async def fetch_case_records(
+    started_data: dict,
+    gateway_service: GatewayService,
+    on_event: EventCallback | None = None,
+) -> tuple[CaseRecords, list[str]]:
+    """
+    Загружает из шлюза все записи, нужные для формы по случаю. Само сопоставление
+    выполняется синхронно в map_case.
+
+    Разделы (операции, эпикриз, сопутствующие диагнозы) и направившая организация грузятся
+    параллельно с основной цепочкой и не задерживают ее. Если передан on_event, поля формы
+    отдаются событием core, как только готова основная цепочка, а разделы — по мере
+    загрузки. Возвращает записи и список частей, не загруженных из-за исчерпания бюджета.
+    """
     person_id = started_data.get("Person_id")
     event_id = started_data.get("EvnPS_id")
     logger.debug(f"Извлечены данные: person_id={person_id}, event_id={event_id}")
+    partial: list[str] = []
+    optional_tasks: list[asyncio.Task] = []
 
-    results = await safe_gather(
-        fetch_person_data(person_id, gateway_service),
-        fetch_movement_data(event_id, gateway_service),
-        fetch_referral_data(event_id, gateway_service),
-        fetch_operations_data(event_id, gateway_service),
-        fetch_patient_discharge_summary(event_id, gateway_service),
-    )
-    (
-        person_data,
-        movement_data,
-        referred_data,
-        medical_service_data,
-        discharge_summary,
-    ) = results
-
-    person_data = person_data or {}
-    movement_data = movement_data or {}
-    referred_data = referred_data or {}
-    medical_service_data = medical_service_data or []
-    pure_discharge_summary = discharge_summary.get("pure") if discharge_summary else {}
-
-    # если есть данные об операции, то убираем данные о них из эпикриза, что бы не было дублирования,
-    # это для случаев когда в эпикризе есть данные об операции, а в медстатистике нет
-    if medical_service_data:
-        pure_discharge_summary["item_145"] = None
-
-    valid_additional_diagnosis = await fetch_and_process_additional_diagnosis(
-        referred_data, gateway_service
-    )
-    referred_organization = await get_referred_organization(
-        referred_data, gateway_service
-    )
-    disease_data = await fetch_disease_data(movement_data, gateway_service)
+    def optional_task(part: str, coroutine: Awaitable[Any]) -> asyncio.Task:
+        task = asyncio.create_task(
+            _within_budget(part, coroutine, partial, optional=True)
+        )
+        optional_tasks.append(task)
+        return task
 
-    department_name = await get_department_name(started_data)
-    department_code = await get_department_code(department_name)
+    # Разделы грузятся в своих задачах: при отмене (клиент отключился) или ошибке основной
+    # цепочки они снимаются здесь же, а не ходят в шлюз до конца бюджета
+    try:
+        operations_task = optional_task(
+            "operations", fetch_operations_data(event_id, gateway_service)
+        )
+        discharge_summary_task = optional_task(
+            "discharge_summary",
+            fetch_patient_discharge_summary(event_id, gateway_service),
+        )
 
-    bed_profile_code, corrected_bed_profile_name = await get_bed_profile_code(
-        movement_data, department_name
-    )
-    medical_care_profile = await get_medical_care_profile(
-        movement_data, corrected_bed_profile_name
-    )
+        person_data, movement_data, referred_data = await safe_gather(
+            _within_budget(
+                "person", fetch_person_data(person_id, gateway_service), partial
+            ),
+            _within_budget(
+                "movement", fetch_movement_data(event_id, gateway_service), partial
+            ),
+            _within_budget(
+                "referral", fetch_referral_data(event_id, gateway_service), partial
+            ),
+        )
+        movement_data = movement_data or {}
+        referred_data = referred_data or {}
 
-    diag_code = movement_data.get("Diag_Code", "")
-
-    # todo: корректируем профиль МП в зависимости от кода диагноза - это костыль
-    medical_care_profile = correct_medical_profile(diag_code, medical_care_profile)
-
-    polis_number = person_data.get("Person_EdNum", "")
-    person_birthday = started_data.get("Person_Birthday", "")
-    gender = person_data.get("Sex_Name", "")
-
-    admission_date = started_data.get("EvnPS_setDate")
-    direction_date = await get_direction_date(admission_date)
-    discharge_date = started_data.get("EvnPS_disDate")
-
-    medical_care_conditions = await get_medical_care_condition(department_name)
-    medical_care_form = await get_medical_care_form(referred_data)
-
-    outcome_code = await get_outcome_code(disease_data)
-
-    # todo: подумать, может быть отдельная функция для этого? посмотрим.
-    # Обрабатываем случай, когда в ЕВМИАС не указан исход заболевания.
-    # если условия оказания медицинской помощи 1 (круглосуточный стационар),
-    # то код исхода заболевания должен начинаться с 1xx (см. справочники https://nsi.ffoms.ru/ [V006, V019])
-    if medical_care_conditions == "1" and outcome_code == 202:
-        outcome_code = "102"
-
-    card_number = started_data.get("EvnPS_NumCard", "").split(" ")[0]
-    treatment_outcome_code = movement_data.get("LeaveType_Code")
-
-    disease_type_code = await get_disease_type_code(disease_data)
-
-    division_cid = started_data.get("_division_internal_cid")
-    division_address = division_addresses.get(str(division_cid), DEFAULT_DIVISION_ADDRESS)
-    logger.debug(f"ID подразделения: {division_cid}, Выбран адрес: {division_address}")
-    division_structure_name = division_structure_names.get(str(division_cid), DEFAULT_DIVISION_STRUCTURE_NAME)
-    logger.debug(f"ID подразделения: {division_cid}, Выбрано структурное подразделение: {division_structure_name}")
-
-    enriched_data = {
-        "input[name='ReferralHospitalizationNumberTicket']": "б/н",
-        "input[name='ReferralHospitalizationDateTicket']": direction_date,
-        "input[name='ReferralHospitalizationMedIndications']": "001",
-        "input[name='Enp']": polis_number,
-        "input[name='DateBirth']": person_birthday,
-        "input[name='Gender']": gender,
-        "input[name='TreatmentDateStart']": admission_date,
-        "input[name='TreatmentDateEnd']": discharge_date,
-        "input[name='VidMpV008']": settings.MEDICAL_CARE_TYPE_CODE,
-        "input[name='HospitalizationInfoV006']": medical_care_conditions,
-        "input[name='HospitalizationInfoV014']": medical_care_form,
-        "input[name='HospitalizationInfoSpecializedMedicalProfile']": medical_care_profile,
-        "input[name='HospitalizationInfoSubdivision']": division_structure_name,
-        "input[name='HospitalizationInfoNameDepartment']": department_name,
-        "input[name='HospitalizationInfoOfficeCode']": department_code,
-        "input[name='HospitalizationInfoV020']": bed_profile_code,
-        "input[name='HospitalizationInfoDiagnosisMainDisease']": diag_code,
-        "input[name='CardNumber']": card_number,
-        "input[name='ResultV009']": treatment_outcome_code,
-        "input[name='IshodV012']": outcome_code,
-        "input[name='HospitalizationInfoC_ZABV027']": disease_type_code,
-        "input[name='ReferralHospitalizationSendingDepartment']": referred_organization,
-        "additional_diagnosis_data": valid_additional_diagnosis,
-        "medical_service_data": medical_service_data,
-        "discharge_summary": pure_discharge_summary,
-        "input[name='HospitalizationInfoAddressDepartment']": division_address,
+        additional_diagnosis_task = optional_task(
+            "additional_diagnosis",
+            fetch_and_process_additional_diagnosis(referred_data, gateway_service),
+        )
+        disease_data, referred_org_name = await safe_gather(
+            _within_budget(
+                "disease", fetch_disease_data(movement_data, gateway_service), partial
+            ),
+            # Нужна для поля формы, поэтому идет в основной полосе пакетирования, а не с разделами
+            _within_budget(
+                "referred_organization",
+                fetch_referred_org_name(referred_data, gateway_service),
+                partial,
+            ),
+        )
+
+        records = CaseRecords(
+            started_data=started_data,
+            person_data=person_data or {},
+            movement_data=movement_data,
+            referred_data=referred_data,
+            disease_data=disease_data or {},
+            referred_org_name=referred_org_name,
+        )
+        if on_event is not None:
+            form = map_case(records)
+            on_event("core", {k: v for k, v in form.items() if k not in SECTION_KEYS})
+
+        sections = await _collect_sections(
+            operations_task, additional_diagnosis_task, discharge_summary_task, on_event
+        )
+    finally:
+        await _cancel_unfinished(optional_tasks)
+    records = records._replace(**sections)
+    return records, sorted(partial)
+
+
+async def _cancel_unfinished(tasks: list[asyncio.Task]) -> None:
+    unfinished = [task for task in tasks if not task.done()]
+    for task in unfinished:
+        task.cancel()
+    if unfinished:
+        await asyncio.gather(*unfinished, return_exceptions=True)
+
+
+async def _collect_sections(
+    operations_task: asyncio.Task,
+    additional_diagnosis_task: asyncio.Task,
+    discharge_summary_task: asyncio.Task,
+    on_event: EventCallback | None,
+) -> dict[str, Any]:
+    """Дожидается разделов и отдает каждый событием, как только он готов."""
+    names = {
+        operations_task: "medical_service_data",
+        additional_diagnosis_task: "additional_diagnosis_data",
+        discharge_summary_task: "discharge_summary",
     }
+    results: dict[str, Any] = {}
+    emitted: set[str] = set()
+    pending = set(names)
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            try:
+                results[names[task]] = task.result()
+            except Exception as e:  # noqa: BLE001
+                logger.exception(
+                    f"Раздел {names[task]} не загружен: {type(e).__name__} — {e}"
+                )
+                results[names[task]] = None
 
-    return enriched_data
+        if on_event is None:
+            continue
+        for key, value in results.items():
+            # Эпикриз зависит от операций (см. map_discharge_summary), поэтому отдается после них
+            if key in emitted or (
+                key == "discharge_summary" and "medical_service_data" not in results
+            ):
+                continue
+            if key == "medical_service_data":
+                value = value or []
+            elif key == "discharge_summary":
+                value = map_discharge_summary(value, results["medical_service_data"])
+            on_event(key, value)
+            emitted.add(key)
+
+    medical_service_data = results["medical_service_data"] or []
+    return {
+        "medical_service_data": medical_service_data,
+        "additional_diagnosis": results["additional_diagnosis_data"],
+        "discharge_summary": results["discharge_summary"],
+    }
@@ -0,0 +1,127 @@
+"""
+Постоянное хранилище итогов обогащения (SQLite).
+
+Итог enrich_data для выписанного случая хранится по EvnPS_id вместе с отпечатком полей
+started_data, от которых он зависит. Если отпечаток изменился (например, поменялась дата
+выписки или отделение), запись считается устаревшей и пересчитывается. Файл базы живет
+вне контейнера (том ./data), поэтому переживает перезапуски и передеплой; воркеры gunicorn
+работают с одной базой в режиме WAL.
+"""
+
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+import zlib
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+
+from app.core import json_codec
+from app.core.logger_setup import logger
+
+# Поля started_data, от которых зависит итог обогащения
+FINGERPRINT_FIELDS = (
+    "EvnPS_id",
+    "Person_id",
+    "EvnPS_setDate",
+    "EvnPS_disDate",
+    "EvnPS_NumCard",
+    "LpuSection_Name",
+    "Person_Birthday",
+    "_division_internal_cid",
+)
+
+
+def started_data_fingerprint(started_data: dict[str, Any]) -> str:
+    values = [started_data.get(field) for field in FINGERPRINT_FIELDS]
+    return hashlib.sha256(json_codec.dumps(values)).hexdigest()
+
+
+class EnrichmentStore:
+    """Хранилище сжатых итогов обогащения с инвалидацией по отпечатку и возрасту."""
+
+    def __init__(self, path: str, max_age_seconds: float):
+        self.path = Path(path)
+        self.max_age_seconds = max_age_seconds
+        self._initialized = False
+        # Первые соединения открываются из нескольких потоков to_thread одновременно
+        self._init_lock = threading.Lock()
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        """Открывает соединение на одну транзакцию (коммит на выходе) и закрывает его."""
+        if not self._initialized:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=5)
+        try:
+            if not self._initialized:
+                with self._init_lock:
+                    self._initialize(connection)
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def _initialize(self, connection: sqlite3.Connection) -> None:
+        if self._initialized:
+            return
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS enrichment (
+                evn_ps_id TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                payload BLOB NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """)
+        self._initialized = True
+
+    def _get(self, event_id: str, fingerprint: str) -> dict | None:
+        with self._connection() as connection:
+            row = connection.execute(
+                "SELECT fingerprint, payload, created_at FROM enrichment WHERE evn_ps_id = ?",
+                (event_id,),
+            ).fetchone()
+            if row is None:
+                return None
+
+            stored_fingerprint, payload, created_at = row
+            if (
+                stored_fingerprint != fingerprint
+                or time.time() - created_at > self.max_age_seconds
+            ):
+                connection.execute(
+                    "DELETE FROM enrichment WHERE evn_ps_id = ?", (event_id,)
+                )
+                logger.info(
+                    f"Сохраненное обогащение для EvnPS_id {event_id} устарело и удалено"
+                )
+                return None
+
+        return json_codec.loads(zlib.decompress(payload))
+
+    def _put(self, event_id: str, fingerprint: str, result: dict) -> None:
+        payload = zlib.compress(json_codec.dumps(result), 6)
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO enrichment VALUES (?, ?, ?, ?)",
+                (event_id, fingerprint, payload, time.time()),
+            )
+
+    async def get(self, event_id: str, fingerprint: str) -> dict | None:
+        try:
+            return await asyncio.to_thread(self._get, event_id, fingerprint)
+        except (sqlite3.Error, OSError, ValueError, zlib.error) as e:
+            logger.warning(
+                f"Не удалось прочитать сохраненное обогащение {event_id}: {e}"
+            )
+            return None
+
+    async def put(self, event_id: str, fingerprint: str, result: dict) -> None:
+        try:
+            await asyncio.to_thread(self._put, event_id, fingerprint, result)
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Не удалось сохранить обогащение {event_id}: {e}")
@@ -0,0 +1,197 @@
+"""
+Фоновое наполнение локального индекса госпитализаций (search_index).
+
+Раз в SEARCH_INDEX_REFRESH_INTERVAL секунд запрашивает у шлюза все выписки за последние
+SEARCH_INDEX_WINDOW_DAYS дней по каждому подразделению и перестраивает индекс.
+
+Индекс живет в памяти каждого воркера gunicorn, но из шлюза его строит только один из них:
+тот, кто взял блокировку файла рядом со снимком (SEARCH_INDEX_SNAPSHOT_PATH). Он сохраняет
+снимок индекса, а остальные воркеры раз в _SNAPSHOT_POLL_SECONDS загружают его, если снимок
+обновился. Блокировка снимается вместе с процессом, поэтому после перезапуска построителя
+его место занимает следующий воркер. Без fcntl (не POSIX) или с пустым путем снимка каждый
+воркер строит свой индекс.
+"""
+
+import asyncio
+import os
+import zlib
+from datetime import date, timedelta
+from pathlib import Path
+from typing import IO
+
+from fastapi import FastAPI
+
+from app.core import get_settings, json_codec
+from app.core.logger_setup import logger
+from app.model import ExtensionStartedData
+from app.service.extension.search_index import search_index
+from app.service.extension.started import fetch_data_for_building
+from app.service.extension.utils import safe_gather
+from app.service.gateway.gateway_service import GatewayService
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - зависит от платформы
+    fcntl = None
+
+settings = get_settings()
+
+# Как часто воркеры, не строящие индекс, проверяют снимок, сек
+_SNAPSHOT_POLL_SECONDS = 30
+
+
+class IndexBuilderLock:
+    """Блокировка построителя индекса: файл с flock, открытый, пока воркер жив."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._file: IO | None = None
+
+    def acquire(self) -> bool:
+        """Берет блокировку без ожидания; True, если построитель — этот воркер."""
+        if self._file is not None or fcntl is None:
+            return True
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Файл держим открытым, пока жива блокировка: закрытие снимает flock
+        file = open(self.path, "a")  # noqa: SIM115
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            file.close()
+            return False
+        self._file = file
+        logger.info("Этот воркер строит индекс госпитализаций для остальных")
+        return True
+
+    def release(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def write_snapshot(path: Path, rows: list[dict], window: tuple[date, date]) -> None:
+    """Атомарно сохраняет строки индекса и его окно."""
+    payload = {"window": [window[0].isoformat(), window[1].isoformat()], "rows": rows}
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(path.name + ".tmp")
+    temporary.write_bytes(zlib.compress(json_codec.dumps(payload), 6))
+    os.replace(temporary, path)
+
+
+def read_snapshot(path: Path) -> tuple[list[dict], tuple[date, date]]:
+    payload = json_codec.loads(zlib.decompress(path.read_bytes()))
+    start, end = (date.fromisoformat(value) for value in payload["window"])
+    return payload["rows"], (start, end)
+
+
+async def refresh_search_index(
+    gateway_service: GatewayService, snapshot_path: Path | None = None
+) -> bool:
+    """
+    Перестраивает индекс (и сохраняет снимок, если передан путь). Если хотя бы одно
+    подразделение не ответило, индекс не трогаем, чтобы не отвечать "не найдено" по неполным данным.
+    """
+    end = date.today()
+    start = end - timedelta(days=settings.SEARCH_INDEX_WINDOW_DAYS)
+    date_range = f"{start.strftime('%d.%m.%Y')} - {end.strftime('%d.%m.%Y')}"
+    # Пустая фамилия — все выписки подразделения за период
+    query = ExtensionStartedData(last_name="")
+
+    building_cids = settings.lpu_building_cids_list
+    results = await safe_gather(
+        *[
+            fetch_data_for_building(cid, query, date_range, gateway_service)
+            for cid in building_cids
+        ]
+    )
+
+    if any(batch is None for batch in results):
+        logger.warning(
+            "Индекс госпитализаций не обновлен: не все подразделения ответили."
+        )
+        return False
+
+    rows = [row for batch in results for row in batch]
+    search_index.replace(rows, (start, end))
+    logger.info(
+        f"Индекс госпитализаций обновлен: {len(search_index)} записей за {date_range}"
+    )
+    if snapshot_path is not None:
+        await asyncio.to_thread(write_snapshot, snapshot_path, rows, (start, end))
+    return True
+
+
+async def load_search_index_snapshot(
+    path: Path, loaded_mtime: float | None
+) -> float | None:
+    """Загружает снимок, если он новее уже загруженного; возвращает mtime загруженного снимка."""
+    try:
+        mtime = path.stat().st_mtime
+    except FileNotFoundError:
+        return loaded_mtime
+    if loaded_mtime is not None and mtime <= loaded_mtime:
+        return loaded_mtime
+
+    rows, window = await asyncio.to_thread(read_snapshot, path)
+    search_index.replace(rows, window)
+    logger.info(
+        f"Индекс госпитализаций загружен из снимка: {len(search_index)} записей"
+    )
+    return mtime
+
+
+async def _indexer_loop(app: FastAPI) -> None:
+    snapshot_path = (
+        Path(settings.SEARCH_INDEX_SNAPSHOT_PATH)
+        if settings.SEARCH_INDEX_SNAPSHOT_PATH
+        else None
+    )
+    builder_lock = (
+        IndexBuilderLock(snapshot_path.with_name(snapshot_path.name + ".lock"))
+        if snapshot_path
+        else None
+    )
+    loaded_mtime = None
+    try:
+        while True:
+            delay = settings.SEARCH_INDEX_REFRESH_INTERVAL
+            try:
+                if builder_lock is None or builder_lock.acquire():
+                    await refresh_search_index(
+                        GatewayService(client=app.state.gateway_client), snapshot_path
+                    )
+                else:
+                    delay = min(delay, _SNAPSHOT_POLL_SECONDS)
+                    loaded_mtime = await load_search_index_snapshot(
+                        snapshot_path, loaded_mtime
+                    )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:  # noqa: BLE001
+                logger.error(f"Ошибка обновления индекса госпитализаций: {e}")
+            await asyncio.sleep(delay)
+    finally:
+        if builder_lock is not None:
+            builder_lock.release()
+
+
+async def start_search_indexer(app: FastAPI) -> None:
+    """Запускает фоновую задачу индексации, если она включена в настройках."""
+    if not settings.SEARCH_INDEX_ENABLED:
+        return
+    app.state.search_indexer_task = asyncio.create_task(_indexer_loop(app))
+    logger.info(
+        f"Индексация госпитализаций запущена: окно {settings.SEARCH_INDEX_WINDOW_DAYS} дн., "
+        f"обновление каждые {settings.SEARCH_INDEX_REFRESH_INTERVAL} с"
+    )
+
+
+async def stop_search_indexer(app: FastAPI) -> None:
+    task = getattr(app.state, "search_indexer_task", None)
+    if task:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        logger.info("Индексация госпитализаций остановлена.")
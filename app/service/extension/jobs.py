@@ -0,0 +1,408 @@
+"""
+Очередь заданий на обогащение (SQLite) и пул воркеров в процессе приложения.
+
+POST /extension/enrich-jobs ставит задание в очередь и сразу возвращает его id, воркеры
+выполняют enrich_data, а клиент опрашивает статус через GET. Так медленный шлюз не держит
+HTTP-запрос, на котором сдаются прокси и fetch расширения.
+
+Очередь живет в файле базы (том ./data), поэтому задания переживают перезапуск, а все
+воркеры gunicorn разбирают одну очередь. Взятие задания атомарно (BEGIN IMMEDIATE) и дает
+аренду с запасом больше бюджета ENRICH_DEADLINE_SECONDS: если процесс упал посреди
+выполнения, по истечении аренды задание снова берется в работу (не больше
+ENRICH_JOBS_MAX_ATTEMPTS раз). Простаивающие воркеры проверяют очередь обычным чтением и
+берут блокировку на запись, только когда есть что взять.
+Интерактивные задания берутся раньше пакетных, внутри класса — в порядке постановки.
+Готовые результаты хранятся ENRICH_JOBS_RESULT_TTL секунд.
+"""
+
+import asyncio
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+
+from fastapi import FastAPI
+
+from app.core import get_settings, json_codec
+from app.core.fairness import current_client
+from app.core.logger_setup import logger
+from app.core.metrics import ENRICH_JOB_WAIT_SECONDS, ENRICH_JOBS
+from app.model import EnrichmentJobRequest, EnrichmentRequestData
+from app.service.extension.enrich import enrich_data
+from app.service.gateway.batcher import batch_lane
+from app.service.gateway.gateway_service import GatewayService
+
+settings = get_settings()
+
+# Классы приоритета: меньше — раньше
+JOB_PRIORITIES = {"interactive": 0, "bulk": 1}
+_PRIORITY_NAMES = {value: name for name, value in JOB_PRIORITIES.items()}
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+# Задание, аренда которого истекла, брошено упавшим воркером — берем его снова
+_CLAIMABLE = "status = ? OR (status = ? AND lease_until < ?)"
+
+# Паузы между попытками записать итог задания, сек
+FINISH_RETRY_DELAYS = (0.5, 2.0, 5.0)
+
+
+class EnrichmentJobQueue:
+    """Постоянная очередь заданий на обогащение с приоритетами, арендой и TTL результатов."""
+
+    def __init__(
+        self,
+        path: str,
+        result_ttl: float,
+        lease_seconds: float,
+        max_attempts: int = 3,
+    ):
+        self.path = Path(path)
+        self.result_ttl = result_ttl
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._initialized = False
+        # Первые соединения открываются из нескольких потоков to_thread одновременно
+        self._init_lock = threading.Lock()
+
+    @contextmanager
+    def _connection(self, write: bool = True) -> Iterator[sqlite3.Connection]:
+        """Открывает соединение на одну транзакцию (коммит на выходе) и закрывает его."""
+        if not self._initialized:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        try:
+            if not self._initialized:
+                with self._init_lock:
+                    self._initialize(connection)
+            # Блокировка на запись берется сразу: два воркера не возьмут одно задание
+            connection.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+            try:
+                yield connection
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+        finally:
+            connection.close()
+
+    def _initialize(self, connection: sqlite3.Connection) -> None:
+        if self._initialized:
+            return
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS enrich_jobs (
+                job_id TEXT PRIMARY KEY,
+                priority INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                request BLOB NOT NULL,
+                result BLOB,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                lease_until REAL
+            )
+            """)
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS enrich_jobs_queue "
+            "ON enrich_jobs (status, priority, created_at)"
+        )
+        self._initialized = True
+
+    def _submit(self, request: dict, priority: str) -> str:
+        job_id = uuid.uuid4().hex
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT INTO enrich_jobs (job_id, priority, status, request, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (
+                    job_id,
+                    JOB_PRIORITIES[priority],
+                    QUEUED,
+                    json_codec.dumps(request),
+                    time.time(),
+                ),
+            )
+        return job_id
+
+    def _has_claimable(self, now: float) -> bool:
+        with self._connection(write=False) as connection:
+            return (
+                connection.execute(
+                    f"SELECT 1 FROM enrich_jobs WHERE {_CLAIMABLE} LIMIT 1",
+                    (QUEUED, RUNNING, now),
+                ).fetchone()
+                is not None
+            )
+
+    def _claim(self) -> tuple[str, int, dict, float] | None:
+        now = time.time()
+        # Чтение в WAL не блокирует писателей: пустая очередь не занимает блокировку на запись
+        if not self._has_claimable(now):
+            return None
+
+        with self._connection() as connection:
+            row = connection.execute(
+                f"""
+                SELECT job_id, priority, request, created_at, attempts FROM enrich_jobs
+                WHERE {_CLAIMABLE}
+                ORDER BY priority, created_at
+                LIMIT 1
+                """,
+                (QUEUED, RUNNING, now),
+            ).fetchone()
+            # Задание успел взять воркер другого процесса
+            if row is None:
+                return None
+
+            job_id, priority, request, created_at, attempts = row
+            if attempts >= self.max_attempts:
+                connection.execute(
+                    "UPDATE enrich_jobs SET status = ?, error = ?, finished_at = ?, "
+                    "lease_until = NULL WHERE job_id = ?",
+                    (FAILED, "Превышено число попыток выполнения", now, job_id),
+                )
+                logger.warning(
+                    f"Задание обогащения {job_id} снято: превышено число попыток"
+                )
+                return None
+
+            connection.execute(
+                "UPDATE enrich_jobs SET status = ?, attempts = attempts + 1, started_at = ?, "
+                "lease_until = ? WHERE job_id = ?",
+                (RUNNING, now, now + self.lease_seconds, job_id),
+            )
+
+        return job_id, priority, json_codec.loads(request), created_at
+
+    def _finish(
+        self, job_id: str, result: Any = None, error: str | None = None
+    ) -> None:
+        payload = zlib.compress(json_codec.dumps(result), 6) if error is None else None
+        with self._connection() as connection:
+            connection.execute(
+                "UPDATE enrich_jobs SET status = ?, result = ?, error = ?, finished_at = ?, "
+                "lease_until = NULL WHERE job_id = ?",
+                (FAILED if error else DONE, payload, error, time.time(), job_id),
+            )
+
+    def _get(self, job_id: str) -> dict | None:
+        with self._connection(write=False) as connection:
+            row = connection.execute(
+                "SELECT priority, status, result, error, created_at, finished_at "
+                "FROM enrich_jobs WHERE job_id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+
+        priority, job_status, result, error, created_at, finished_at = row
+        if finished_at is not None and time.time() - finished_at > self.result_ttl:
+            return None
+
+        job: dict[str, Any] = {
+            "job_id": job_id,
+            "status": job_status,
+            "priority": _PRIORITY_NAMES[priority],
+            "created_at": created_at,
+            "finished_at": finished_at,
+        }
+        if job_status == DONE:
+            job["result"] = json_codec.loads(zlib.decompress(result))
+        elif job_status == FAILED:
+            job["error"] = error
+        return job
+
+    def _purge_expired(self) -> int:
+        with self._connection() as connection:
+            return connection.execute(
+                "DELETE FROM enrich_jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+                (time.time() - self.result_ttl,),
+            ).rowcount
+
+    async def submit(self, request: dict, priority: str = "interactive") -> str:
+        return await asyncio.to_thread(self._submit, request, priority)
+
+    async def claim(self) -> tuple[str, int, dict, float] | None:
+        return await asyncio.to_thread(self._claim)
+
+    async def finish(
+        self, job_id: str, result: Any = None, error: str | None = None
+    ) -> None:
+        await asyncio.to_thread(self._finish, job_id, result, error)
+
+    async def get(self, job_id: str) -> dict | None:
+        return await asyncio.to_thread(self._get, job_id)
+
+    async def purge_expired(self) -> int:
+        return await asyncio.to_thread(self._purge_expired)
+
+
+class EnrichmentJobWorkers:
+    """Пул корутин, которые разбирают очередь заданий и выполняют обогащение."""
+
+    def __init__(
+        self,
+        queue: EnrichmentJobQueue,
+        app: FastAPI,
+        concurrency: int,
+        poll_interval: float,
+    ):
+        self.queue = queue
+        self._app = app
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        # Будит свободных воркеров, когда задание поставлено в этом же процессе;
+        # задания из других процессов подхватываются по poll_interval
+        self._wakeup = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self) -> None:
+        self._tasks = [
+            asyncio.create_task(self._worker_loop(), name=f"enrich-job-worker-{index}")
+            for index in range(self.concurrency)
+        ]
+        self._tasks.append(
+            asyncio.create_task(self._purge_loop(), name="enrich-job-purge")
+        )
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        # Прерванные задания останутся в running и будут подхвачены снова по истечении аренды
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, job: EnrichmentJobRequest) -> str:
+        job_id = await self.queue.submit(
+            job.model_dump(exclude={"priority"}), job.priority
+        )
+        ENRICH_JOBS.labels(priority=job.priority, status=QUEUED).inc()
+        self._wakeup.set()
+        return job_id
+
+    async def _worker_loop(self) -> None:
+        while True:
+            try:
+                job = await self.queue.claim()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:  # noqa: BLE001
+                logger.error(f"Ошибка чтения очереди заданий обогащения: {e}")
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self._run(*job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:  # noqa: BLE001
+                # Воркер не должен умирать из-за одного задания: оно вернется в работу по аренде
+                logger.error(f"Ошибка выполнения задания обогащения {job[0]}: {e}")
+
+    async def _run(
+        self, job_id: str, priority: int, request: dict, created_at: float
+    ) -> None:
+        priority_name = _PRIORITY_NAMES[priority]
+        ENRICH_JOB_WAIT_SECONDS.labels(priority=priority_name).observe(
+            max(0.0, time.time() - created_at)
+        )
+        gateway_service = GatewayService(
+            client=self._app.state.gateway_client,
+            batcher=getattr(self._app.state, "gateway_batcher", None),
+        )
+        # Задания одного класса — один клиент справедливой очереди шлюза: пакетные задания
+        # не вытесняют интерактивные запросы операторов
+        current_client.set(f"jobs:{priority_name}")
+        # Вызовы пакетных заданий не попадают в один пакет шлюза с интерактивными
+        token = batch_lane.set("bulk") if priority_name == "bulk" else None
+        try:
+            result = await enrich_data(
+                EnrichmentRequestData(**request), gateway_service
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:  # noqa: BLE001
+            detail = getattr(e, "detail", None) or str(e)
+            logger.error(f"Задание обогащения {job_id} завершилось ошибкой: {detail}")
+            await self._finish(job_id, error=str(detail))
+            ENRICH_JOBS.labels(priority=priority_name, status=FAILED).inc()
+            return
+        finally:
+            if token is not None:
+                batch_lane.reset(token)
+
+        await self._finish(job_id, result=result)
+        ENRICH_JOBS.labels(priority=priority_name, status=DONE).inc()
+
+    async def _finish(
+        self, job_id: str, result: Any = None, error: str | None = None
+    ) -> None:
+        """Записывает итог задания, повторяя при временных ошибках базы (занята другим процессом)."""
+        for delay in (*FINISH_RETRY_DELAYS, None):
+            try:
+                await self.queue.finish(job_id, result=result, error=error)
+                return
+            except sqlite3.OperationalError as e:
+                if delay is None:
+                    raise
+                logger.warning(
+                    f"Не удалось записать итог задания обогащения {job_id}: {e}, повтор через {delay} с"
+                )
+                await asyncio.sleep(delay)
+
+    async def _purge_loop(self) -> None:
+        while True:
+            try:
+                removed = await self.queue.purge_expired()
+                if removed:
+                    logger.info(f"Удалено устаревших заданий обогащения: {removed}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:  # noqa: BLE001
+                logger.warning(f"Не удалось удалить устаревшие задания обогащения: {e}")
+            await asyncio.sleep(max(60.0, self.queue.result_ttl / 10))
+
+
+async def start_enrich_jobs(app: FastAPI) -> None:
+    """Запускает пул воркеров очереди заданий обогащения, если она включена в настройках."""
+    if not settings.ENRICH_JOBS_ENABLED:
+        return
+    queue = EnrichmentJobQueue(
+        settings.ENRICH_JOBS_PATH,
+        result_ttl=settings.ENRICH_JOBS_RESULT_TTL,
+        # Обогащение ограничено бюджетом времени, аренда берется с запасом
+        lease_seconds=settings.ENRICH_DEADLINE_SECONDS * 2 + 10,
+        max_attempts=settings.ENRICH_JOBS_MAX_ATTEMPTS,
+    )
+    app.state.enrich_jobs = EnrichmentJobWorkers(
+        queue,
+        app,
+        concurrency=settings.ENRICH_JOBS_WORKERS,
+        poll_interval=settings.ENRICH_JOBS_POLL_INTERVAL,
+    )
+    app.state.enrich_jobs.start()
+    logger.info(
+        f"Очередь заданий обогащения запущена: {settings.ENRICH_JOBS_WORKERS} воркеров"
+    )
+
+
+async def stop_enrich_jobs(app: FastAPI) -> None:
+    workers = getattr(app.state, "enrich_jobs", None)
+    if workers is not None:
+        await workers.stop()
+        logger.info("Очередь заданий обогащения остановлена.")
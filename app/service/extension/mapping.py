@@ -0,0 +1,446 @@
+"""
+Синхронный табличный этап сопоставления: сырые записи ЕВМИАС -> поля формы ГИС ОМС.
+
+Этап не делает ввода-вывода и не требует event loop: на вход — уже загруженные записи
+по N случаям (CaseRecords), на выход — N готовых форм. Нормализация справочных значений
+мемоизирована: одно и то же LpuSection_Name, профиль койки или дата поступления
+разбираются (и логируются) один раз на процесс, а не на каждый случай. Поэтому этап
+пригоден и для обработки пачек случаев, и для офлайн-бенчмарков.
+"""
+
+import re
+from collections.abc import Iterable
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Any, NamedTuple
+
+from app.core import get_settings
+from app.core.logger_setup import logger
+from app.mapper import (
+    DEFAULT_DIVISION_ADDRESS,
+    DEFAULT_DIVISION_STRUCTURE_NAME,
+    bed_profile_correction_rules,
+    bed_profiles,
+    department_codes,
+    disease_outcome_ids,
+    division_addresses,
+    division_structure_names,
+    medical_care_profile,
+    medical_care_profile_correction_rules,
+    medical_orgs,
+)
+
+settings = get_settings()
+
+REFERRAL_BY_DEPARTMENT = "1"
+REFERRAL_BY_OTHER_MO = "2"
+
+INPATIENT_CARE = "1"
+DAY_HOSPITAL_CARE = "2"
+
+# Код условий оказания МП (V006) по нормализованному названию отделения
+_DAY_HOSPITAL_DEPARTMENTS = frozenset({"Дневной стационар", "Отделение ВРТ"})
+
+# PrehospType_id ЕВМИАС -> форма оказания МП (V014): 3 — плановая, 1 — экстренная
+MEDICAL_CARE_FORMS = {"2": "3", "1": "1", "3": "1"}
+
+# DeseaseType_id ЕВМИАС -> характер основного заболевания (V027):
+# 1 — острое, 2 — впервые выявленное хроническое, 3 — ранее установленное хроническое
+DISEASE_TYPE_CODES = {"1": "2", "2": "3", "3": "1"}
+
+# Сокращения названий отделений ЕВМИАС до названий в ГИС ОМС
+DEPARTMENT_NAME_REPLACEMENTS = {
+    "Травматолого-ортопедическое отделение": "Травматология",
+    "Отделение реабилитации и восстановительного лечения": "Отделение реабилитации",
+    "Неврологическое отделение": "Неврология",
+    "Гастроэнтерологическое отделение": "Гастроэнтерология",
+    "Терапевтическое отделение": "Отделение терапии",
+}
+
+# Отделения, для которых профиль койки уточняется по коду диагноза
+BED_PROFILE_CORRECTED_DEPARTMENTS = frozenset(
+    {
+        "Отделение реабилитации",
+        "Хирургическое отделение №1",
+        "Хирургическое отделение №2",
+        "Дневной стационар",
+        "Неврология",
+    }
+)
+
+# Коды профилей МП, которые уточняются по коду диагноза
+MEDICAL_CARE_PROFILE_MAPPER = {
+    "Оториноларингология": "20",
+    "Сердечно-сосудистая хирургия": "25",
+    "Колопроктология": "14",
+}
+
+PROFILE_CORRECTION_RULES = [
+    (re.compile(r"^J34\.\d$"), MEDICAL_CARE_PROFILE_MAPPER["Оториноларингология"]),
+    (
+        re.compile(r"^I83\.\d$"),
+        MEDICAL_CARE_PROFILE_MAPPER["Сердечно-сосудистая хирургия"],
+    ),
+    (
+        re.compile(r"^(K6[0-4]\.\d|D12\.\d|L05\.\d)$"),
+        MEDICAL_CARE_PROFILE_MAPPER["Колопроктология"],
+    ),
+    # Добавлять новые правила СЮДА.
+]
+
+# Дни недели, на которые может приходиться дата направления: пн, ср, пт
+_DIRECTION_WEEKDAYS = (0, 2, 4)
+
+
+class DepartmentInfo(NamedTuple):
+    """Все, что выводится из LpuSection_Name: название, код отделения и условия оказания МП."""
+
+    name: str | None
+    code: str | None
+    condition: str
+
+
+class DivisionInfo(NamedTuple):
+    address: str
+    structure_name: str
+
+
+class CaseRecords(NamedTuple):
+    """
+    Сырые записи шлюза по одному случаю госпитализации — вход этапа сопоставления.
+    Незагруженная запись — None: значение по умолчанию у NamedTuple одно на все экземпляры.
+    """
+
+    started_data: dict
+    person_data: dict | None = None
+    movement_data: dict | None = None
+    referred_data: dict | None = None
+    disease_data: dict | None = None
+    medical_service_data: list | None = None
+    discharge_summary: dict | None = None
+    additional_diagnosis: list | None = None
+    referred_org_name: str | None = None
+
+
+@lru_cache(maxsize=256)
+def resolve_department_name(raw_name: str) -> str | None:
+    """Нормализует название отделения госпитализации из LpuSection_Name."""
+    name = raw_name.strip()
+    if not name:
+        return None
+
+    if name.startswith("ДС") or "дневного стационара" in name:
+        return "Дневной стационар"
+
+    if name == "ЭКО-ВРТ ММЦ":
+        return "Отделение ВРТ"
+
+    name = name.replace(" стационар ММЦ", "").replace(" ММЦ", "")
+    name = DEPARTMENT_NAME_REPLACEMENTS.get(name, name)
+    logger.debug(f"название отделения: {name}")
+    return name
+
+
+@lru_cache(maxsize=256)
+def resolve_department_code(department_name: str | None) -> str | None:
+    if not department_name:
+        logger.warning("Не передано название отделения")
+        return None
+
+    code = department_codes.get(department_name)
+    if code is None:
+        logger.warning(f"Не найден код для отделения: {department_name}")
+    return code
+
+
+def resolve_medical_care_condition(department_name: str | None) -> str:
+    """Код условий оказания МП (V006): дневной стационар или круглосуточный."""
+    return (
+        DAY_HOSPITAL_CARE
+        if department_name in _DAY_HOSPITAL_DEPARTMENTS
+        else INPATIENT_CARE
+    )
+
+
+@lru_cache(maxsize=256)
+def resolve_department(raw_name: str) -> DepartmentInfo:
+    name = resolve_department_name(raw_name)
+    return DepartmentInfo(
+        name=name,
+        code=resolve_department_code(name),
+        condition=resolve_medical_care_condition(name),
+    )
+
+
+@lru_cache(maxsize=1024)
+def resolve_bed_profile(
+    bed_profile_name: str, diag_code: str, department_name: str | None
+) -> tuple[str | None, str | None]:
+    """
+    Возвращает (код профиля койки, итоговое название профиля койки) с учетом правил
+    коррекции по коду диагноза для отдельных отделений.
+    """
+    if department_name in BED_PROFILE_CORRECTED_DEPARTMENTS:
+        for rule in bed_profile_correction_rules[department_name]:
+            if diag_code and rule["pattern"].match(diag_code):
+                original_name = bed_profile_name
+                bed_profile_name = rule["replacement"]
+                logger.info(
+                    f"Скорректирован профиль койки для диагноза {diag_code}: с {original_name} на {bed_profile_name}"
+                )
+
+    bed_profile_id = bed_profiles.get(bed_profile_name)
+    if not bed_profile_id:
+        logger.warning(f"Не найден код профиля койки для: {bed_profile_name}")
+        return None, bed_profile_name
+
+    logger.debug(
+        f"Определяем код профиля койки: {bed_profile_name}, код: {bed_profile_id}"
+    )
+    return str(bed_profile_id), bed_profile_name
+
+
+@lru_cache(maxsize=512)
+def resolve_medical_care_profile(
+    raw_name: Any, corrected_bed_profile_name: str | None = None
+) -> str | None:
+    """
+    Код профиля оказания МП по LpuSectionProfile_Name. Сначала проверяется правило
+    коррекции по (уже скорректированному) профилю койки.
+    """
+    if corrected_bed_profile_name:
+        target_profile_key = medical_care_profile_correction_rules.get(
+            corrected_bed_profile_name
+        )
+        if target_profile_key:
+            logger.info(
+                f"Применяется правило коррекции: профиль койки '{corrected_bed_profile_name}' "
+                f"требует профиль медпомощи '{target_profile_key}'."
+            )
+            profile_data = medical_care_profile.get(target_profile_key)
+            if profile_data and profile_data.get("Code"):
+                return profile_data.get("Code")
+            logger.warning(
+                f"Правило коррекции найдено, но ключ '{target_profile_key}' "
+                f"отсутствует или некорректен в справочнике medical_care_profile."
+            )
+
+    if not raw_name:
+        logger.warning("Профиль медицинской помощи не указан.")
+        return None
+
+    profile = medical_care_profile.get(str(raw_name).lower().strip())
+    if not profile:
+        logger.warning(f"Профиль '{raw_name}' не найден в справочнике.")
+        return None
+
+    code = profile.get("Code")
+    if not code:
+        logger.warning(f"У профиля '{raw_name}' нет кода в справочнике.")
+        return None
+
+    logger.debug(f"Определен код профиля: '{raw_name}' -> '{code}'")
+    return code
+
+
+@lru_cache(maxsize=256)
+def correct_medical_profile(diag_code: str, current_profile: str | None) -> str | None:
+    """
+    Уточняет профиль медицинской помощи на основе диагноза.
+
+    Если диагноз соответствует одному из заданных правил, возвращает
+    новый код профиля. В противном случае возвращает текущий (неизмененный) профиль.
+    """
+    for pattern, new_profile in PROFILE_CORRECTION_RULES:
+        if pattern.match(diag_code):
+            return new_profile
+    return current_profile
+
+
+@lru_cache(maxsize=1024)
+def resolve_direction_date(admission_date: str | None) -> str | None:
+    """
+    Дата направления на госпитализацию: ближайший пн, ср или пт до даты госпитализации.
+    """
+    try:
+        admitted = datetime.strptime(admission_date, "%d.%m.%Y")
+    except (TypeError, ValueError):
+        logger.warning(f"Неверный формат даты: {admission_date}")
+        return None
+
+    for days_back in range(1, 8):
+        candidate = admitted - timedelta(days=days_back)
+        if candidate.weekday() in _DIRECTION_WEEKDAYS:
+            return candidate.strftime("%d.%m.%Y")
+    return None
+
+
+def resolve_medical_care_form(prehosp_type_id: Any) -> str | None:
+    if prehosp_type_id is None:
+        logger.warning("Не найден PrehospDirect_id в данных")
+        return None
+    return MEDICAL_CARE_FORMS.get(str(prehosp_type_id))
+
+
+@lru_cache(maxsize=128)
+def resolve_outcome_code(outcome_id: Any) -> Any:
+    """Код исхода заболевания (V012) по ResultDesease_id."""
+    outcome_entry = disease_outcome_ids.get(outcome_id)
+    if not outcome_entry:
+        logger.warning(f"Не найден исход заболевания для evmias_id: {outcome_id}")
+        return None
+    return outcome_entry.get("code")
+
+
+def resolve_disease_type_code(disease_type_id: Any) -> str | None:
+    if not disease_type_id:
+        return None
+    return DISEASE_TYPE_CODES.get(disease_type_id)
+
+
+@lru_cache(maxsize=256)
+def resolve_referred_organization(
+    referral_type: str, org_name: str | None
+) -> str | None:
+    """Реестровый код направившей организации по типу направления и названию организации."""
+    if referral_type == REFERRAL_BY_DEPARTMENT:
+        return settings.MO_REGISTRY_NUMBER
+    if referral_type != REFERRAL_BY_OTHER_MO or not org_name:
+        return None
+
+    org_data = medical_orgs.get(org_name)
+    if not org_data:
+        logger.warning(f"Организация '{org_name}' не найдена в справочнике организаций")
+        return None
+    return org_data.get("registry_code")
+
+
+@lru_cache(maxsize=64)
+def resolve_division(division_cid: str) -> DivisionInfo:
+    return DivisionInfo(
+        address=division_addresses.get(division_cid, DEFAULT_DIVISION_ADDRESS),
+        structure_name=division_structure_names.get(
+            division_cid, DEFAULT_DIVISION_STRUCTURE_NAME
+        ),
+    )
+
+
+def clear_mapping_caches() -> None:
+    """Сбрасывает мемоизированные таблицы (например, после правки справочников)."""
+    for resolver in (
+        resolve_department_name,
+        resolve_department_code,
+        resolve_department,
+        resolve_bed_profile,
+        resolve_medical_care_profile,
+        correct_medical_profile,
+        resolve_direction_date,
+        resolve_outcome_code,
+        resolve_referred_organization,
+        resolve_division,
+    ):
+        resolver.cache_clear()
+
+
+# Разделы итога, которые не являются полями формы и могут приходить позже основной части
+SECTION_KEYS = (
+    "medical_service_data",
+    "additional_diagnosis_data",
+    "discharge_summary",
+)
+
+
+def map_discharge_summary(
+    discharge_summary: dict | None, medical_service_data: list | None
+) -> dict | None:
+    """Раздел эпикриза: если есть данные об операциях, убираем их из эпикриза, чтобы не было дублирования."""
+    pure = discharge_summary.get("pure") if discharge_summary else {}
+    if medical_service_data and pure is not None:
+        pure = {**pure, "item_145": None}
+    return pure
+
+
+def map_case(records: CaseRecords) -> dict[str, Any]:
+    """Собирает форму ГИС ОМС для одного случая из уже загруженных записей шлюза."""
+    started_data = records.started_data
+    movement_data = records.movement_data or {}
+    person_data = records.person_data or {}
+    referred_data = records.referred_data or {}
+    disease_data = records.disease_data or {}
+    medical_service_data = records.medical_service_data or []
+
+    discharge_summary = map_discharge_summary(
+        records.discharge_summary, medical_service_data
+    )
+    department = resolve_department(started_data.get("LpuSection_Name", ""))
+
+    diag_code = movement_data.get("Diag_Code", "")
+    bed_profile_name = movement_data.get("LpuSectionBedProfile_Name", "")
+    if bed_profile_name:
+        bed_profile_code, corrected_bed_profile_name = resolve_bed_profile(
+            bed_profile_name, diag_code, department.name
+        )
+    else:
+        logger.warning(
+            f"Не найден профиль койки для person_id: {movement_data.get('Person_id')},"
+        )
+        bed_profile_code, corrected_bed_profile_name = None, None
+
+    medical_care_profile_code = resolve_medical_care_profile(
+        movement_data.get("LpuSectionProfile_Name"), corrected_bed_profile_name
+    )
+    # todo: корректируем профиль МП в зависимости от кода диагноза - это костыль
+    medical_care_profile_code = correct_medical_profile(
+        diag_code, medical_care_profile_code
+    )
+
+    outcome_code = resolve_outcome_code(disease_data.get("ResultDesease_id"))
+    # Если в ЕВМИАС не указан исход заболевания: для круглосуточного стационара код исхода
+    # должен начинаться с 1xx (см. справочники https://nsi.ffoms.ru/ [V006, V019])
+    if department.condition == INPATIENT_CARE and outcome_code == 202:
+        outcome_code = "102"
+
+    division = resolve_division(str(started_data.get("_division_internal_cid")))
+    admission_date = started_data.get("EvnPS_setDate")
+
+    return {
+        "input[name='ReferralHospitalizationNumberTicket']": "б/н",
+        "input[name='ReferralHospitalizationDateTicket']": resolve_direction_date(
+            admission_date
+        ),
+        "input[name='ReferralHospitalizationMedIndications']": "001",
+        "input[name='Enp']": person_data.get("Person_EdNum", ""),
+        "input[name='DateBirth']": started_data.get("Person_Birthday", ""),
+        "input[name='Gender']": person_data.get("Sex_Name", ""),
+        "input[name='TreatmentDateStart']": admission_date,
+        "input[name='TreatmentDateEnd']": started_data.get("EvnPS_disDate"),
+        "input[name='VidMpV008']": settings.MEDICAL_CARE_TYPE_CODE,
+        "input[name='HospitalizationInfoV006']": department.condition,
+        "input[name='HospitalizationInfoV014']": resolve_medical_care_form(
+            referred_data.get("PrehospType_id")
+        ),
+        "input[name='HospitalizationInfoSpecializedMedicalProfile']": medical_care_profile_code,
+        "input[name='HospitalizationInfoSubdivision']": division.structure_name,
+        "input[name='HospitalizationInfoNameDepartment']": department.name,
+        "input[name='HospitalizationInfoOfficeCode']": department.code,
+        "input[name='HospitalizationInfoV020']": bed_profile_code,
+        "input[name='HospitalizationInfoDiagnosisMainDisease']": diag_code,
+        "input[name='CardNumber']": started_data.get("EvnPS_NumCard", "").split(" ")[0],
+        "input[name='ResultV009']": movement_data.get("LeaveType_Code"),
+        "input[name='IshodV012']": outcome_code,
+        "input[name='HospitalizationInfoC_ZABV027']": resolve_disease_type_code(
+            disease_data.get("DeseaseType_id")
+        ),
+        "input[name='ReferralHospitalizationSendingDepartment']": resolve_referred_organization(
+            str(referred_data.get("PrehospDirect_id")), records.referred_org_name
+        ),
+        "additional_diagnosis_data": records.additional_diagnosis,
+        "medical_service_data": medical_service_data,
+        "discharge_summary": discharge_summary,
+        "input[name='HospitalizationInfoAddressDepartment']": division.address,
+    }
+
+
+def map_cases(cases: Iterable[CaseRecords]) -> list[dict[str, Any]]:
+    """Сопоставляет пачку случаев: N наборов записей шлюза -> N форм ГИС ОМС."""
+    return [map_case(records) for records in cases]
@@ -0,0 +1,114 @@
+import hashlib
+from collections import Counter
+from typing import Any
+
+from app.core import get_settings, json_codec
+from app.core.cache import TTLCache
+from app.core.logger_setup import logger
+from app.model import ExtensionStartedData
+from app.service.extension.started import (
+    fetch_started_data,
+    get_search_date_range,
+    summarize_search_windows,
+)
+from app.service.gateway.gateway_service import GatewayService
+
+settings = get_settings()
+
+# Полные отсортированные результаты поиска по токену курсора.
+# Следующие страницы отдаются отсюда без обращений к шлюзу.
+_cursor_cache = TTLCache(ttl=settings.SEARCH_CURSOR_TTL, maxsize=256)
+
+
+def _query_key(patient: ExtensionStartedData) -> tuple:
+    """Идентифицирует поисковый запрос, к которому привязан курсор."""
+    return (
+        patient.last_name.strip().upper(),
+        get_search_date_range(patient),
+        patient.search_mode,
+        patient.progressive,
+    )
+
+
+def _snapshot_token(query_key: tuple, rows: list[dict]) -> str:
+    """
+    Токен курсора из запроса и снимка результата (id и даты выписки строк по порядку).
+
+    Повторный поиск с тем же результатом получает тот же токен, поэтому первая страница
+    совпадает байт в байт и If-None-Match дает 304; изменился результат — меняется и токен.
+    """
+    snapshot = [(row.get("EvnPS_id"), row.get("EvnPS_disDate")) for row in rows]
+    return hashlib.sha256(json_codec.dumps([query_key, snapshot])).hexdigest()[:16]
+
+
+def _decode_cursor(cursor: str) -> tuple[str, int]:
+    token, _, raw_offset = cursor.partition(".")
+    if not token or not raw_offset.isdigit():
+        raise ValueError(f"Некорректный курсор: {cursor}")
+    return token, int(raw_offset)
+
+
+def _encode_cursor(token: str, offset: int) -> str:
+    return f"{token}.{offset}"
+
+
+async def fetch_started_data_page(
+    patient: ExtensionStartedData, gateway_service: GatewayService
+) -> dict[str, Any]:
+    """
+    Постраничный поиск пациентов.
+
+    Первая страница выполняет полный поиск по всем подразделениям и кладет отсортированный
+    результат в кэш курсоров. Последующие страницы (с cursor) берутся из кэша.
+    Если курсор истек или запрос попал в другой воркер, поиск выполняется заново: курсор
+    продолжает работать, только если результат не изменился (тот же токен снимка). Курсор
+    другого запроса или изменившегося результата отклоняется (ValueError) — иначе страницы
+    смешали бы два разных списка.
+    """
+    limit = patient.limit or settings.SEARCH_PAGE_SIZE
+    query_key = _query_key(patient)
+    token, offset = _decode_cursor(patient.cursor) if patient.cursor else (None, 0)
+
+    cached = _cursor_cache.get(token) if token else None
+    if cached is not None and cached["query"] != query_key:
+        raise ValueError(
+            "Курсор относится к другому поисковому запросу, начните поиск заново"
+        )
+    if cached is None:
+        if token:
+            logger.info(f"Курсор {token} не найден в кэше, повторяем поиск")
+        rows = await fetch_started_data(patient, gateway_service)
+        totals = Counter(row.get("_division_internal_cid") for row in rows)
+        cached = {
+            "query": query_key,
+            "rows": rows,
+            "totals_by_building": {
+                cid: totals.get(cid, 0) for cid in settings.lpu_building_cids_list
+            },
+            "search_windows": summarize_search_windows(rows),
+        }
+        snapshot_token = _snapshot_token(query_key, rows)
+        _cursor_cache.set(snapshot_token, cached)
+        if token and snapshot_token != token:
+            raise ValueError(
+                "Результат поиска изменился, курсор устарел: начните поиск заново"
+            )
+        token = snapshot_token
+    else:
+        logger.debug(f"Страница поиска из кэша курсора {token}, offset={offset}")
+
+    rows = cached["rows"]
+    next_offset = offset + limit
+
+    page = {
+        "items": rows[offset:next_offset],
+        "total": len(rows),
+        "totals_by_building": cached["totals_by_building"],
+        "limit": limit,
+        "next_cursor": (
+            _encode_cursor(token, next_offset) if next_offset < len(rows) else None
+        ),
+    }
+    if cached["search_windows"]:
+        page["search_windows"] = cached["search_windows"]
+    return page
@@ -3,8 +3,11 @@ from datetime import datetime
 from typing import Any
 
 from app.core.logger_setup import logger
+from app.core.offload import run_cpu
 from app.service.extension.sanitaizer import (
-    filter_operations_from_services, sanitize_additional_diagnosis_entry)
+    filter_operations_from_services,
+    sanitize_additional_diagnosis_entry,
+)
 from app.service.gateway.gateway_service import GatewayService
 
 
@@ -113,6 +116,109 @@ def _combine_parts(*args):
     return " ".join(valid_parts) if valid_parts else None
 
 
+def parse_discharge_summary(template_raw: str, xml_data: dict) -> dict[str, Any]:
+    """
+    Извлекает диагнозы и маркеры из шаблона выписного эпикриза.
+
+    Чистая функция уровня модуля: для больших шаблонов выполняется в пуле выноса
+    CPU-работы (app/core/offload.py), в том числе в пуле процессов.
+    """
+    # -- Определяем все возможные заголовки и "стоп-слова" --
+    # Возможные заголовки для каждого блока (через | для regex)
+    LABELS_PRIMARY = r"Диагноз основной|Основное заболевание"
+    LABELS_COMPLICATION = r"Осложнения основного заболевания|Осложнения"
+    LABELS_CONCOMITANT = r"Сопутствующие заболевания"
+
+    # Все возможные заголовки, которые могут идти *после* наших блоков. Они служат "якорями" конца.
+    STOP_LABELS = [
+        LABELS_COMPLICATION,
+        LABELS_CONCOMITANT,
+        r"Внешняя причина при травмах",
+        r"Дополнительные сведения о заболевании",
+        r"@#@ОсложненияОсновногоДиагнозаДвижРасш",
+        r"ОсновногоДиагнозаДвижРасш",
+        r"@#@СопутствующиеДиагнозы",
+        r"@#@КодОсновногоДиагнозаДвижения",
+        r"Состояние при поступлении:",
+        r"основного: ",
+        r"@#@НаименованиеОсновногоДиагнозаДвижения",
+    ]
+    # Объединяем все стоп-заголовки в один паттерн для поиска конца блока
+    STOP_PATTERN = r"(?:" + "|".join(STOP_LABELS) + r")"
+
+    def extract_raw_section(template, start_labels_pattern):
+        """Извлекает сырое содержимое блока между его заголовком и следующим известным заголовком."""
+        # Паттерн: (группа 1: заголовок) \s*:? (группа 2: содержимое)
+        # (?= группа 3: следующий заголовок или конец строки)
+        pattern = rf"({start_labels_pattern})\s*:?\s*(.*?)(?={STOP_PATTERN}|$)"
+        match = re.search(pattern, template, re.DOTALL | re.IGNORECASE)
+        return match.group(2).strip() if match else ""
+
+    # -- Извлекаем сырое содержимое для каждого блока --
+
+    raw_primary = extract_raw_section(template_raw, LABELS_PRIMARY)
+    raw_complication = extract_raw_section(template_raw, LABELS_COMPLICATION)
+    raw_concomitant = extract_raw_section(template_raw, LABELS_CONCOMITANT)
+
+    # -- Извлекаем текст и значения маркеров из сырых блоков --
+
+    marker_pattern = r"@#@([\w\d]+)@#@"
+
+    # Обработка основного диагноза
+    primary_text = _clean_html(re.sub(marker_pattern, "", raw_primary))
+    primary_markers = [
+        xml_data.get(marker_name)
+        for marker_name in re.findall(marker_pattern, raw_primary)
+    ]
+    primary_diagnosis = _combine_parts(primary_text, *primary_markers)
+
+    # Обработка осложнений
+    complication_text = _clean_html(re.sub(marker_pattern, "", raw_complication))
+    complication_markers = [
+        xml_data.get(marker_name)
+        for marker_name in re.findall(marker_pattern, raw_complication)
+    ]
+    primary_complication = _combine_parts(complication_text, *complication_markers)
+    if primary_complication:
+        primary_complication = primary_complication.replace(
+            "Сахарный диабет", "<b>Сахарный диабет</b>"
+        )
+
+    # Обработка сопутствующих
+    concomitant_text = _clean_html(re.sub(marker_pattern, "", raw_concomitant))
+    concomitant_markers = [
+        xml_data.get(marker_name)
+        for marker_name in re.findall(marker_pattern, raw_concomitant)
+    ]
+    concomitant_diseases = _combine_parts(concomitant_text, *concomitant_markers)
+    if concomitant_diseases:
+        concomitant_diseases = concomitant_diseases.replace(
+            "Сахарный диабет", "<b>Сахарный диабет</b>"
+        )
+
+    diagnos = xml_data.get("diagnos")
+    if diagnos:
+        diagnos = diagnos.replace("Сахарный диабет", "<b>Сахарный диабет</b>")
+
+    item_659 = xml_data.get("specMarker_659")
+    if item_659:
+        item_659 = item_659.replace("Сахарный диабет", "<b>Сахарный диабет</b>")
+
+    return {
+        "diagnos": diagnos,
+        "primary_diagnosis": primary_diagnosis,
+        "primary_complication": primary_complication,
+        "concomitant_diseases": concomitant_diseases,
+        "item_90": xml_data.get("specMarker_90"),
+        "item_94": xml_data.get("specMarker_94"),
+        "item_272": xml_data.get("specMarker_272"),
+        "item_284": xml_data.get("specMarker_284"),
+        "item_659": item_659,
+        "item_145": xml_data.get("specMarker_145"),
+        "AdditionalInf": xml_data.get("AdditionalInf"),
+    }
+
+
 async def fetch_patient_discharge_summary(
     event_id: str, gateway_service: GatewayService
 ) -> dict[str, Any] | None:
@@ -211,103 +317,15 @@ async def fetch_patient_discharge_summary(
     # ===== Шаг 5. Извлекаем и структурируем необходимые данные по выписному эпикризу =====================
     xml_data = raw_discharge_summary_data.get("xmlData", {})
     template_raw = raw_discharge_summary_data.get("template", "")
-
-    # -- Определяем все возможные заголовки и "стоп-слова" --
-    # Возможные заголовки для каждого блока (через | для regex)
-    LABELS_PRIMARY = r"Диагноз основной|Основное заболевание"  # noqa
-    LABELS_COMPLICATION = r"Осложнения основного заболевания|Осложнения"  # noqa
-    LABELS_CONCOMITANT = r"Сопутствующие заболевания"  # noqa
-
-    # Все возможные заголовки, которые могут идти *после* наших блоков. Они служат "якорями" конца.
-    STOP_LABELS = [  # noqa
-        LABELS_COMPLICATION,
-        LABELS_CONCOMITANT,
-        r"Внешняя причина при травмах",
-        r"Дополнительные сведения о заболевании",
-        r"@#@ОсложненияОсновногоДиагнозаДвижРасш",
-        r"ОсновногоДиагнозаДвижРасш",
-        r"@#@СопутствующиеДиагнозы",
-        r"@#@КодОсновногоДиагнозаДвижения",
-        r"Состояние при поступлении:",
-        r"основного: ",
-        r"@#@НаименованиеОсновногоДиагнозаДвижения",
-    ]
-    # Объединяем все стоп-заголовки в один паттерн для поиска конца блока
-    STOP_PATTERN = r"(?:" + "|".join(STOP_LABELS) + r")"  # noqa
-
-    def extract_raw_section(template, start_labels_pattern):
-        """Извлекает сырое содержимое блока между его заголовком и следующим известным заголовком."""
-        # Паттерн: (группа 1: заголовок) \s*:? (группа 2: содержимое) (?= группа 3: следующий заголовок или конец строки)
-        pattern = rf"({start_labels_pattern})\s*:?\s*(.*?)(?={STOP_PATTERN}|$)"
-        match = re.search(pattern, template, re.DOTALL | re.IGNORECASE)
-        return match.group(2).strip() if match else ""
-
-    # -- Извлекаем сырое содержимое для каждого блока --
-
-    raw_primary = extract_raw_section(template_raw, LABELS_PRIMARY)
-    raw_complication = extract_raw_section(template_raw, LABELS_COMPLICATION)
-    raw_concomitant = extract_raw_section(template_raw, LABELS_CONCOMITANT)
-
-    # -- Извлекаем текст и значения маркеров из сырых блоков --
-
-    marker_pattern = r"@#@([\w\d]+)@#@"
-
-    # Обработка основного диагноза
-    primary_text = _clean_html(re.sub(marker_pattern, "", raw_primary))
-    primary_markers = [
-        xml_data.get(marker_name)
-        for marker_name in re.findall(marker_pattern, raw_primary)
-    ]
-    primary_diagnosis = _combine_parts(primary_text, *primary_markers)
-
-    # Обработка осложнений
-    complication_text = _clean_html(re.sub(marker_pattern, "", raw_complication))
-    complication_markers = [
-        xml_data.get(marker_name)
-        for marker_name in re.findall(marker_pattern, raw_complication)
-    ]
-    primary_complication = _combine_parts(complication_text, *complication_markers)
-    if primary_complication:
-        primary_complication = primary_complication.replace(
-            "Сахарный диабет", "<b>Сахарный диабет</b>"
-        )
-
-    # Обработка сопутствующих
-    concomitant_text = _clean_html(re.sub(marker_pattern, "", raw_concomitant))
-    concomitant_markers = [
-        xml_data.get(marker_name)
-        for marker_name in re.findall(marker_pattern, raw_concomitant)
-    ]
-    concomitant_diseases = _combine_parts(concomitant_text, *concomitant_markers)
-    if concomitant_diseases:
-        concomitant_diseases = concomitant_diseases.replace(
-            "Сахарный диабет", "<b>Сахарный диабет</b>"
-        )
-
-    diagnos = xml_data.get("diagnos")
-    if diagnos:
-        diagnos = diagnos.replace("Сахарный диабет", "<b>Сахарный диабет</b>")
-
-    item_659 = xml_data.get("specMarker_659")
-    if item_659:
-        item_659 = item_659.replace("Сахарный диабет", "<b>Сахарный диабет</b>")
-
-    result = {
-        "pure": {
-            "diagnos": diagnos,
-            "primary_diagnosis": primary_diagnosis,
-            "primary_complication": primary_complication,
-            "concomitant_diseases": concomitant_diseases,
-            "item_90": xml_data.get("specMarker_90"),
-            "item_94": xml_data.get("specMarker_94"),
-            "item_272": xml_data.get("specMarker_272"),
-            "item_284": xml_data.get("specMarker_284"),
-            "item_659": item_659,
-            "item_145": xml_data.get("specMarker_145"),
-            "AdditionalInf": xml_data.get("AdditionalInf"),
-        },
-        "raw": raw_discharge_summary_data,
-    }
+    # Регулярки по большому шаблону занимают цикл событий, поэтому такие шаблоны разбираются в пуле
+    pure = await run_cpu(
+        "discharge_template",
+        parse_discharge_summary,
+        template_raw or "",
+        xml_data or {},
+        size=len(template_raw or ""),
+    )
+    result = {"pure": pure, "raw": raw_discharge_summary_data}
 
     logger.info(f"Эпикриз успешно обработан для event_id: {event_id}.")
     return result
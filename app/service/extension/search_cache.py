@@ -0,0 +1,209 @@
+"""
+Кэш результатов Search.searchData по подразделениям.
+
+Ключ — нормализованная фамилия, LpuBuilding_cid и диапазон дат выписки. Если новый запрос
+укладывается в диапазон уже закэшированного, ответ строится фильтрацией закэшированного
+надмножества, без обращения к шлюзу. Пустые результаты тоже кэшируются.
+
+Шлюз отбирает госпитализации по EvnSection_disDate_Range — по датам выписки из отделений,
+а в строке есть только даты госпитализации. Движения лежат внутри [EvnPS_setDate,
+EvnPS_disDate] и последнее заканчивается выпиской, поэтому строка с EvnPS_disDate в
+диапазоне в него попадает, а выписанная до начала или поступившая после конца — нет. Про
+госпитализацию, которая началась до конца диапазона, а закончилась после, без движений не
+сказать, попало ли в диапазон одно из ранних отделений: при такой строке надмножество не
+используется и запрос идет в шлюз.
+"""
+
+import re
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import NamedTuple
+
+from app.core.metrics import SEARCH_CACHE_LOOKUPS
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_surname(surname: str) -> str:
+    """Приводит фамилию к виду для ключа кэша: регистр, ё/е, лишние пробелы."""
+    return _SPACES.sub(" ", surname).strip().upper().replace("Ё", "Е")
+
+
+def parse_date_range(date_range: str) -> tuple[date, date] | None:
+    """Разбирает диапазон вида 'dd.mm.yyyy - dd.mm.yyyy'."""
+    start, sep, end = date_range.partition(" - ")
+    if not sep:
+        return None
+    try:
+        return (
+            datetime.strptime(start.strip(), "%d.%m.%Y").date(),
+            datetime.strptime(end.strip(), "%d.%m.%Y").date(),
+        )
+    except ValueError:
+        return None
+
+
+def split_by_month(
+    date_range: str, today: date | None = None
+) -> list[tuple[str, bool]]:
+    """
+    Делит диапазон 'dd.mm.yyyy - dd.mm.yyyy' на календарные месяцы.
+
+    Возвращает список (диапазон месяца, месяц закрыт). Закрытым считается месяц, который
+    целиком закончился до сегодняшнего дня, — выписки за него практически не меняются.
+    Если диапазон не разбирается, возвращается он сам как единственный незакрытый шард.
+    """
+    parsed = parse_date_range(date_range)
+    if parsed is None:
+        return [(date_range, False)]
+
+    today = today or date.today()
+    start, end = parsed
+    shards = []
+    while start <= end:
+        next_month = (start.replace(day=1) + timedelta(days=32)).replace(day=1)
+        shard_end = min(end, next_month - timedelta(days=1))
+        shards.append(
+            (
+                f"{start.strftime('%d.%m.%Y')} - {shard_end.strftime('%d.%m.%Y')}",
+                next_month <= today,
+            )
+        )
+        start = next_month
+    return shards
+
+
+def _row_date(row: dict, field: str) -> date | None:
+    try:
+        return datetime.strptime(str(row.get(field)), "%d.%m.%Y").date()
+    except ValueError:
+        return None
+
+
+def _discharge_date(row: dict) -> date | None:
+    return _row_date(row, "EvnPS_disDate")
+
+
+def _filter_superset(rows: list[dict], start: date, end: date) -> list[dict] | None:
+    """Строки, которые шлюз вернул бы за [start, end], или None, если это не определить."""
+    result = []
+    for row in rows:
+        discharged = _discharge_date(row)
+        if discharged < start:
+            continue
+        if discharged <= end:
+            result.append(row)
+            continue
+        admitted = _row_date(row, "EvnPS_setDate")
+        if admitted is None or admitted <= end:
+            # Выписка из раннего отделения могла попасть в диапазон
+            return None
+    return result
+
+
+class _Entry(NamedTuple):
+    start: date
+    end: date
+    rows: list[dict]
+    # Можно ли фильтровать строки по дате выписки (у всех строк дата распознана)
+    filterable: bool
+    expires_at: float
+
+
+class SearchCache:
+    """
+    Кэш поиска с фильтрацией надмножества.
+
+    Для каждой пары (фамилия, подразделение) хранится до ranges_per_key диапазонов (с запасом
+    на помесячные шарды за три года); всего пар не больше maxsize, при переполнении
+    вытесняются давно не использованные.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 512, ranges_per_key: int = 36):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.ranges_per_key = ranges_per_key
+        self._entries: OrderedDict[tuple[str, str], list[_Entry]] = OrderedDict()
+
+    def get(self, surname: str, building: str, date_range: str) -> list[dict] | None:
+        key = (normalize_surname(surname), building)
+        parsed = parse_date_range(date_range)
+        entries = self._live_entries(key)
+
+        if parsed is None or not entries:
+            SEARCH_CACHE_LOOKUPS.labels(building=building, result="miss").inc()
+            return None
+
+        start, end = parsed
+        self._entries.move_to_end(key)
+
+        for entry in entries:
+            if (entry.start, entry.end) == (start, end):
+                result = "hit" if entry.rows else "negative_hit"
+                SEARCH_CACHE_LOOKUPS.labels(building=building, result=result).inc()
+                return entry.rows
+
+        for entry in entries:
+            if entry.start <= start and end <= entry.end and entry.filterable:
+                rows = _filter_superset(entry.rows, start, end)
+                if rows is None:
+                    continue
+                result = "superset_hit" if entry.rows else "negative_hit"
+                SEARCH_CACHE_LOOKUPS.labels(building=building, result=result).inc()
+                return rows
+
+        SEARCH_CACHE_LOOKUPS.labels(building=building, result="miss").inc()
+        return None
+
+    def set(
+        self,
+        surname: str,
+        building: str,
+        date_range: str,
+        rows: list[dict],
+        ttl: float | None = None,
+    ) -> None:
+        parsed = parse_date_range(date_range)
+        if parsed is None:
+            return
+
+        key = (normalize_surname(surname), building)
+        entry = _Entry(
+            start=parsed[0],
+            end=parsed[1],
+            rows=rows,
+            filterable=all(_discharge_date(row) is not None for row in rows),
+            expires_at=time.monotonic() + (self.ttl if ttl is None else ttl),
+        )
+        entries = [
+            e
+            for e in self._live_entries(key)
+            if (e.start, e.end) != (entry.start, entry.end)
+        ]
+        # Самые широкие диапазоны держим первыми — они чаще покрывают суженные запросы
+        entries.append(entry)
+        entries.sort(
+            key=lambda e: e.end.toordinal() - e.start.toordinal(), reverse=True
+        )
+        self._entries[key] = entries[: self.ranges_per_key]
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def _live_entries(self, key: tuple[str, str]) -> list[_Entry]:
+        entries = self._entries.get(key)
+        if not entries:
+            return []
+        now = time.monotonic()
+        live = [e for e in entries if e.expires_at > now]
+        if len(live) != len(entries):
+            if live:
+                self._entries[key] = live
+            else:
+                del self._entries[key]
+        return live
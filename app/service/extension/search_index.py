@@ -0,0 +1,233 @@
+"""
+Локальный индекс госпитализаций за последние SEARCH_INDEX_WINDOW_DAYS дней.
+
+Индекс наполняется фоновой задачей (см. indexer.py) и позволяет отвечать на поиск без
+обращения к шлюзу: по точной фамилии, по префиксу и с допуском опечаток (триграммы +
+расстояние Левенштейна + упрощенный фонетический ключ для русских фамилий).
+"""
+
+import bisect
+import time
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Literal
+
+from app.core.logger_setup import logger
+from app.core.metrics import SEARCH_INDEX_QUERIES, SEARCH_INDEX_ROWS
+from app.service.extension.search_cache import normalize_surname, parse_date_range
+
+SearchMode = Literal["exact", "prefix", "fuzzy"]
+
+# Минимальная доля общих триграмм, чтобы фамилия стала кандидатом для нечеткого поиска
+_TRIGRAM_THRESHOLD = 0.3
+
+_PHONETIC_VOWELS = str.maketrans(
+    {"О": "А", "Ы": "А", "Я": "А", "Е": "И", "Э": "И", "Ю": "У"}
+)
+_PHONETIC_DEVOICE = str.maketrans(
+    {"Б": "П", "В": "Ф", "Г": "К", "Д": "Т", "Ж": "Ш", "З": "С"}
+)
+
+
+def phonetic_key(surname: str) -> str:
+    """
+    Упрощенный фонетический ключ русской фамилии.
+
+    Редуцирует гласные, оглушает согласные, убирает Ь/Ъ и схлопывает повторы,
+    так что "Малышев", "Малышеф" и "Молышев" получают один ключ.
+    """
+    name = normalize_surname(surname).replace("Ь", "").replace("Ъ", "")
+    name = name.replace("ТС", "Ц").replace("ДС", "Ц")
+    name = name.translate(_PHONETIC_VOWELS).translate(_PHONETIC_DEVOICE)
+    key = []
+    for char in name:
+        if not key or key[-1] != char:
+            key.append(char)
+    return "".join(key)
+
+
+def _trigrams(surname: str) -> set[str]:
+    padded = f"  {surname} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def _levenshtein(a: str, b: str, limit: int) -> int:
+    """Расстояние Левенштейна с ранним выходом, если оно заведомо больше limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(
+                min(
+                    previous[j] + 1,
+                    current[j - 1] + 1,
+                    previous[j - 1] + (char_a != char_b),
+                )
+            )
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def _discharge_date(row: dict) -> date | None:
+    try:
+        return datetime.strptime(str(row.get("EvnPS_disDate")), "%d.%m.%Y").date()
+    except ValueError:
+        return None
+
+
+class HospitalizationIndex:
+    """
+    Индекс строк поиска по фамилии и EvnPS_id.
+
+    Структуры перестраиваются целиком при каждом обновлении и подменяются атомарно,
+    поэтому поиск никогда не видит наполовину обновленный индекс.
+    """
+
+    def __init__(self):
+        self.window: tuple[date, date] | None = None
+        self.updated_at: float | None = None
+        self._rows: dict[str, dict] = {}
+        self._by_surname: dict[str, list[str]] = {}
+        self._sorted_surnames: list[str] = []
+        self._by_trigram: dict[str, set[str]] = {}
+        self._by_phonetic: dict[str, set[str]] = {}
+
+    @property
+    def ready(self) -> bool:
+        return self.window is not None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def replace(self, rows: list[dict], window: tuple[date, date]) -> None:
+        """Полностью заменяет содержимое индекса новыми строками за окно window."""
+        by_id: dict[str, dict] = {}
+        by_surname: dict[str, list[str]] = defaultdict(list)
+        by_trigram: dict[str, set[str]] = defaultdict(set)
+        by_phonetic: dict[str, set[str]] = defaultdict(set)
+
+        for row in rows:
+            event_id = str(row.get("EvnPS_id") or "")
+            surname = normalize_surname(str(row.get("Person_Surname") or ""))
+            if not event_id or not surname or event_id in by_id:
+                continue
+            by_id[event_id] = row
+            by_surname[surname].append(event_id)
+
+        for surname in by_surname:
+            for trigram in _trigrams(surname):
+                by_trigram[trigram].add(surname)
+            by_phonetic[phonetic_key(surname)].add(surname)
+
+        self._rows = by_id
+        self._by_surname = dict(by_surname)
+        self._sorted_surnames = sorted(by_surname)
+        self._by_trigram = dict(by_trigram)
+        self._by_phonetic = dict(by_phonetic)
+        self.window = window
+        self.updated_at = time.time()
+        SEARCH_INDEX_ROWS.set(len(by_id))
+
+    def covers(self, start: date, end: date) -> bool:
+        return (
+            self.window is not None
+            and self.window[0] <= start
+            and end <= self.window[1]
+        )
+
+    def search(
+        self,
+        surname: str,
+        date_range: str,
+        mode: SearchMode = "exact",
+        allow_partial: bool = False,
+    ) -> list[dict] | None:
+        """
+        Ищет госпитализации в индексе.
+
+        Возвращает None, если нужно идти в шлюз: индекс не готов или диапазон дат выходит
+        за окно индекса. С allow_partial диапазон обрезается по окну индекса, и шлюз нужен,
+        только если в окне ничего не нашлось (искомый случай старше окна). Такие строки
+        отдаются с _search_window="index": клиент видит, что поиск шел только по окну индекса.
+        """
+        parsed = parse_date_range(date_range)
+        if parsed is None or self.window is None:
+            SEARCH_INDEX_QUERIES.labels(mode=mode, result="fallback").inc()
+            return None
+
+        partial = not self.covers(*parsed)
+        if partial and not allow_partial:
+            SEARCH_INDEX_QUERIES.labels(mode=mode, result="fallback").inc()
+            return None
+
+        start, end = max(parsed[0], self.window[0]), min(parsed[1], self.window[1])
+        query = normalize_surname(surname)
+        if mode == "prefix":
+            surnames = self._match_prefix(query)
+        elif mode == "fuzzy":
+            surnames = self._match_fuzzy(query)
+        else:
+            surnames = [query] if query in self._by_surname else []
+
+        rows = []
+        for matched in surnames:
+            for event_id in self._by_surname.get(matched, []):
+                row = self._rows[event_id]
+                discharge_date = _discharge_date(row)
+                if discharge_date and start <= discharge_date <= end:
+                    rows.append(row)
+
+        if partial and not rows:
+            SEARCH_INDEX_QUERIES.labels(mode=mode, result="fallback").inc()
+            return None
+
+        SEARCH_INDEX_QUERIES.labels(mode=mode, result="served").inc()
+        logger.debug(
+            f"Индекс: '{query}' ({mode}) -> фамилий {len(surnames)}, записей {len(rows)}"
+        )
+        if partial:
+            return [{**row, "_search_window": "index"} for row in rows]
+        return rows
+
+    def _match_prefix(self, prefix: str) -> list[str]:
+        if not prefix:
+            return []
+        position = bisect.bisect_left(self._sorted_surnames, prefix)
+        matched = []
+        while position < len(self._sorted_surnames) and self._sorted_surnames[
+            position
+        ].startswith(prefix):
+            matched.append(self._sorted_surnames[position])
+            position += 1
+        return matched
+
+    def _match_fuzzy(self, query: str) -> list[str]:
+        if not query:
+            return []
+        # Допустимое число опечаток растет с длиной фамилии
+        max_distance = 1 if len(query) <= 5 else 2
+        query_trigrams = _trigrams(query)
+
+        shared: dict[str, int] = defaultdict(int)
+        for trigram in query_trigrams:
+            for candidate in self._by_trigram.get(trigram, ()):
+                shared[candidate] += 1
+
+        matched = set(self._by_phonetic.get(phonetic_key(query), ()))
+        for candidate, count in shared.items():
+            similarity = count / len(query_trigrams | _trigrams(candidate))
+            if candidate in matched or similarity < _TRIGRAM_THRESHOLD:
+                continue
+            if _levenshtein(query, candidate, max_distance) <= max_distance:
+                matched.add(candidate)
+
+        if query in self._by_surname:
+            matched.add(query)
+        return sorted(matched)
+
+
+search_index = HospitalizationIndex()
@@ -1,25 +1,62 @@
-import json
-from datetime import datetime
+import asyncio
+from datetime import datetime, timedelta
 from typing import Any
 
 from app.core import get_settings
+from app.core.decorators import log_and_catch
+from app.core.logger_setup import logger
+from app.core.metrics import SEARCH_PROGRESSIVE_RESULTS
+from app.mapper import DEFAULT_DIVISION_NAME, division_names
 from app.model import ExtensionStartedData
-from app.service.gateway.gateway_service import GatewayService
+from app.service.extension.search_cache import SearchCache, split_by_month
+from app.service.extension.search_index import search_index
 from app.service.extension.utils import safe_gather
-from app.core.logger_setup import logger
-from app.mapper import division_names, DEFAULT_DIVISION_NAME
+from app.service.gateway.gateway_service import GatewayService
 
 settings = get_settings()
 
+search_cache = SearchCache(ttl=settings.SEARCH_CACHE_TTL)
+
+# Поля строки Search.searchData, которые использует расширение: отображение в списке
+# результатов (ФИО, д.р., карта, дата госпитализации) и последующее обогащение (started_data).
+SEARCH_ROW_FIELDS = (
+    "EvnPS_id",
+    "Person_id",
+    "Person_Surname",
+    "Person_Firname",
+    "Person_Secname",
+    "Person_Birthday",
+    "EvnPS_NumCard",
+    "EvnPS_setDate",
+    "EvnPS_disDate",
+    "LpuSection_Name",
+)
+
+
+def _project_search_row(item: dict) -> dict:
+    """Оставляет в строке поиска только поля из SEARCH_ROW_FIELDS."""
+    return {field: item[field] for field in SEARCH_ROW_FIELDS if field in item}
+
+
+async def _iter_rows(rows: list[dict]):
+    """Оборачивает уже разобранный список строк в асинхронный итератор."""
+    for row in rows:
+        yield row
+
 
-async def _fetch_data_for_building(
-        cid: str,
-        patient: ExtensionStartedData,
-        search_date_range: str,
-        gateway_service: GatewayService
+@log_and_catch()
+async def fetch_data_for_building(
+    cid: str,
+    patient: ExtensionStartedData,
+    search_date_range: str,
+    gateway_service: GatewayService,
 ) -> list[dict]:
     """
-    Вспомогательная функция для запроса данных по конкретному LpuBuilding_cid.
+    Запрашивает у шлюза выписки одного подразделения (LpuBuilding_cid) за период, без кэшей
+    и окон поиска. Используется и поиском, и построением локального индекса (indexer.py).
+
+    При SEARCH_STREAM_PARSE строки читаются из тела ответа по одной и сразу проецируются,
+    так что пиковая память определяется размером строки, а не всего ответа.
     """
     request_data = {
         "SearchFormType": "EvnPS",
@@ -38,46 +75,268 @@ async def _fetch_data_for_building(
         "data": request_data,
     }
 
-    response = await gateway_service.make_request(method="post", json=payload_dict)
-
-    data = []
-    if isinstance(response, dict):
-        data = response.get("data", [])
-
     division_name = division_names.get(cid, DEFAULT_DIVISION_NAME)
 
-    for item in data:
+    if settings.SEARCH_STREAM_PARSE:
+        rows = gateway_service.stream_items(method="post", json=payload_dict)
+    else:
+        response = await gateway_service.make_request(method="post", json=payload_dict)
+        rows = _iter_rows(
+            response.get("data", []) if isinstance(response, dict) else []
+        )
+
+    data = []
+    async for item in rows:
+        if not isinstance(item, dict):
+            continue
+        if settings.SEARCH_ROW_PROJECTION:
+            item = _project_search_row(item)
         item["_division_internal_cid"] = cid
         item["_division_name"] = division_name
+        data.append(item)
 
     return data
 
 
+async def _fetch_data_for_building_cached(
+    cid: str,
+    patient: ExtensionStartedData,
+    search_date_range: str,
+    gateway_service: GatewayService,
+    cache_ttl: float | None = None,
+) -> list[dict]:
+    """
+    Поиск по подразделению через кэш: точное совпадение, надмножество или запрос к шлюзу.
+    Ошибки шлюза не кэшируются.
+    """
+    if not settings.SEARCH_CACHE_ENABLED:
+        return await fetch_data_for_building(
+            cid, patient, search_date_range, gateway_service
+        )
+
+    cached = search_cache.get(patient.last_name, cid, search_date_range)
+    if cached is not None:
+        logger.debug(
+            f"Подразделение {cid}: результат поиска из кэша ({len(cached)} записей)"
+        )
+        return cached
+
+    data = await fetch_data_for_building(
+        cid, patient, search_date_range, gateway_service
+    )
+    search_cache.set(patient.last_name, cid, search_date_range, data, ttl=cache_ttl)
+    return data
+
+
+async def _fetch_data_for_building_sharded(
+    cid: str,
+    patient: ExtensionStartedData,
+    search_date_range: str,
+    gateway_service: GatewayService,
+    semaphore: asyncio.Semaphore,
+) -> list[dict]:
+    """
+    Поиск по подразделению, разбитый на календарные месяцы.
+
+    Шарды закрытых месяцев кэшируются на SEARCH_CLOSED_MONTH_CACHE_TTL, текущего — на обычный
+    SEARCH_CACHE_TTL. Если упал хотя бы один шард, падает поиск по всему подразделению,
+    чтобы не отдавать неполный результат.
+    """
+    shards = split_by_month(search_date_range)
+
+    async def fetch_shard(shard_range: str, closed: bool) -> list[dict]:
+        async with semaphore:
+            return await _fetch_data_for_building_cached(
+                cid,
+                patient,
+                shard_range,
+                gateway_service,
+                cache_ttl=settings.SEARCH_CLOSED_MONTH_CACHE_TTL if closed else None,
+            )
+
+    batches = await asyncio.gather(*[fetch_shard(*shard) for shard in shards])
+
+    # Случай с несколькими движениями может попасть в соседние месяцы — убираем дубли
+    data, seen = [], set()
+    for batch in batches:
+        for item in batch:
+            event_id = item.get("EvnPS_id")
+            if event_id is not None and event_id in seen:
+                continue
+            seen.add(event_id)
+            data.append(item)
+
+    logger.debug(f"Подразделение {cid}: {len(shards)} шардов, записей {len(data)}")
+    return data
+
+
+async def _fetch_building(
+    cid: str,
+    patient: ExtensionStartedData,
+    search_date_range: str,
+    gateway_service: GatewayService,
+    semaphore: asyncio.Semaphore,
+) -> list[dict]:
+    """Поиск по подразделению с учетом настроек шардирования по месяцам."""
+    if settings.SEARCH_MONTH_SHARDING:
+        return await _fetch_data_for_building_sharded(
+            cid, patient, search_date_range, gateway_service, semaphore
+        )
+    return await _fetch_data_for_building_cached(
+        cid, patient, search_date_range, gateway_service
+    )
+
+
+def _progressive_windows() -> list[tuple[str, str]]:
+    """
+    Возвращает окна прогрессивного поиска [(метка, диапазон), ...] от узкого к полному.
+
+    Окна из SEARCH_PROGRESSIVE_WINDOWS (в днях до сегодня) не выходят за
+    SEARCH_PERIOD_START_DATE; последним всегда идет полный диапазон поиска.
+    """
+    today = datetime.now()
+    period_start = datetime.strptime(settings.SEARCH_PERIOD_START_DATE, "%d.%m.%Y")
+    windows = []
+    for days in settings.progressive_windows_list:
+        start = today - timedelta(days=days)
+        if start <= period_start:
+            break
+        windows.append(
+            (f"{days}d", f"{start.strftime('%d.%m.%Y')} - {today.strftime('%d.%m.%Y')}")
+        )
+    windows.append(
+        ("full", f"{settings.SEARCH_PERIOD_START_DATE} - {today.strftime('%d.%m.%Y')}")
+    )
+    return windows
+
+
+async def _fetch_data_for_building_progressive(
+    cid: str,
+    patient: ExtensionStartedData,
+    windows: list[tuple[str, str]],
+    gateway_service: GatewayService,
+    semaphore: asyncio.Semaphore,
+) -> list[dict]:
+    """
+    Ищет по подразделению, начиная с самого узкого окна, и расширяет окно только если
+    подразделение ничего не вернуло. Каждая строка помечается окном, в котором она найдена.
+    """
+    for label, window_range in windows:
+        data = await _fetch_building(
+            cid, patient, window_range, gateway_service, semaphore
+        )
+        if data:
+            SEARCH_PROGRESSIVE_RESULTS.labels(building=cid, window=label).inc()
+            # Копируем строки: сами строки могут лежать в кэше поиска
+            return [{**item, "_search_window": label} for item in data]
+
+    SEARCH_PROGRESSIVE_RESULTS.labels(building=cid, window="none").inc()
+    return []
+
+
+def _search_sort_key(item: dict) -> tuple:
+    """Ключ сортировки: по дате выписки, затем по дате госпитализации и EvnPS_id."""
+
+    def _parse(value: Any) -> datetime:
+        try:
+            return datetime.strptime(str(value), "%d.%m.%Y")
+        except ValueError:
+            return datetime.min
+
+    return (
+        _parse(item.get("EvnPS_disDate")),
+        _parse(item.get("EvnPS_setDate")),
+        str(item.get("EvnPS_id", "")),
+    )
+
+
+def sort_search_results(data: list[dict]) -> list[dict]:
+    """
+    Стабильная сортировка результатов поиска: сначала недавно выписанные.
+    Записи без даты выписки оказываются в конце списка.
+    """
+    return sorted(data, key=_search_sort_key, reverse=True)
+
+
+def summarize_search_windows(data: list[dict]) -> dict[str, str]:
+    """Для прогрессивного поиска: в каком окне нашлись результаты каждого подразделения."""
+    return {
+        item["_division_internal_cid"]: item["_search_window"]
+        for item in data
+        if "_search_window" in item
+    }
+
+
+def get_search_date_range(patient: ExtensionStartedData) -> str:
+    """
+    Возвращает диапазон дат выписки для поиска: из запроса или от SEARCH_PERIOD_START_DATE до сегодня.
+    """
+    return (
+        patient.dis_date_range
+        or f"{settings.SEARCH_PERIOD_START_DATE} - {datetime.now().strftime('%d.%m.%Y')}"
+    )
+
+
 async def fetch_started_data(
-        patient: ExtensionStartedData, gateway_service: GatewayService
+    patient: ExtensionStartedData, gateway_service: GatewayService
 ) -> list[Any]:
     """
     Ищет пациентов по всем указанным в настройках подразделениям (LpuBuilding_cid).
     """
-    search_date_range = (
-            patient.dis_date_range
-            or f"{settings.SEARCH_PERIOD_START_DATE} - {datetime.now().strftime('%d.%m.%Y')}"
-    )
+    search_date_range = get_search_date_range(patient)
 
     # Получаем список ID из настроек
     building_cids = settings.lpu_building_cids_list
 
     if not building_cids:
-        logger.warning("Не заданы LpuBuilding_cid в настройках (.env). Поиск невозможен.")
+        logger.warning(
+            "Не заданы LpuBuilding_cid в настройках (.env). Поиск невозможен."
+        )
         return []
 
-    logger.info(f"Запуск поиска пациента '{patient.last_name}' по подразделениям: {building_cids}")
+    if settings.SEARCH_INDEX_ENABLED:
+        # Точный поиск из индекса — только если диапазон целиком в его окне, иначе более
+        # старые госпитализации пропали бы. Префиксный и нечеткий поиск шлюз не умеет: без
+        # явных дат они идут по окну индекса, а строки помечаются окном "index"
+        indexed = search_index.search(
+            patient.last_name,
+            search_date_range,
+            patient.search_mode,
+            allow_partial=not patient.dis_date_range and patient.search_mode != "exact",
+        )
+        if indexed is not None:
+            logger.info(
+                f"Поиск пациента '{patient.last_name}' ({patient.search_mode}) по локальному индексу: "
+                f"найдено {len(indexed)}"
+            )
+            return sort_search_results(indexed)
+
+    if patient.search_mode != "exact":
+        logger.info(
+            f"Режим '{patient.search_mode}' недоступен для диапазона {search_date_range} "
+            f"(вне окна индекса) — выполняем точный поиск через шлюз"
+        )
+
+    logger.info(
+        f"Запуск поиска пациента '{patient.last_name}' по подразделениям: {building_cids}"
+    )
 
     # Создаем задачи для каждого подразделения
-    tasks = [
-        _fetch_data_for_building(cid, patient, search_date_range, gateway_service)
-        for cid in building_cids
-    ]
+    semaphore = asyncio.Semaphore(settings.SEARCH_SHARD_CONCURRENCY)
+    if patient.progressive and not patient.dis_date_range:
+        windows = _progressive_windows()
+        logger.info(f"Прогрессивный поиск, окна: {[label for label, _ in windows]}")
+        tasks = [
+            _fetch_data_for_building_progressive(
+                cid, patient, windows, gateway_service, semaphore
+            )
+            for cid in building_cids
+        ]
+    else:
+        tasks = [
+            _fetch_building(cid, patient, search_date_range, gateway_service, semaphore)
+            for cid in building_cids
+        ]
 
     # Запускаем параллельно
     results = await safe_gather(*tasks)
@@ -85,9 +344,10 @@ async def fetch_started_data(
     # Объединяем результаты в один плоский список
     combined_data = []
     for batch in results:
-        if batch:  # safe_gather возвращает None в случае ошибки, или список словарей при успехе
+        if (
+            batch
+        ):  # safe_gather возвращает None в случае ошибки, или список словарей при успехе
             combined_data.extend(batch)
 
-
     logger.info(f"Всего найдено записей: {len(combined_data)}")
-    return combined_data
+    return sort_search_results(combined_data)
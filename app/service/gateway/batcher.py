@@ -0,0 +1,258 @@
+"""
+Микро-пакетирование вызовов шлюза ЕВМИАС.
+
+Обогащение одного случая — это 8–10 независимых вызовов шлюза, большая часть которых
+делается параллельно. Пакетировщик собирает вызовы, сделанные в пределах короткого окна,
+и отправляет их одним POST:
+
+    {"batch": [{"params": {"c", "m"}, "data"}, ...]}
+    -> {"results": [{"status_code": 200, "json": ...}, ...]}
+
+Результаты раздаются вызывающим в исходном порядке. Если шлюз не понимает пакетный
+конверт (4xx/501 или ответ не того формата), пакетировщик запоминает это, отправляет
+вызовы по одному и перепроверяет поддержку через recheck_interval. Вызовы, упавшие внутри
+пакета с 5xx, повторяются по одному.
+
+Вызовы из разных полос (batch_lane) в один пакет не попадают: пакет отвечает за время самого
+медленного вызова, и необязательная часть данных не должна задерживать основную.
+
+Один пакетировщик создается на приложение (app.state.gateway_batcher) и живет в его event loop.
+"""
+
+import asyncio
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Any
+
+import httpx
+from fastapi import FastAPI
+
+from app.core import get_settings, json_codec
+from app.core.logger_setup import logger
+from app.core.metrics import (
+    GATEWAY_BATCH_FALLBACKS,
+    GATEWAY_BATCH_SIZE,
+    GATEWAY_RESPONSE_BYTES,
+)
+from app.service.gateway.gateway_service import _method_label
+
+settings = get_settings()
+
+# Статусы, которыми шлюз без поддержки пакетов отвечает на незнакомый конверт
+_UNSUPPORTED_STATUSES = {400, 404, 405, 415, 422, 501}
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Полоса пакетирования для вызовов текущей задачи
+batch_lane: ContextVar[str] = ContextVar("gateway_batch_lane", default="main")
+
+
+class GatewayBatcher:
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        endpoint: str,
+        window: float = 0.005,
+        max_size: int = 16,
+        recheck_interval: float = 600,
+    ):
+        self._client = client
+        self.endpoint = endpoint
+        self.window = window
+        self.max_size = max_size
+        self.recheck_interval = recheck_interval
+        self._pending: dict[str, list[tuple[dict, asyncio.Future]]] = defaultdict(list)
+        self._flush_handles: dict[str, asyncio.TimerHandle] = {}
+        self._tasks: set[asyncio.Task] = set()
+        # None — поддержка пакетов еще не проверялась
+        self.supported: bool | None = None
+        self._unsupported_at = 0.0
+
+    @property
+    def batching_available(self) -> bool:
+        if self.supported is False:
+            return time.monotonic() - self._unsupported_at >= self.recheck_interval
+        return True
+
+    async def submit(self, payload: dict) -> Any:
+        """Ставит вызов в текущий пакет и ждет его результат (разобранный JSON)."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        lane = batch_lane.get()
+        pending = self._pending[lane]
+        pending.append((payload, future))
+
+        if len(pending) >= self.max_size:
+            self._flush(lane)
+        elif lane not in self._flush_handles:
+            self._flush_handles[lane] = loop.call_later(self.window, self._flush, lane)
+
+        return await future
+
+    async def close(self) -> None:
+        for lane in list(self._pending):
+            self._flush(lane)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _flush(self, lane: str) -> None:
+        handle = self._flush_handles.pop(lane, None)
+        if handle is not None:
+            handle.cancel()
+
+        batch = self._pending.pop(lane, [])
+        # Вызывающие, которые уже отменены (например, по таймауту), в пакет не попадают
+        batch = [(payload, future) for payload, future in batch if not future.done()]
+        if not batch:
+            return
+
+        task = asyncio.create_task(self._send(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: list[tuple[dict, asyncio.Future]]) -> None:
+        if len(batch) == 1 or not self.batching_available:
+            if len(batch) > 1:
+                GATEWAY_BATCH_FALLBACKS.labels(reason="unsupported").inc(len(batch))
+            await self._send_each(batch)
+            return
+
+        GATEWAY_BATCH_SIZE.observe(len(batch))
+        try:
+            response = await self._client.post(
+                self.endpoint,
+                content=json_codec.dumps({"batch": [payload for payload, _ in batch]}),
+                headers=_JSON_HEADERS,
+            )
+        except httpx.RequestError as e:
+            # Шлюз недоступен — по одному тоже не получится, отдаем ошибку всем
+            for _, future in batch:
+                _set_exception(future, e)
+            return
+
+        results = self._parse_results(response, len(batch))
+        if results is None:
+            await self._send_each(batch)
+            return
+
+        retry = []
+        for (payload, future), result in zip(batch, results):
+            status_code = int(result.get("status_code", 200))
+            if status_code >= 500:
+                retry.append((payload, future))
+            elif status_code >= 400:
+                _set_exception(
+                    future, self._status_error(status_code, result.get("json"))
+                )
+            else:
+                data = result.get("json")
+                _set_result(future, {} if data is None else data)
+
+        if retry:
+            GATEWAY_BATCH_FALLBACKS.labels(reason="call_error").inc(len(retry))
+            await self._send_each(retry)
+
+    def _parse_results(
+        self, response: httpx.Response, expected: int
+    ) -> list[dict] | None:
+        """Разбирает ответ на пакет; None — пакет не обработан и вызовы нужно отправить по одному."""
+        if response.status_code in _UNSUPPORTED_STATUSES:
+            self._mark_unsupported(f"HTTP {response.status_code}", expected)
+            return None
+        if response.is_error:
+            GATEWAY_BATCH_FALLBACKS.labels(reason="batch_error").inc(expected)
+            logger.warning(
+                f"Пакетный запрос к шлюзу завершился с HTTP {response.status_code}"
+            )
+            return None
+
+        GATEWAY_RESPONSE_BYTES.labels(method="batch").observe(len(response.content))
+        try:
+            results = json_codec.loads(response.content).get("results")
+        except (ValueError, AttributeError):
+            results = None
+        if (
+            not isinstance(results, list)
+            or len(results) != expected
+            or not all(isinstance(result, dict) for result in results)
+        ):
+            self._mark_unsupported("ответ не в пакетном формате", expected)
+            return None
+
+        if self.supported is not True:
+            logger.info("Шлюз поддерживает пакетные запросы")
+        self.supported = True
+        return results
+
+    def _mark_unsupported(self, reason: str, calls: int) -> None:
+        if self.supported is not False:
+            logger.warning(
+                f"Шлюз не поддерживает пакетные запросы ({reason}), вызовы идут по одному"
+            )
+        self.supported = False
+        self._unsupported_at = time.monotonic()
+        GATEWAY_BATCH_FALLBACKS.labels(reason="unsupported").inc(calls)
+
+    async def _send_each(self, batch: list[tuple[dict, asyncio.Future]]) -> None:
+        await asyncio.gather(
+            *(self._send_one(payload, future) for payload, future in batch)
+        )
+
+    async def _send_one(self, payload: dict, future: asyncio.Future) -> None:
+        try:
+            response = await self._client.post(
+                self.endpoint, content=json_codec.dumps(payload), headers=_JSON_HEADERS
+            )
+            response.raise_for_status()
+            GATEWAY_RESPONSE_BYTES.labels(method=_method_label(payload)).observe(
+                len(response.content)
+            )
+            _set_result(
+                future, json_codec.loads(response.content) if response.content else {}
+            )
+        except Exception as e:  # noqa: BLE001
+            _set_exception(future, e)
+
+    def _status_error(self, status_code: int, data: Any) -> httpx.HTTPStatusError:
+        request = httpx.Request("POST", self._client.base_url.join(self.endpoint))
+        response = httpx.Response(
+            status_code, request=request, content=json_codec.dumps(data)
+        )
+        return httpx.HTTPStatusError(
+            f"Вызов в пакете завершился с HTTP {status_code}",
+            request=request,
+            response=response,
+        )
+
+
+def _set_result(future: asyncio.Future, result: Any) -> None:
+    if not future.done():
+        future.set_result(result)
+
+
+def _set_exception(future: asyncio.Future, error: BaseException) -> None:
+    if not future.done():
+        future.set_exception(error)
+
+
+async def init_gateway_batcher(app: FastAPI) -> None:
+    """Создает пакетировщик для клиента шлюза, если пакетирование включено."""
+    if not settings.GATEWAY_BATCH_ENABLED:
+        return
+    app.state.gateway_batcher = GatewayBatcher(
+        app.state.gateway_client,
+        endpoint=settings.GATEWAY_REQUEST_ENDPOINT,
+        window=settings.GATEWAY_BATCH_WINDOW_MS / 1000,
+        max_size=settings.GATEWAY_BATCH_MAX_SIZE,
+        recheck_interval=settings.GATEWAY_BATCH_RECHECK_INTERVAL,
+    )
+    logger.info(
+        f"Пакетирование вызовов шлюза включено: окно {settings.GATEWAY_BATCH_WINDOW_MS} мс, "
+        f"до {settings.GATEWAY_BATCH_MAX_SIZE} вызовов"
+    )
+
+
+async def shutdown_gateway_batcher(app: FastAPI) -> None:
+    batcher = getattr(app.state, "gateway_batcher", None)
+    if batcher is not None:
+        await batcher.close()
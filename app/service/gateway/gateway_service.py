@@ -1,7 +1,29 @@
+import asyncio
+import time
+from collections.abc import AsyncIterator
+from typing import Any
+
 import httpx
 
-from app.core import get_settings
+from app.core import deadline, get_settings, json_codec
 from app.core.decorators import log_and_catch
+from app.core.fairness import current_client, gateway_scheduler
+from app.core.json_stream import iter_json_array
+from app.core.loop_monitor import annotate_task
+from app.core.metrics import GATEWAY_RESPONSE_BYTES
+from app.core.offload import run_cpu
+from app.core.slow_calls import current_stages, record_if_slow
+from app.service.gateway.response_cache import gateway_cache
+
+
+def _method_label(payload: Any) -> str:
+    """Метка метода ЕВМИАС вида 'Search.searchData' из тела запроса к шлюзу."""
+    try:
+        params = payload["params"]
+        return f"{params['c']}.{params['m']}"
+    except (KeyError, TypeError):
+        return "unknown"
+
 
 settings = get_settings()
 
@@ -9,20 +31,233 @@ settings = get_settings()
 class GatewayService:
     GATEWAY_ENDPOINT = settings.GATEWAY_REQUEST_ENDPOINT
 
-    def __init__(self, client: httpx.AsyncClient):
+    def __init__(self, client: httpx.AsyncClient, batcher: Any = None):
         self._client = client
+        # GatewayBatcher (batcher.py), если пакетирование включено; иначе каждый вызов — свой POST
+        self._batcher = batcher
 
     @log_and_catch()
     async def make_request(self, method: str, **kwargs) -> dict:
         if not hasattr(self._client, method.lower()):
             raise ValueError(f"Неподдерживаемый HTTP метод: {method}")
 
+        payload = kwargs.get("json")
+        method_label = _method_label(payload)
+        # Редко меняющиеся данные отдаются из кэша, в том числе устаревшие при сбое шлюза
+        if (
+            gateway_cache is not None
+            and method.lower() == "post"
+            and gateway_cache.cacheable(method_label)
+        ):
+            return await gateway_cache.fetch(
+                method_label, payload, lambda: self._fetch(method, **kwargs)
+            )
+        return await self._fetch(method, **kwargs)
+
+    async def _fetch(self, method: str, **kwargs) -> Any:
+        """Вызов шлюза через справедливую очередь с учетом бюджета и журнала медленных вызовов."""
+        started = time.perf_counter()
+        payload = kwargs.get("json")
+        # Последний метод шлюза задачи — для стека в логе монитора цикла событий
+        annotate_task(gateway_method=_method_label(payload))
+        preceding_stages = current_stages()
+        stages: dict[str, float] = {}
+        response_bytes = None
+        error = None
+        try:
+            if gateway_scheduler is not None:
+                # Слоты шлюза раздаются клиентам по кругу (app/core/fairness.py); ожидание слота
+                # тоже расходует бюджет времени запроса
+                try:
+                    await gateway_scheduler.acquire(
+                        current_client.get(), deadline.remaining()
+                    )
+                except TimeoutError as e:
+                    raise deadline.DeadlineExceeded(
+                        "Бюджет времени исчерпан в очереди к шлюзу"
+                    ) from e
+                stages["queue"] = round((time.perf_counter() - started) * 1000, 1)
+
+            call_started = time.perf_counter()
+            try:
+                result, response_bytes = await self._send(method, **kwargs)
+            finally:
+                if gateway_scheduler is not None:
+                    gateway_scheduler.release()
+                stages["call"] = round((time.perf_counter() - call_started) * 1000, 1)
+            return result
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            record_if_slow(
+                "gateway",
+                _method_label(payload),
+                started,
+                settings.SLOW_GATEWAY_CALL_MS,
+                # Метод уже в method, а params содержит _dc и сбил бы отпечаток одинаковых вызовов
+                request=payload.get("data") if isinstance(payload, dict) else payload,
+                stages=stages,
+                preceding_stages=preceding_stages,
+                response_bytes=response_bytes,
+                client=current_client.get(),
+                error=error,
+            )
+
+    async def _send(self, method: str, **kwargs) -> tuple[Any, int | None]:
+        """Сам вызов шлюза; возвращает ответ и размер тела (None, если вызов ушел в пакете)."""
         http_method_func = getattr(self._client, method.lower())
 
+        # Тело запроса сериализуем своим кодеком, а не стандартным json внутри httpx
+        payload = kwargs.pop("json", None)
+        method_label = _method_label(payload)
+
+        # Таймаут вызова сжимается до остатка бюджета запроса (см. app/core/deadline.py)
+        timeout = deadline.timeout_for(settings.REQUEST_TIMEOUT)
+        bounded_by_deadline = timeout < settings.REQUEST_TIMEOUT
+
+        if (
+            self._batcher is not None
+            and method.lower() == "post"
+            and payload is not None
+            and not kwargs
+        ):
+            if not bounded_by_deadline:
+                return await self._batcher.submit(payload), None
+            try:
+                return (
+                    await asyncio.wait_for(self._batcher.submit(payload), timeout),
+                    None,
+                )
+            except TimeoutError as e:
+                raise deadline.DeadlineExceeded(
+                    f"{method_label}: бюджет времени исчерпан"
+                ) from e
+
+        if bounded_by_deadline:
+            kwargs.setdefault("timeout", timeout)
+        if payload is not None:
+            kwargs["content"] = json_codec.dumps(payload)
+            kwargs["headers"] = {
+                **(kwargs.get("headers") or {}),
+                "Content-Type": "application/json",
+            }
+
         # kwargs для декоратора должны содержать 'method' и 'url' для красивого логирования
-        response = await http_method_func(url=self.GATEWAY_ENDPOINT, **kwargs)
+        request = http_method_func(url=self.GATEWAY_ENDPOINT, **kwargs)
+        try:
+            # Таймауты httpx действуют на отдельные фазы (connect/read), поэтому весь вызов
+            # дополнительно ограничиваем по общему времени
+            response = await (
+                asyncio.wait_for(request, timeout) if bounded_by_deadline else request
+            )
+        except (TimeoutError, httpx.TimeoutException) as e:
+            if bounded_by_deadline:
+                raise deadline.DeadlineExceeded(
+                    f"{method_label}: бюджет времени исчерпан"
+                ) from e
+            raise
 
         # httpx.HTTPStatusError будет пойман декоратором, так что try...except не нужен
         response.raise_for_status()
+        GATEWAY_RESPONSE_BYTES.labels(method=method_label).observe(
+            len(response.content)
+        )
+
+        # Мегабайтные ответы (поиск без потокового разбора) разбираются вне цикла событий
+        result = {}
+        if response.content:
+            result = await run_cpu(
+                "gateway_json",
+                json_codec.loads,
+                response.content,
+                size=len(response.content),
+                large_result=True,
+            )
+        return result, len(response.content)
+
+    async def stream_items(
+        self, method: str, json: dict, key: str = "data"
+    ) -> AsyncIterator[Any]:
+        """
+        Потоково читает ответ шлюза вида {key: [...]} и отдает элементы массива по одному.
+
+        Тело ответа целиком в память не загружается. Как и make_request, вызов занимает слот
+        справедливой очереди (на все время чтения тела), ограничен бюджетом времени запроса и
+        попадает в журнал медленных вызовов. Ошибки сети и HTTP-статусы пробрасываются как
+        есть, поэтому вызывающая функция должна быть обернута в log_and_catch.
+        """
+        started = time.perf_counter()
+        method_label = _method_label(json)
+        annotate_task(gateway_method=method_label)
+        preceding_stages = current_stages()
+        stages: dict[str, float] = {}
+        received = 0
+        error = None
+        try:
+            if gateway_scheduler is not None:
+                try:
+                    await gateway_scheduler.acquire(
+                        current_client.get(), deadline.remaining()
+                    )
+                except TimeoutError as e:
+                    raise deadline.DeadlineExceeded(
+                        "Бюджет времени исчерпан в очереди к шлюзу"
+                    ) from e
+                stages["queue"] = round((time.perf_counter() - started) * 1000, 1)
+
+            call_started = time.perf_counter()
+            try:
+                timeout = deadline.timeout_for(settings.REQUEST_TIMEOUT)
+                bounded_by_deadline = timeout < settings.REQUEST_TIMEOUT
+                async with self._client.stream(
+                    method.upper(),
+                    self.GATEWAY_ENDPOINT,
+                    content=json_codec.dumps(json),
+                    headers={"Content-Type": "application/json"},
+                    **({"timeout": timeout} if bounded_by_deadline else {}),
+                ) as response:
+                    response.raise_for_status()
+
+                    async def counted_chunks():
+                        nonlocal received
+                        async for chunk in response.aiter_bytes():
+                            # Таймауты httpx действуют на отдельные чтения, а медленно текущее
+                            # тело ограничиваем по общему бюджету между порциями
+                            left = deadline.remaining()
+                            if left is not None and left <= 0:
+                                raise deadline.DeadlineExceeded(
+                                    f"{method_label}: бюджет времени исчерпан"
+                                )
+                            received += len(chunk)
+                            yield chunk
 
-        return response.json() if response.content else {}
+                    async for item in iter_json_array(counted_chunks(), key=key):
+                        yield item
+                    GATEWAY_RESPONSE_BYTES.labels(method=method_label).observe(received)
+            except httpx.TimeoutException as e:
+                if bounded_by_deadline:
+                    raise deadline.DeadlineExceeded(
+                        f"{method_label}: бюджет времени исчерпан"
+                    ) from e
+                raise
+            finally:
+                if gateway_scheduler is not None:
+                    gateway_scheduler.release()
+                stages["call"] = round((time.perf_counter() - call_started) * 1000, 1)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            record_if_slow(
+                "gateway",
+                method_label,
+                started,
+                settings.SLOW_GATEWAY_CALL_MS,
+                request=json.get("data"),
+                stages=stages,
+                preceding_stages=preceding_stages,
+                response_bytes=received,
+                client=current_client.get(),
+                error=error,
+            )
@@ -0,0 +1,196 @@
+"""
+Фоновая проверка шлюза ЕВМИАС для /health.
+
+Раз в GATEWAY_PROBE_INTERVAL секунд отправляет в шлюз легкий вызов
+Common.getCurrentDateTime и запоминает задержку (скользящее окно последних проверок),
+последний ответ и последнюю ошибку. /health/gateway и /health/ready отвечают из этого
+состояния, не обращаясь к шлюзу, поэтому частые пробы оркестратора и мониторинга не
+нагружают шлюз и не зависают вместе с ним.
+
+После GATEWAY_PROBE_FAILURE_THRESHOLD неудачных проверок подряд шлюз считается
+недоступным (цепь разомкнута), о чем один раз уходит уведомление в Telegram; первая же
+успешная проверка замыкает цепь.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Any
+
+import httpx
+from fastapi import FastAPI
+
+from app.core import get_settings, json_codec
+from app.core.fairness import gateway_scheduler
+from app.core.logger_setup import logger
+from app.core.metrics import GATEWAY_CIRCUIT_OPEN, GATEWAY_PROBE_SECONDS
+from app.core.notifier import send_telegram_alert
+
+settings = get_settings()
+
+PROBE_PAYLOAD = {
+    "params": {"c": "Common", "m": "getCurrentDateTime"},
+    "data": {"is_activerulles": "true"},
+}
+
+
+class GatewayProber:
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        endpoint: str,
+        interval: float = 15,
+        timeout: float = 5,
+        failure_threshold: int = 3,
+        window: int = 100,
+    ):
+        self._client = client
+        self.endpoint = endpoint
+        self.interval = interval
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self._latencies: deque[float] = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.circuit_open = False
+        self.last_response: Any = None
+        self.last_error: str | None = None
+        self.last_checked_at: float | None = None
+        self.last_ok_at: float | None = None
+
+    async def probe(self) -> bool:
+        """Одна проверка шлюза; обновляет состояние и возвращает, ответил ли шлюз."""
+        started = time.perf_counter()
+        try:
+            response = await self._client.post(
+                self.endpoint,
+                content=json_codec.dumps(PROBE_PAYLOAD),
+                headers={"Content-Type": "application/json"},
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            result = json_codec.loads(response.content) if response.content else {}
+        except Exception as e:  # noqa: BLE001
+            await self._record_failure(f"{type(e).__name__}: {e}")
+            return False
+
+        latency = time.perf_counter() - started
+        GATEWAY_PROBE_SECONDS.observe(latency)
+        self._latencies.append(latency)
+        self.last_response = result
+        self.last_checked_at = self.last_ok_at = time.time()
+        self.consecutive_failures = 0
+        if self.circuit_open:
+            logger.info("Шлюз ЕВМИАС снова отвечает")
+            self.circuit_open = False
+            GATEWAY_CIRCUIT_OPEN.set(0)
+        return True
+
+    async def _record_failure(self, error: str) -> None:
+        self.last_error = error
+        self.last_checked_at = time.time()
+        self.consecutive_failures += 1
+        logger.warning(
+            f"Проверка шлюза не удалась ({self.consecutive_failures} подряд): {error}"
+        )
+        if (
+            not self.circuit_open
+            and self.consecutive_failures >= self.failure_threshold
+        ):
+            self.circuit_open = True
+            GATEWAY_CIRCUIT_OPEN.set(1)
+            logger.error("Шлюз ЕВМИАС недоступен: проверки не проходят")
+            await send_telegram_alert(
+                f"🚨 <b>[СМП ОМС] Шлюз ЕВМИАС не отвечает</b> 🚨\n\n"
+                f"<b>Проверок подряд:</b> {self.consecutive_failures}\n"
+                f"<b>Ошибка:</b> <i>{error}</i>"
+            )
+
+    def latency_ms(self) -> dict[str, float | None]:
+        latencies = sorted(self._latencies)
+
+        def percentile(p: float) -> float | None:
+            if not latencies:
+                return None
+            return round(
+                latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 1
+            )
+
+        return {
+            "p50": percentile(0.50),
+            "p95": percentile(0.95),
+            "p99": percentile(0.99),
+        }
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "status": (
+                "down"
+                if self.circuit_open
+                else ("unknown" if self.last_checked_at is None else "up")
+            ),
+            "circuit": "open" if self.circuit_open else "closed",
+            "consecutive_failures": self.consecutive_failures,
+            "latency_ms": self.latency_ms(),
+            "samples": len(self._latencies),
+            "last_checked_at": self.last_checked_at,
+            "last_ok_at": self.last_ok_at,
+            "last_error": self.last_error,
+            "response": self.last_response,
+        }
+
+    def readiness(self) -> tuple[bool, dict[str, Any]]:
+        """Готовность принимать запросы: шлюз проверен, цепь замкнута, очередь к шлюзу не переполнена."""
+        queued = gateway_scheduler.waiting if gateway_scheduler is not None else 0
+        checks = {
+            "gateway_checked": self.last_checked_at is not None,
+            "circuit_closed": not self.circuit_open,
+            "gateway_queue_ok": queued <= settings.HEALTH_READY_MAX_GATEWAY_QUEUE,
+        }
+        details = {
+            "checks": checks,
+            "circuit": "open" if self.circuit_open else "closed",
+            "gateway_queue": queued,
+            "gateway_slots_in_use": (
+                gateway_scheduler.in_use if gateway_scheduler is not None else None
+            ),
+        }
+        return all(checks.values()), details
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.probe()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:  # noqa: BLE001
+                logger.error(f"Ошибка фоновой проверки шлюза: {e}")
+            await asyncio.sleep(self.interval)
+
+
+async def start_gateway_prober(app: FastAPI) -> None:
+    """Запускает фоновую проверку шлюза, если она включена в настройках."""
+    if not settings.GATEWAY_PROBE_ENABLED:
+        return
+    prober = GatewayProber(
+        app.state.gateway_client,
+        endpoint=settings.GATEWAY_REQUEST_ENDPOINT,
+        interval=settings.GATEWAY_PROBE_INTERVAL,
+        timeout=settings.GATEWAY_PROBE_TIMEOUT,
+        failure_threshold=settings.GATEWAY_PROBE_FAILURE_THRESHOLD,
+    )
+    app.state.gateway_prober = prober
+    app.state.gateway_prober_task = asyncio.create_task(prober.run())
+    logger.info(
+        f"Фоновая проверка шлюза запущена: каждые {settings.GATEWAY_PROBE_INTERVAL} с"
+    )
+
+
+async def stop_gateway_prober(app: FastAPI) -> None:
+    task = getattr(app.state, "gateway_prober_task", None)
+    if task:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        logger.info("Фоновая проверка шлюза остановлена.")
@@ -0,0 +1,192 @@
+"""
+Кэш ответов шлюза ЕВМИАС для редко меняющихся данных (справочник организаций, движения
+случая, данные пациента) с устаревшими записями на время сбоев шлюза.
+
+Кэшируются только методы из GATEWAY_CACHE_METHODS (c.m=ttl). Ключ — метод и отпечаток data
+из тела запроса. По возрасту записи:
+
+- меньше ttl — запись свежая, шлюз не вызывается;
+- до ttl + GATEWAY_CACHE_STALE_WHILE_REVALIDATE — запись отдается сразу, а шлюз опрашивается
+  в фоне (не больше одного обновления на ключ одновременно);
+- до ttl + GATEWAY_CACHE_STALE_IF_ERROR — шлюз вызывается как обычно, но если он недоступен
+  (ошибка сети, 5xx, исчерпан бюджет времени), отдается сохраненный ответ вместо 503;
+- старше — запись не используется.
+
+Ответы, отданные вместо недоступного шлюза, отмечаются в stale_scope (метод -> возраст
+записи, сек): обогащение возвращает их в поле stale, чтобы расширение показало, что часть
+данных могла устареть. Короткое окно stale-while-revalidate — обычная работа кэша, его
+ответы не отмечаются.
+
+Записи хранятся сериализованными, поэтому вызывающий код может менять ответ, не портя кэш.
+Кэш живет в памяти процесса воркера.
+"""
+
+import asyncio
+import contextvars
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, NamedTuple
+
+import httpx
+
+from app.core import get_settings, json_codec
+from app.core.deadline import DeadlineExceeded
+from app.core.logger_setup import logger
+from app.core.metrics import GATEWAY_CACHE_LOOKUPS, GATEWAY_CACHE_STALE_SERVED
+from app.core.slow_calls import fingerprint
+
+settings = get_settings()
+
+_stale: ContextVar[dict[str, float] | None] = ContextVar(
+    "gateway_stale_responses", default=None
+)
+_revalidate: ContextVar[bool] = ContextVar("gateway_cache_revalidate", default=False)
+
+
+@contextmanager
+def stale_scope() -> Iterator[dict[str, float]]:
+    """Собирает методы, ответы которых в рамках блока взяты из кэша из-за недоступности шлюза."""
+    stale: dict[str, float] = {}
+    token = _stale.set(stale)
+    try:
+        yield stale
+    finally:
+        _stale.reset(token)
+
+
+@contextmanager
+def revalidate_scope(enabled: bool = True) -> Iterator[None]:
+    """Не отдавать записи без обращения к шлюзу (force_refresh); при сбое шлюза кэш все равно выручит."""
+    token = _revalidate.set(enabled)
+    try:
+        yield
+    finally:
+        _revalidate.reset(token)
+
+
+def _mark_stale(method: str, age: float) -> None:
+    stale = _stale.get()
+    if stale is not None:
+        stale[method] = max(stale.get(method, 0), round(age, 1))
+
+
+def _gateway_unavailable(error: BaseException) -> bool:
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500
+    return isinstance(error, (httpx.RequestError, DeadlineExceeded))
+
+
+class CachedResponse(NamedTuple):
+    stored_at: float
+    body: bytes
+
+
+class GatewayResponseCache:
+    def __init__(
+        self,
+        ttls: dict[str, float],
+        stale_while_revalidate: float,
+        stale_if_error: float,
+        maxsize: int = 5000,
+    ):
+        self.ttls = ttls
+        self.stale_while_revalidate = stale_while_revalidate
+        self.stale_if_error = stale_if_error
+        self.maxsize = maxsize
+        self._entries: OrderedDict[tuple[str, str], CachedResponse] = OrderedDict()
+        self._refreshing: dict[tuple[str, str], asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def cacheable(self, method: str) -> bool:
+        return method in self.ttls
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def _store(self, key: tuple[str, str], value: Any) -> None:
+        self._entries.pop(key, None)
+        self._entries[key] = CachedResponse(time.monotonic(), json_codec.dumps(value))
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    async def fetch(
+        self, method: str, payload: Any, load: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Ответ метода method на payload из кэша или через load() по правилам из описания модуля."""
+        key = (
+            method,
+            fingerprint(payload.get("data") if isinstance(payload, dict) else payload),
+        )
+        ttl = self.ttls[method]
+        entry = self._entries.get(key)
+        age = time.monotonic() - entry.stored_at if entry is not None else None
+        if entry is not None and age >= ttl + max(
+            self.stale_while_revalidate, self.stale_if_error
+        ):
+            del self._entries[key]
+            entry = None
+
+        if entry is not None and not _revalidate.get():
+            if age < ttl:
+                GATEWAY_CACHE_LOOKUPS.labels(method=method, result="hit").inc()
+                return json_codec.loads(entry.body)
+            if age < ttl + self.stale_while_revalidate:
+                GATEWAY_CACHE_LOOKUPS.labels(method=method, result="stale").inc()
+                GATEWAY_CACHE_STALE_SERVED.labels(
+                    method=method, reason="revalidate"
+                ).inc()
+                self._refresh_in_background(key, load)
+                return json_codec.loads(entry.body)
+
+        GATEWAY_CACHE_LOOKUPS.labels(method=method, result="miss").inc()
+        try:
+            value = await load()
+        except Exception as e:
+            if entry is None or not _gateway_unavailable(e):
+                raise
+            logger.warning(
+                f"Шлюз недоступен ({type(e).__name__}), {method} отдан из кэша возрастом {round(age)} с"
+            )
+            GATEWAY_CACHE_STALE_SERVED.labels(method=method, reason="error").inc()
+            _mark_stale(method, age)
+            return json_codec.loads(entry.body)
+        self._store(key, value)
+        return value
+
+    def _refresh_in_background(
+        self, key: tuple[str, str], load: Callable[[], Awaitable[Any]]
+    ) -> None:
+        if key in self._refreshing:
+            return
+
+        async def refresh() -> None:
+            try:
+                self._store(key, await load())
+            except Exception as e:  # noqa: BLE001
+                logger.warning(
+                    f"Фоновое обновление кэша шлюза {key[0]} не удалось: {type(e).__name__}: {e}"
+                )
+            finally:
+                self._refreshing.pop(key, None)
+
+        # Пустой контекст: обновление не наследует дедлайн, клиента и отметки запроса, который его начал
+        self._refreshing[key] = contextvars.Context().run(
+            asyncio.create_task, refresh()
+        )
+
+
+gateway_cache = (
+    GatewayResponseCache(
+        settings.gateway_cache_ttls,
+        stale_while_revalidate=settings.GATEWAY_CACHE_STALE_WHILE_REVALIDATE,
+        stale_if_error=settings.GATEWAY_CACHE_STALE_IF_ERROR,
+        maxsize=settings.GATEWAY_CACHE_MAX_ENTRIES,
+    )
+    if settings.GATEWAY_CACHE_ENABLED
+    else None
+)
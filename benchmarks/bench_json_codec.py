@@ -0,0 +1,69 @@
+"""
+Бенчмарк JSON-кодека на данных реального размера.
+
+Сравнивает стандартный путь (response.json() + jsonable_encoder/json.dumps, как делал
+FastAPI) с кодеком приложения (app.core.json_codec) для ответа Search.searchData и
+результата обогащения.
+
+Запуск (переменные окружения берутся из .env через make):
+    make bench
+или напрямую:
+    python -m benchmarks.bench_json_codec
+"""
+
+import json
+import time
+
+from fastapi.encoders import jsonable_encoder
+
+from app.core import json_codec
+from benchmarks.payloads import make_enrichment_result, make_search_response
+
+
+def _measure(func, repeat: int) -> float:
+    """Возвращает медианное время одного вызова в миллисекундах."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def _stdlib_response(obj) -> bytes:
+    # Так FastAPI/Starlette сериализовали ответ до появления кодека
+    return json.dumps(
+        jsonable_encoder(obj), ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def _run_case(name: str, payload: dict, repeat: int) -> None:
+    raw = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    rows = payload.get("data", [])
+    print(f"\n{name}: {len(raw) / 1024:.0f} КБ")
+    results = {
+        "decode stdlib": _measure(lambda: json.loads(raw), repeat),
+        "decode codec": _measure(lambda: json_codec.loads(raw), repeat),
+        "encode stdlib+jsonable_encoder": _measure(
+            lambda: _stdlib_response(rows or payload), repeat
+        ),
+        "encode codec": _measure(lambda: json_codec.dumps(rows or payload), repeat),
+    }
+    for label, ms in results.items():
+        print(f"  {label:<32} {ms:8.2f} ms")
+
+
+def run(repeat: int = 15) -> None:
+    print(f"Бэкенд кодека: {json_codec.BACKEND}")
+    cases = {
+        "searchData 500 строк": make_search_response(rows=500),
+        "searchData 3000 строк": make_search_response(rows=3000),
+        "enrich-data": make_enrichment_result(),
+    }
+    for name, payload in cases.items():
+        _run_case(name, payload, repeat)
+
+
+if __name__ == "__main__":
+    run()
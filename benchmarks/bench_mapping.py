@@ -0,0 +1,128 @@
+"""
+Бенчмарк этапа сопоставления записей ЕВМИАС с полями формы ГИС ОМС.
+
+Одна и та же работа — вычисление справочных полей формы по каждому случаю — в трех
+вариантах: как раньше (async-хелпер на каждое поле, без мемоизации), синхронно без
+мемоизации и синхронно по мемоизированным таблицам. Отдельно — полная сборка форм
+через map_cases.
+
+Запуск (переменные окружения берутся из .env через make):
+    make bench
+или напрямую:
+    python -m benchmarks.bench_mapping
+"""
+
+import asyncio
+import time
+
+from app.service.extension import mapping
+from app.service.extension.mapping import CaseRecords, map_cases
+from benchmarks.payloads import make_case_records
+
+
+def _measure(func, repeat: int) -> float:
+    """Возвращает медианное время одного вызова в миллисекундах."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def _uncached(resolver):
+    # lru_cache хранит исходную функцию в __wrapped__ — это и есть прежняя логика без таблиц
+    return getattr(resolver, "__wrapped__", resolver)
+
+
+def _resolve_fields(case: CaseRecords, cached: bool) -> tuple:
+    resolve = (lambda func: func) if cached else _uncached
+    name = resolve(mapping.resolve_department_name)(
+        case.started_data["LpuSection_Name"]
+    )
+    movement = case.movement_data
+    _, bed_profile_name = resolve(mapping.resolve_bed_profile)(
+        movement["LpuSectionBedProfile_Name"], movement["Diag_Code"], name
+    )
+    return (
+        resolve(mapping.resolve_department_code)(name),
+        resolve(mapping.resolve_medical_care_profile)(
+            movement["LpuSectionProfile_Name"], bed_profile_name
+        ),
+        resolve(mapping.resolve_direction_date)(case.started_data["EvnPS_setDate"]),
+        mapping.resolve_medical_care_condition(name),
+        mapping.resolve_medical_care_form(case.referred_data["PrehospType_id"]),
+        resolve(mapping.resolve_outcome_code)(case.disease_data["ResultDesease_id"]),
+        mapping.resolve_disease_type_code(case.disease_data["DeseaseType_id"]),
+    )
+
+
+async def _as_coroutine(func, *args):
+    return func(*args)
+
+
+async def _legacy_async(cases: list[CaseRecords]) -> None:
+    # Прежняя схема: каждое поле — отдельная корутина без мемоизации
+    for case in cases:
+        name = await _as_coroutine(
+            _uncached(mapping.resolve_department_name),
+            case.started_data["LpuSection_Name"],
+        )
+        await _as_coroutine(_uncached(mapping.resolve_department_code), name)
+        movement = case.movement_data
+        _, bed_profile_name = await _as_coroutine(
+            _uncached(mapping.resolve_bed_profile),
+            movement["LpuSectionBedProfile_Name"],
+            movement["Diag_Code"],
+            name,
+        )
+        await _as_coroutine(
+            _uncached(mapping.resolve_medical_care_profile),
+            movement["LpuSectionProfile_Name"],
+            bed_profile_name,
+        )
+        await _as_coroutine(
+            _uncached(mapping.resolve_direction_date),
+            case.started_data["EvnPS_setDate"],
+        )
+        await _as_coroutine(mapping.resolve_medical_care_condition, name)
+        await _as_coroutine(
+            mapping.resolve_medical_care_form, case.referred_data["PrehospType_id"]
+        )
+        await _as_coroutine(
+            _uncached(mapping.resolve_outcome_code),
+            case.disease_data["ResultDesease_id"],
+        )
+        await _as_coroutine(
+            mapping.resolve_disease_type_code, case.disease_data["DeseaseType_id"]
+        )
+
+
+def _run_size(size: int, repeat: int) -> None:
+    cases = [CaseRecords(**records) for records in make_case_records(size)]
+    map_cases(cases)  # прогреваем таблицы
+    print(f"\n{size} случаев:")
+    results = {
+        "поля: async, без таблиц": _measure(
+            lambda: asyncio.run(_legacy_async(cases)), repeat
+        ),
+        "поля: sync, без таблиц": _measure(
+            lambda: [_resolve_fields(case, cached=False) for case in cases], repeat
+        ),
+        "поля: sync, таблицы": _measure(
+            lambda: [_resolve_fields(case, cached=True) for case in cases], repeat
+        ),
+        "map_cases (полная форма)": _measure(lambda: map_cases(cases), repeat),
+    }
+    for label, ms in results.items():
+        print(f"  {label:<32} {ms:8.2f} ms")
+
+
+def run(repeat: int = 15) -> None:
+    for size in (50, 500, 5000):
+        _run_size(size, repeat)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,129 @@
+"""
+Бенчмарк выноса CPU-тяжелого разбора из цикла событий (app/core/offload.py).
+
+В одном цикле событий идут «тяжелые» запросы (ожидание шлюза + разбор большого входа) и
+«легкие» (только ожидание шлюза). Для каждого способа разбора — прямо в цикле событий, в пуле
+потоков, в пуле процессов — печатаются p50/p99 задержки легких запросов и пропускная
+способность тяжелых. Разбор в цикле событий задерживает легкие запросы на все время
+разбора; вынос в пул должен убрать этот хвост.
+
+Запуск (переменные окружения берутся из .env через make):
+    make bench
+или напрямую:
+    python -m benchmarks.bench_offload
+"""
+
+import asyncio
+import json
+import time
+
+from app.core import json_codec
+from app.core.offload import CpuOffloader
+from app.service.extension.request import parse_discharge_summary
+from benchmarks.payloads import make_discharge_template, make_search_response
+
+GATEWAY_DELAY = 0.005  # имитация ответа шлюза, сек
+
+
+def _percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def _run_case(
+    offloader: CpuOffloader,
+    func,
+    args: tuple,
+    size: int,
+    large_result: bool,
+    heavy: int,
+    light: int,
+    seconds: float,
+):
+    def parse():
+        return offloader.run("bench", func, *args, size=size, large_result=large_result)
+
+    # Прогрев: пул процессов запускает воркеры и импортирует модули при первых задачах
+    await asyncio.gather(*(parse() for _ in range(offloader.workers)))
+
+    latencies: list[float] = []
+    heavy_done = 0
+    stop_at = time.perf_counter() + seconds
+
+    async def heavy_client() -> None:
+        nonlocal heavy_done
+        while time.perf_counter() < stop_at:
+            await asyncio.sleep(GATEWAY_DELAY)
+            await parse()
+            heavy_done += 1
+
+    async def light_client() -> None:
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            await asyncio.sleep(GATEWAY_DELAY)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    await asyncio.gather(
+        *(heavy_client() for _ in range(heavy)), *(light_client() for _ in range(light))
+    )
+    return (
+        _percentile(latencies, 0.50),
+        _percentile(latencies, 0.99),
+        heavy_done / seconds,
+    )
+
+
+def run(
+    heavy: int = 4, light: int = 20, seconds: float = 3.0, workers: int = 2
+) -> None:
+    template, xml_data = make_discharge_template(size_kb=512)
+    search_raw = json.dumps(make_search_response(rows=3000), ensure_ascii=False).encode(
+        "utf-8"
+    )
+    cases = {
+        f"шаблон эпикриза {len(template.encode('utf-8')) // 1024} КБ": (
+            parse_discharge_summary,
+            (template, xml_data),
+            len(template),
+            False,
+        ),
+        f"searchData {len(search_raw) // 1024} КБ": (
+            json_codec.loads,
+            (search_raw,),
+            len(search_raw),
+            False,
+        ),
+        # Так разбирается JSON в приложении: при пуле процессов — все равно в потоке
+        f"searchData {len(search_raw) // 1024} КБ, large_result": (
+            json_codec.loads,
+            (search_raw,),
+            len(search_raw),
+            True,
+        ),
+    }
+    print(
+        f"Тяжелых клиентов: {heavy}, легких: {light}, ответ шлюза {GATEWAY_DELAY * 1000:.0f} мс, "
+        f"воркеров пула: {workers}"
+    )
+    for name, (func, args, size, large_result) in cases.items():
+        print(f"\n{name}")
+        for kind in ("off", "thread", "process"):
+            offloader = CpuOffloader(kind, workers=workers, min_bytes=0)
+            offloader.start()
+            try:
+                p50, p99, throughput = asyncio.run(
+                    _run_case(
+                        offloader, func, args, size, large_result, heavy, light, seconds
+                    )
+                )
+            finally:
+                offloader.shutdown()
+            label = "в цикле событий" if kind == "off" else f"пул {kind}"
+            print(
+                f"  {label:<16} легкие p50 {p50:7.1f} ms  p99 {p99:7.1f} ms   "
+                f"тяжелые {throughput:6.1f} /с"
+            )
+
+
+if __name__ == "__main__":
+    run()
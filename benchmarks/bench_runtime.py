@@ -0,0 +1,201 @@
+"""
+Нагрузочный бенчмарк профилей запуска gunicorn (app/gunicorn_conf.py).
+
+Поднимает мок шлюза (benchmarks/mock_gateway.py), затем по очереди запускает приложение
+под gunicorn с RUNTIME_PROFILE=default и RUNTIME_PROFILE=performance и гоняет по нему
+смесь запросов /extension/search и /extension/enrich-data. Кэши поиска и ответов шлюза и
+хранилище обогащения отключаются, чтобы каждый запрос действительно ходил в (мок) шлюз.
+
+Запуск (переменные окружения берутся из .env через make):
+    make bench-runtime
+или напрямую:
+    python -m benchmarks.bench_runtime --duration 20 --concurrency 64
+"""
+
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import httpx
+
+APP_PORT = 18080
+GATEWAY_PORT = 18081
+
+
+def _wait_for_port(url: str, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} не поднялся за {timeout} с")
+
+
+def _stop(process: subprocess.Popen) -> None:
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+async def _load(duration: float, concurrency: int) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    deadline = time.monotonic() + duration
+    search = {"last_name": "Иванов"}
+    enrich = {
+        "started_data": {
+            "EvnPS_id": "820000000000001",
+            "Person_id": "810000000000001",
+            "EvnPS_setDate": "03.03.2025",
+            "EvnPS_disDate": "13.03.2025",
+            "EvnPS_NumCard": "123 2025",
+            "Person_Birthday": "01.01.1970",
+            "LpuSection_Name": "Неврологическое отделение ММЦ",
+            "_division_internal_cid": "3010101000000467",
+        }
+    }
+
+    async def worker(client: httpx.AsyncClient, index: int) -> None:
+        nonlocal errors
+        # Каждый четвертый запрос — поиск, остальные — обогащение, как при работе с формой
+        use_search = index % 4 == 0
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                if use_search:
+                    response = await client.post("/extension/search", json=search)
+                else:
+                    response = await client.post("/extension/enrich-data", json=enrich)
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+            except httpx.HTTPError:
+                errors += 1
+
+    limits = httpx.Limits(
+        max_connections=concurrency, max_keepalive_connections=concurrency
+    )
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{APP_PORT}", limits=limits, timeout=30
+    ) as client:
+        started = time.monotonic()
+        await asyncio.gather(*(worker(client, i) for i in range(concurrency)))
+        elapsed = time.monotonic() - started
+
+    latencies.sort()
+
+    def percentile(p: float) -> float:
+        return (
+            latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+            if latencies
+            else 0
+        )
+
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50": percentile(0.50),
+        "p95": percentile(0.95),
+        "p99": percentile(0.99),
+        "errors": errors,
+    }
+
+
+def run_profile(profile: str, args: argparse.Namespace) -> dict:
+    env = {
+        **os.environ,
+        "RUNTIME_PROFILE": profile,
+        "BIND": f"127.0.0.1:{APP_PORT}",
+        "GATEWAY_URL": f"http://127.0.0.1:{GATEWAY_PORT}",
+        "GATEWAY_REQUEST_ENDPOINT": "/gateway",
+        "SEARCH_CACHE_ENABLED": "false",
+        "SEARCH_INDEX_ENABLED": "false",
+        "ENRICH_STORE_ENABLED": "false",
+        "GATEWAY_CACHE_ENABLED": "false",
+        # Нагрузку дает один клиент, лимит на клиента его бы отсекал
+        "CLIENT_RATE_LIMIT_ENABLED": "false",
+        # Сравниваются профили под полной нагрузкой, а не сброс лишних запросов (503)
+        "ADMISSION_ENABLED": "false",
+        "LOGS_LEVEL": "WARNING",
+    }
+    if args.workers:
+        env["WEB_CONCURRENCY"] = str(args.workers)
+    if args.batch:
+        env["GATEWAY_BATCH_ENABLED"] = "true"
+
+    app = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            "-c",
+            "app/gunicorn_conf.py",
+            "app.main:app",
+        ],
+        env=env,
+    )
+    try:
+        _wait_for_port(f"http://127.0.0.1:{APP_PORT}/metrics")
+        asyncio.run(_load(min(3.0, args.duration), args.concurrency))  # прогрев
+        return asyncio.run(_load(args.duration, args.concurrency))
+    finally:
+        _stop(app)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Сравнение профилей запуска gunicorn")
+    parser.add_argument("--duration", type=float, default=20, help="секунд на профиль")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="одинаковое число воркеров для обоих профилей",
+    )
+    parser.add_argument(
+        "--latency-ms", type=float, default=20, help="задержка мок шлюза"
+    )
+    parser.add_argument(
+        "--batch", action="store_true", help="включить пакетирование вызовов шлюза"
+    )
+    args = parser.parse_args()
+
+    gateway = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.mock_gateway",
+            "--port",
+            str(GATEWAY_PORT),
+            "--latency-ms",
+            str(args.latency_ms),
+        ]
+    )
+    try:
+        _wait_for_port(f"http://127.0.0.1:{GATEWAY_PORT}/")
+        results = {
+            profile: run_profile(profile, args)
+            for profile in ("default", "performance")
+        }
+    finally:
+        _stop(gateway)
+
+    print(
+        f"\nконкурентность {args.concurrency}, задержка шлюза {args.latency_ms} мс, "
+        f"пакетирование {'вкл' if args.batch else 'выкл'}"
+    )
+    for profile, result in results.items():
+        print(
+            f"  {profile:<12} {result['rps']:8.1f} rps  p50 {result['p50']:7.1f} ms  "
+            f"p95 {result['p95']:7.1f} ms  p99 {result['p99']:7.1f} ms  ошибок {result['errors']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Мок шлюза ЕВМИАС для нагрузочных бенчмарков.
+
+Принимает тот же конверт, что и настоящий шлюз ({"params": {"c", "m"}, "data"}),
+отвечает синтетическими данными реального размера с искусственной задержкой,
+имитирующей сетевой поход в ЕВМИАС. Поддерживает и пакетный конверт
+({"batch": [...]} -> {"results": [{"status_code", "json"}, ...]}), который можно
+выключить флагом --no-batch, чтобы проверить откат на вызовы по одному.
+
+Запуск:
+    python -m benchmarks.mock_gateway --port 18081 --latency-ms 20 --search-rows 300
+"""
+
+import argparse
+import asyncio
+import random
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+
+from app.core import json_codec
+from benchmarks.payloads import make_search_row
+
+ENDPOINT = "/gateway"
+
+
+class MockGateway:
+    def __init__(
+        self,
+        latency_ms: float = 20,
+        search_rows: int = 300,
+        batch_enabled: bool = True,
+        seed: int = 42,
+    ):
+        self.latency = latency_ms / 1000
+        self.batch_enabled = batch_enabled
+        rng = random.Random(seed)
+        self._search_rows = [
+            make_search_row(rng, index) for index in range(search_rows)
+        ]
+
+    def handle(self, payload: dict):
+        """Ответ на один вызов метода ЕВМИАС (c.m)."""
+        params = payload.get("params", {})
+        method = (params.get("c"), params.get("m"))
+        data = payload.get("data") or {}
+
+        if method == ("Search", "searchData"):
+            surname = str(data.get("Person_Surname") or "").upper()
+            return {
+                "data": [
+                    row
+                    for row in self._search_rows
+                    if row["Person_Surname"].startswith(surname)
+                ]
+            }
+        if method == ("Common", "loadPersonData"):
+            return [{"Person_EdNum": "5196820871000123", "Sex_Name": "Мужской"}]
+        if method == ("EvnSection", "loadEvnSectionGrid"):
+            return [
+                {
+                    "EvnSection_id": "55",
+                    "Person_id": "1",
+                    "Diag_Code": "I63.5",
+                    "LpuSectionBedProfile_Name": "неврологические",
+                    "LpuSectionProfile_Name": "неврологии",
+                    "LeaveType_Code": "101",
+                }
+            ]
+        if method == ("EvnPS", "loadEvnPSEditForm"):
+            return [
+                {
+                    "PrehospDirect_id": "1",
+                    "PrehospType_id": "2",
+                    "ChildEvnSection_id": "55",
+                }
+            ]
+        if method == ("EvnUsluga", "loadEvnUslugaGrid"):
+            return [
+                {
+                    "EvnClass_SysNick": "EvnUslugaOper",
+                    "Usluga_Code": "A16.23.034.001",
+                    "Usluga_Name": "Операция " * 6,
+                }
+            ]
+        if method == ("EvnXml6E", "loadStacEvnXmlList"):
+            return [
+                {
+                    "XmlType_Name": "Эпикриз",
+                    "XmlTypeKind_Name": "Выписной",
+                    "EvnXml_pid": "1",
+                    "EMDRegistry_ObjectID": "2",
+                }
+            ]
+        if method == ("XmlTemplate6E", "getXmlTemplateForEvnXml"):
+            return {
+                "xmlData": {"diagnos": "Хроническая ишемия головного мозга " * 20},
+                "template": "Диагноз основной: <b>I63.5</b> @#@diagnos@#@",
+            }
+        if method == ("EvnDiag", "loadEvnDiagPSGrid"):
+            return [{"Diag_Code": "E11.9", "Diag_Name": "Сахарный диабет 2 типа"}]
+        if method == ("EvnSection", "loadEvnSectionEditForm"):
+            return {
+                "fieldsData": [
+                    {"ResultDesease_id": "3010101000000035", "DeseaseType_id": "2"}
+                ]
+            }
+        return {}
+
+    async def endpoint(self, request: Request) -> Response:
+        payload = json_codec.loads(await request.body())
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if isinstance(payload, dict) and "batch" in payload:
+            if not self.batch_enabled:
+                return Response(status_code=400)
+            results = [
+                {"status_code": 200, "json": self.handle(call)}
+                for call in payload["batch"]
+            ]
+            return Response(
+                json_codec.dumps({"results": results}), media_type="application/json"
+            )
+
+        return Response(
+            json_codec.dumps(self.handle(payload)), media_type="application/json"
+        )
+
+
+def create_app(
+    latency_ms: float = 20, search_rows: int = 300, batch_enabled: bool = True
+) -> Starlette:
+    gateway = MockGateway(
+        latency_ms=latency_ms, search_rows=search_rows, batch_enabled=batch_enabled
+    )
+    return Starlette(routes=[Route(ENDPOINT, gateway.endpoint, methods=["POST"])])
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Мок шлюза ЕВМИАС")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18081)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--search-rows", type=int, default=300)
+    parser.add_argument(
+        "--no-batch", action="store_true", help="отвечать 400 на пакетный конверт"
+    )
+    args = parser.parse_args()
+
+    uvicorn.run(
+        create_app(args.latency_ms, args.search_rows, batch_enabled=not args.no_batch),
+        host=args.host,
+        port=args.port,
+        log_level="warning",
+    )
+
+
+if __name__ == "__main__":
+    main()
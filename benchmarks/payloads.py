@@ -0,0 +1,227 @@
+"""
+Генераторы синтетических данных "реального" размера для бенчмарков.
+
+Структура строк повторяет ответ Search.searchData (EvnPS) и ответ /extension/enrich-data:
+набор колонок и длины значений подобраны по живым ответам ЕВМИАС.
+"""
+
+import random
+
+# Колонки, которые реально приходят в строке Search.searchData для EvnPS
+SEARCH_ROW_COLUMNS = [
+    "EvnPS_id",
+    "Person_id",
+    "PersonEvn_id",
+    "Server_id",
+    "EvnPS_NumCard",
+    "Person_Surname",
+    "Person_Firname",
+    "Person_Secname",
+    "Person_Birthday",
+    "Person_deadDT",
+    "EvnPS_setDate",
+    "EvnPS_disDate",
+    "LpuSection_Name",
+    "LpuSectionProfile_Name",
+    "LpuSectionBedProfile_Name",
+    "Diag_Code",
+    "Diag_Name",
+    "LeaveType_Name",
+    "LeaveType_Code",
+    "PayType_Name",
+    "PrehospType_Name",
+    "PrehospDirect_Name",
+    "EvnPS_KoikoDni",
+    "MedPersonal_Fio",
+    "Lpu_Nick",
+    "LpuBuilding_Name",
+    "LpuUnit_Name",
+    "EvnPS_IsTransit",
+    "EvnPS_IsSigned",
+    "EvnSection_id",
+    "EvnSection_setDate",
+    "EvnSection_disDate",
+    "Polis_Ser",
+    "Polis_Num",
+    "Person_EdNum",
+    "OrgSmo_Name",
+    "Sex_Name",
+    "Address_Address",
+    "KLRgn_Name",
+    "EvnPS_HospCount",
+    "EvnPS_TimeDesease",
+    "EvnPS_CodeConv",
+    "EvnPS_NumConv",
+    "EvnDirection_Num",
+    "EvnDirection_setDate",
+    "Org_did",
+    "Org_Name",
+    "EvnPS_IsCont",
+    "EvnPS_IsWithoutDirection",
+    "EvnPS_IsImperHosp",
+    "EvnPS_IsShortVolume",
+    "EvnPS_IsWrongCure",
+    "EvnPS_IsDiagMismatch",
+    "Mes_Code",
+    "Mes_Name",
+    "MesTariff_Value",
+    "Ksg_Code",
+    "Ksg_Name",
+    "EvnPS_insDT",
+    "EvnPS_updDT",
+    "pmUser_Name",
+    "accessType",
+    "Lpu_id",
+    "LpuSection_id",
+    "MedStaffFact_id",
+    "EvnPS_IsPaid",
+    "Registry_Num",
+    "EvnPS_IsFinish",
+    "EvnPS_IsArchive",
+    "EvnPS_Comment",
+]
+
+_SURNAMES = ["ИВАНОВ", "ПЕТРОВА", "СМИРНОВ", "КУЗНЕЦОВА", "ПОПОВ", "ВАСИЛЬЕВА"]
+_SECTIONS = [
+    "Неврологическое отделение ММЦ",
+    "Хирургическое отделение №1 стационар ММЦ",
+    "ДС при поликлинике",
+    "Кардиологическое отделение ММЦ",
+]
+
+
+def _date(rng: random.Random, year: int = 2025) -> str:
+    return f"{rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.{year}"
+
+
+def make_search_row(rng: random.Random, index: int) -> dict:
+    row = {name: f"{name[:6]}-{rng.randint(0, 10 ** 9)}" for name in SEARCH_ROW_COLUMNS}
+    row.update(
+        {
+            "EvnPS_id": str(820000000000000 + index),
+            "Person_id": str(810000000000000 + rng.randint(0, 10**6)),
+            "EvnPS_NumCard": f"{rng.randint(1, 9999)} {rng.randint(2023, 2025)}",
+            "Person_Surname": rng.choice(_SURNAMES),
+            "Person_Firname": "ИВАН",
+            "Person_Secname": "ИВАНОВИЧ",
+            "Person_Birthday": _date(rng, rng.randint(1930, 2010)),
+            "EvnPS_setDate": _date(rng),
+            "EvnPS_disDate": _date(rng),
+            "LpuSection_Name": rng.choice(_SECTIONS),
+            "Diag_Name": "Хроническая ишемия головного мозга с выраженными нарушениями",
+            "Address_Address": "РОССИЯ, МУРМАНСКАЯ ОБЛ, Г МУРМАНСК, УЛ ПАВЛИКА МОРОЗОВА, Д. 6",
+        }
+    )
+    return row
+
+
+def make_search_response(rows: int = 2000, seed: int = 42) -> dict:
+    """Ответ Search.searchData для распространенной фамилии за весь период поиска."""
+    rng = random.Random(seed)
+    return {"data": [make_search_row(rng, i) for i in range(rows)]}
+
+
+def make_enrichment_result(services: int = 40, seed: int = 42) -> dict:
+    """Итог /extension/enrich-data: карта полей формы + эпикриз и списки услуг/диагнозов."""
+    rng = random.Random(seed)
+    fields = {
+        f"input[name='Field{i}']": f"value-{rng.randint(0, 10 ** 6)}" for i in range(25)
+    }
+    fields["medical_service_data"] = [
+        {
+            "code": f"A16.{rng.randint(10, 99)}.{rng.randint(100, 999)}",
+            "name": "Операция " * 6,
+        }
+        for _ in range(services)
+    ]
+    fields["additional_diagnosis_data"] = [
+        {"code": "E11.9", "name": "Сахарный диабет 2 типа без осложнений"}
+    ]
+    fields["discharge_summary"] = {
+        f"item_{i}": "Текст выписного эпикриза. " * rng.randint(20, 120)
+        for i in range(10)
+    }
+    return fields
+
+
+_BED_PROFILES = [
+    "неврологические",
+    "хирургические",
+    "кардиологические",
+    "дерматологические",
+]
+_CARE_PROFILES = ["неврологии", "хирургии", "кардиологии"]
+_DIAGNOSES = ["I63.5", "M16.1", "K60.1", "J34.2", "G45.0"]
+
+
+def make_case_records(cases: int = 500, seed: int = 42) -> list[dict]:
+    """Сырые записи шлюза по случаям — вход этапа сопоставления (поля CaseRecords)."""
+    rng = random.Random(seed)
+    records = []
+    for index in range(cases):
+        started_data = make_search_row(rng, index)
+        started_data["_division_internal_cid"] = rng.choice(
+            ["3010101000000467", "3010101000000471"]
+        )
+        records.append(
+            {
+                "started_data": started_data,
+                "person_data": {
+                    "Person_EdNum": str(rng.randint(10**15, 10**16)),
+                    "Sex_Name": "Мужской",
+                },
+                "movement_data": {
+                    "Diag_Code": rng.choice(_DIAGNOSES),
+                    "LpuSectionBedProfile_Name": rng.choice(_BED_PROFILES),
+                    "LpuSectionProfile_Name": rng.choice(_CARE_PROFILES),
+                    "LeaveType_Code": "101",
+                },
+                "referred_data": {
+                    "PrehospType_id": rng.choice(["1", "2"]),
+                    "PrehospDirect_id": "1",
+                },
+                "disease_data": {
+                    "ResultDesease_id": "3010101000000035",
+                    "DeseaseType_id": "2",
+                },
+                "medical_service_data": [],
+                "discharge_summary": {"pure": {"item_145": "Операция"}},
+                "additional_diagnosis": [],
+            }
+        )
+    return records
+
+
+def make_discharge_template(size_kb: int = 512, seed: int = 42) -> tuple[str, dict]:
+    """Шаблон выписного эпикриза (HTML с маркерами @#@...@#@) и xmlData к нему."""
+    rng = random.Random(seed)
+
+    def paragraphs(kb: int) -> str:
+        parts, size = [], 0
+        while size < kb * 1024:
+            part = (
+                f'<p style="margin:0"><span style="font-size:{rng.randint(10, 14)}pt">'
+                f"{'Текст эпикриза без особенностей. ' * rng.randint(3, 12)}</span></p>\n"
+            )
+            parts.append(part)
+            size += len(part.encode("utf-8"))
+        return "".join(parts)
+
+    template = (
+        paragraphs(size_kb // 4)
+        + "<b>Диагноз основной:</b> @#@ДиагнозОсновной@#@ <i>(по МКБ-10)</i>\n"
+        + "<b>Осложнения основного заболевания:</b> @#@ТекстОсложнений@#@ "
+        + paragraphs(size_kb // 4)
+        + "<b>Сопутствующие заболевания:</b> @#@Сопутствующие@#@ "
+        + paragraphs(size_kb // 8)
+        + "<b>Состояние при поступлении:</b> "
+        + paragraphs(size_kb - size_kb // 4 * 2 - size_kb // 8)
+    )
+    xml_data = {
+        "ДиагнозОсновной": "I63.5 Инфаркт мозга",
+        "ТекстОсложнений": "Отек головного мозга",
+        "Сопутствующие": "Сахарный диабет 2 типа",
+        "diagnos": "Инфаркт мозга. Сахарный диабет 2 типа",
+        "specMarker_145": "Операция не проводилась",
+    }
+    return template, xml_data
@@ -41,6 +41,41 @@ async function handleApiResponse(response, operationName = "API") {
     }
 }
 
+/**
+ * POST-запрос с поддержкой ETag.
+ * Последний ответ на такой же запрос хранится в chrome.storage.session вместе с его ETag.
+ * Сервер отвечает 304 Not Modified, если данные не изменились, — тогда берем сохраненную копию.
+ * @param {string} url - Адрес эндпоинта.
+ * @param {object} payload - Тело запроса.
+ * @param {string} operationName - Название операции для логов и сообщений об ошибках.
+ * @returns {Promise<any>} - Promise с данными JSON.
+ */
+async function postWithEtag(url, payload, operationName) {
+    const body = JSON.stringify(payload);
+    const cacheKey = `etag:${url}:${body}`;
+    const stored = (await chrome.storage.session.get(cacheKey))[cacheKey];
+
+    const headers = { "Content-Type": "application/json" };
+    if (stored) {
+        headers["If-None-Match"] = stored.etag;
+    }
+
+    const response = await fetch(url, { method: "POST", headers, body });
+    if (response.status === 304 && stored) {
+        console.log(`[API] ${operationName}: данные не изменились (304), используем сохраненную копию`);
+        return stored.data;
+    }
+
+    const data = await handleApiResponse(response, operationName);
+    const etag = response.headers.get("ETag");
+    if (etag) {
+        await chrome.storage.session.set({ [cacheKey]: { etag, data } }).catch((e) =>
+            console.warn(`[API] Не удалось сохранить ответ ${operationName} для ETag:`, e)
+        );
+    }
+    return data;
+}
+
 /**
  * Запрашивает список пациентов с сервера.
  * @param {object} searchPayload - Объект с параметрами поиска.
@@ -48,12 +83,7 @@ async function handleApiResponse(response, operationName = "API") {
  */
 export async function fetchSearchResults(searchPayload) {
     console.log("[API] Запрос на поиск пациентов:", searchPayload);
-    const response = await fetch(API_SEARCH_URL, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify(searchPayload),
-    });
-    return handleApiResponse(response, "поиска пациентов");
+    return postWithEtag(API_SEARCH_URL, searchPayload, "поиска пациентов");
 }
 
 /**
@@ -63,10 +93,5 @@ export async function fetchSearchResults(searchPayload) {
  */
 export async function fetchEnrichedDataForPatient(enrichmentPayload) {
     console.log("[API] Запрос на обогащение данных:", enrichmentPayload);
-    const response = await fetch(API_ENRICH_URL, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify(enrichmentPayload),
-    });
-    return handleApiResponse(response, "обогащения данных");
+    return postWithEtag(API_ENRICH_URL, enrichmentPayload, "обогащения данных");
 }
\ No newline at end of file
@@ -0,0 +1,30 @@
+"""
+Настройки для тестов: обязательные переменные окружения без .env.
+
+Значения подставляются, только если не заданы снаружи, до импорта app.
+"""
+
+import os
+
+_TEST_ENV = {
+    "GATEWAY_URL": "http://gateway.test",
+    "GATEWAY_API_KEY": "test-key",
+    "GATEWAY_REQUEST_ENDPOINT": "/api",
+    "MO_REGISTRY_NUMBER": "1",
+    "LPU_ID": "1",
+    "KSG_YEAR": "2025",
+    "SEARCH_PERIOD_START_DATE": "01.01.2025",
+    "SEARCH_PAY_TYPE_ID": "1",
+    "SEARCH_LPU_DIVISION_CIDS": "1",
+    "EKO_DIVISION_ID": "2",
+    "EKO_DEPARTMENT_ID": "3",
+    "MEDICAL_CARE_TYPE_CODE": "31",
+    "DEBUG_MODE": "false",
+    "DEBUG_HTTP": "false",
+    "LOGS_LEVEL": "WARNING",
+    "ENRICH_STORE_ENABLED": "false",
+    "ENRICH_JOBS_ENABLED": "false",
+}
+
+for name, value in _TEST_ENV.items():
+    os.environ.setdefault(name, value)
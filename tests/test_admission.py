@@ -0,0 +1,68 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.core.admission import AdmissionGate, AdmissionMiddleware, route_class
+
+
+@pytest.mark.parametrize(
+    "path, expected",
+    [
+        ("/extension/search", "search"),
+        ("/extension/enrich-data", "enrich"),
+        ("/extension/enrich-data/stream", "enrich"),
+        ("/extension/enrich-jobs", "jobs"),
+        ("/extension/enrich-jobs/0123abcd", "jobs"),
+        ("/health/ping", "health"),
+        ("/metrics", None),
+        ("/extension/searchx", None),
+    ],
+)
+def test_route_class(path, expected):
+    assert route_class(path) == expected
+
+
+async def _slow_app(scope, receive, send):
+    await asyncio.sleep(0.2)
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def test_excess_requests_are_shed_with_retry_after():
+    middleware = AdmissionMiddleware(_slow_app)
+    middleware.gates["enrich"] = AdmissionGate(
+        "enrich", limit=1, queue_size=1, max_wait=1.0
+    )
+
+    async def run():
+        transport = httpx.ASGITransport(app=middleware)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as client:
+            enrich = [client.post("/extension/enrich-data") for _ in range(3)]
+            # Задания — свой класс: занятые слоты обогащения их не задерживают
+            responses = await asyncio.gather(
+                *enrich, client.get("/extension/enrich-jobs/1")
+            )
+        return responses
+
+    responses = asyncio.run(run())
+    assert sorted(r.status_code for r in responses[:3]) == [200, 200, 503]
+    shed = next(r for r in responses[:3] if r.status_code == 503)
+    assert shed.headers["Retry-After"]
+    assert responses[3].status_code == 200
+    assert middleware.gates["enrich"].in_use == 0
+
+
+def test_request_waiting_past_threshold_is_dropped():
+    gate = AdmissionGate("search", limit=1, queue_size=5, max_wait=0.05)
+
+    async def run():
+        assert await gate.acquire() is None
+        reason = await gate.acquire()
+        gate.release()
+        return reason
+
+    assert asyncio.run(run()) == "timeout"
+    assert gate.in_use == 0 and gate.waiting == 0
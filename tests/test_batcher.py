@@ -0,0 +1,159 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.service.gateway.batcher import GatewayBatcher, batch_lane
+
+
+class _Gateway:
+    """
+    Заглушка шлюза: отвечает на вызов его номером (data.n) и запоминает запросы.
+    batch_status — статус ответа на пакетный конверт; call_status — статусы отдельных
+    вызовов внутри пакета по номеру.
+    """
+
+    def __init__(
+        self, batch_status: int = 200, call_status: dict[int, int] | None = None
+    ):
+        self.batch_status = batch_status
+        self.call_status = call_status or {}
+        self.requests: list[dict] = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        self.requests.append(body)
+        if "batch" not in body:
+            return httpx.Response(200, json={"n": body["data"]["n"]})
+        if self.batch_status != 200:
+            return httpx.Response(self.batch_status, json={"error": "unknown method"})
+        return httpx.Response(
+            200,
+            json={
+                "results": [
+                    {
+                        "status_code": self.call_status.get(call["data"]["n"], 200),
+                        "json": {"n": call["data"]["n"]},
+                    }
+                    for call in body["batch"]
+                ]
+            },
+        )
+
+    @property
+    def batches(self) -> list[list[int]]:
+        return [
+            [call["data"]["n"] for call in body["batch"]]
+            for body in self.requests
+            if "batch" in body
+        ]
+
+    @property
+    def single_calls(self) -> list[int]:
+        return [body["data"]["n"] for body in self.requests if "batch" not in body]
+
+
+def _batcher(gateway: _Gateway, **kwargs) -> GatewayBatcher:
+    client = httpx.AsyncClient(
+        transport=httpx.MockTransport(gateway), base_url="http://gateway.test"
+    )
+    return GatewayBatcher(client, endpoint="/api", **kwargs)
+
+
+def _payload(n: int) -> dict:
+    return {"params": {"c": "Test", "m": "call"}, "data": {"n": n}}
+
+
+async def _submit_all(batcher: GatewayBatcher, numbers, lane: str = "main") -> list:
+    async def submit(n: int):
+        batch_lane.set(lane)
+        return await batcher.submit(_payload(n))
+
+    return await asyncio.gather(*(submit(n) for n in numbers), return_exceptions=True)
+
+
+def test_calls_within_window_share_one_batch_in_order():
+    gateway = _Gateway()
+    batcher = _batcher(gateway, window=0.05)
+    results = asyncio.run(_submit_all(batcher, range(5)))
+    assert results == [{"n": n} for n in range(5)]
+    assert gateway.batches == [[0, 1, 2, 3, 4]]
+    assert batcher.supported is True
+
+
+def test_flush_timer_sends_partial_batch():
+    gateway = _Gateway()
+    batcher = _batcher(gateway, window=0.01, max_size=16)
+
+    async def run():
+        first = await _submit_all(batcher, [1, 2])
+        second = await _submit_all(batcher, [3])
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == [{"n": 1}, {"n": 2}]
+    assert second == [{"n": 3}]
+    # Неполный пакет уходит по таймеру окна; одиночный вызов идет без конверта
+    assert gateway.batches == [[1, 2]]
+    assert gateway.single_calls == [3]
+
+
+def test_size_threshold_flushes_before_window():
+    gateway = _Gateway()
+    # Окно заведомо дольше теста: пакеты уходят только по размеру
+    batcher = _batcher(gateway, window=60, max_size=3)
+
+    async def run():
+        return await asyncio.wait_for(_submit_all(batcher, range(6)), 1)
+
+    assert asyncio.run(run()) == [{"n": n} for n in range(6)]
+    assert gateway.batches == [[0, 1, 2], [3, 4, 5]]
+
+
+@pytest.mark.parametrize("status", [404, 501])
+def test_unsupported_batch_falls_back_to_single_calls(status):
+    gateway = _Gateway(batch_status=status)
+    batcher = _batcher(gateway, window=0.01)
+
+    async def run():
+        first = await _submit_all(batcher, [1, 2])
+        # Поддержка запомнена: следующий пакет сразу уходит по одному
+        second = await _submit_all(batcher, [3, 4])
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == [{"n": 1}, {"n": 2}]
+    assert second == [{"n": 3}, {"n": 4}]
+    assert batcher.supported is False
+    assert gateway.batches == [[1, 2]]
+    assert sorted(gateway.single_calls) == [1, 2, 3, 4]
+
+
+def test_server_error_inside_batch_is_retried_alone():
+    gateway = _Gateway(call_status={2: 502, 3: 404})
+    batcher = _batcher(gateway, window=0.01)
+    results = asyncio.run(_submit_all(batcher, [1, 2, 3]))
+
+    assert results[0] == {"n": 1}
+    assert results[1] == {"n": 2}
+    assert isinstance(results[2], httpx.HTTPStatusError)
+    assert results[2].response.status_code == 404
+    # 5xx повторяется отдельным вызовом, 4xx отдается вызывающему как есть
+    assert gateway.single_calls == [2]
+
+
+def test_lanes_are_batched_separately():
+    gateway = _Gateway()
+    batcher = _batcher(gateway, window=0.02)
+
+    async def run():
+        return await asyncio.gather(
+            _submit_all(batcher, [1, 2], lane="main"),
+            _submit_all(batcher, [3, 4], lane="optional"),
+        )
+
+    main, optional = asyncio.run(run())
+    assert main == [{"n": 1}, {"n": 2}]
+    assert optional == [{"n": 3}, {"n": 4}]
+    assert sorted(gateway.batches) == [[1, 2], [3, 4]]
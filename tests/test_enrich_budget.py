@@ -0,0 +1,73 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from app.core.deadline import DeadlineExceeded
+from app.core.decorators import route_handler
+from app.model import EnrichmentRequestData
+from app.service.extension.enrich import enrich_data
+from app.service.gateway.gateway_service import GatewayService
+
+PERSON = "Common.loadPersonData"
+OPERATIONS = "EvnUsluga.loadEvnUslugaGrid"
+
+
+def _service(slow: set[str], delay: float = 1.0) -> GatewayService:
+    """Шлюз, который отвечает пустыми записями, а на методы из slow — не раньше delay."""
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        params = json.loads(request.content)["params"]
+        if f"{params['c']}.{params['m']}" in slow:
+            await asyncio.sleep(delay)
+        return httpx.Response(200, json=[])
+
+    client = httpx.AsyncClient(
+        transport=httpx.MockTransport(handler), base_url="http://gateway.test"
+    )
+    return GatewayService(client=client)
+
+
+def _enrich(service: GatewayService, event_id: str) -> dict:
+    request = EnrichmentRequestData(
+        started_data={
+            "Person_id": event_id,
+            "EvnPS_id": event_id,
+            "Person_Birthday": "01.01.1970",
+        },
+        deadline_ms=300,
+    )
+    return asyncio.run(enrich_data(request, service))
+
+
+def test_slow_section_is_marked_partial():
+    result = _enrich(_service({OPERATIONS}), "budget-1")
+    assert result["partial"] == ["operations"]
+    assert result["medical_service_data"] == []
+    assert result["input[name='DateBirth']"] == "01.01.1970"
+
+
+def test_slow_core_part_is_marked_partial():
+    # Основная часть тоже может не успеть: форма отдается, поля части пустые. Загрузка
+    # заболевания идет после первого шага цепочки, и бюджета на нее уже не остается
+    result = _enrich(_service({PERSON}), "budget-2")
+    assert result["partial"] == ["disease", "person"]
+    assert result["input[name='Enp']"] == ""
+    assert result["input[name='DateBirth']"] == "01.01.1970"
+
+
+def test_complete_enrichment_has_no_partial_marker():
+    result = _enrich(_service(set()), "budget-3")
+    assert "partial" not in result
+
+
+def test_route_handler_turns_deadline_into_gateway_timeout():
+    @route_handler(debug=False)
+    async def route():
+        raise DeadlineExceeded("Бюджет времени запроса исчерпан")
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(route())
+    assert error.value.status_code == 504
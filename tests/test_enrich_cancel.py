@@ -0,0 +1,65 @@
+import asyncio
+import json
+
+import httpx
+
+from app.core.fairness import gateway_scheduler
+from app.model import EnrichmentRequestData
+from app.service.extension.enrich import enrich_data_events
+from app.service.gateway.gateway_service import GatewayService
+
+
+class _SlowGateway:
+    """Шлюз, который отвечает не сразу и считает начатые и незавершенные вызовы."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.started = 0
+        self.in_flight = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.started += 1
+        self.in_flight += 1
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        body = json.loads(request.content)
+        if isinstance(body, dict) and "batch" in body:
+            return httpx.Response(
+                200,
+                json={
+                    "results": [{"status_code": 200, "json": []} for _ in body["batch"]]
+                },
+            )
+        return httpx.Response(200, json=[])
+
+
+def test_cancelled_stream_stops_gateway_calls():
+    gateway = _SlowGateway(delay=0.3)
+    client = httpx.AsyncClient(
+        transport=httpx.MockTransport(gateway), base_url="http://gateway.test"
+    )
+    service = GatewayService(client=client)
+    request = EnrichmentRequestData(started_data={"Person_id": "1", "EvnPS_id": "2"})
+
+    async def consume():
+        async for _ in enrich_data_events(request, service):
+            pass
+
+    async def run():
+        consumer = asyncio.create_task(consume())
+        await asyncio.sleep(0.1)
+        assert gateway.in_flight > 0
+        # Клиент отключился: потребитель потока отменяется
+        consumer.cancel()
+        await asyncio.gather(consumer, return_exceptions=True)
+        # Задачи разделов сняты вместе с потоком, а не дожидаются ответов шлюза
+        assert gateway.in_flight == 0
+        started = gateway.started
+        await asyncio.sleep(0.5)
+        return started
+
+    started = asyncio.run(run())
+    assert gateway.started == started
+    assert gateway_scheduler.in_use == 0
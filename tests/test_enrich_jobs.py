@@ -0,0 +1,144 @@
+import asyncio
+import sqlite3
+import time
+
+from fastapi import FastAPI
+
+from app.service.extension.jobs import (
+    DONE,
+    FAILED,
+    QUEUED,
+    RUNNING,
+    EnrichmentJobQueue,
+    EnrichmentJobWorkers,
+)
+
+REQUEST = {"started_data": {"Person_id": "1", "EvnPS_id": "2"}}
+
+
+def _queue(tmp_path, **kwargs) -> EnrichmentJobQueue:
+    options = {"result_ttl": 60, "lease_seconds": 60, "max_attempts": 3, **kwargs}
+    return EnrichmentJobQueue(str(tmp_path / "jobs.sqlite3"), **options)
+
+
+def _status(queue: EnrichmentJobQueue, job_id: str) -> str:
+    with queue._connection(write=False) as connection:
+        return connection.execute(
+            "SELECT status FROM enrich_jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()[0]
+
+
+def test_submit_claim_finish(tmp_path):
+    queue = _queue(tmp_path)
+    job_id = queue._submit(REQUEST, "interactive")
+    assert queue._get(job_id)["status"] == QUEUED
+
+    claimed_id, priority, request, _ = queue._claim()
+    assert (claimed_id, priority, request) == (job_id, 0, REQUEST)
+    assert queue._get(job_id)["status"] == RUNNING
+    # Взятое задание с действующей арендой второй раз не выдается
+    assert queue._claim() is None
+
+    queue._finish(job_id, result={"form": 1})
+    job = queue._get(job_id)
+    assert job["status"] == DONE
+    assert job["result"] == {"form": 1}
+
+
+def test_failed_job_keeps_error(tmp_path):
+    queue = _queue(tmp_path)
+    job_id = queue._submit(REQUEST, "bulk")
+    queue._claim()
+    queue._finish(job_id, error="шлюз недоступен")
+    job = queue._get(job_id)
+    assert job["status"] == FAILED
+    assert job["error"] == "шлюз недоступен"
+    assert job["priority"] == "bulk"
+
+
+def test_expired_lease_is_claimed_again(tmp_path):
+    queue = _queue(tmp_path, lease_seconds=0.05)
+    job_id = queue._submit(REQUEST, "interactive")
+    assert queue._claim()[0] == job_id
+    assert queue._claim() is None
+
+    # Воркер «упал» и не записал итог: по истечении аренды задание берется снова
+    time.sleep(0.1)
+    assert queue._claim()[0] == job_id
+
+
+def test_job_is_failed_after_max_attempts(tmp_path):
+    queue = _queue(tmp_path, lease_seconds=0.01, max_attempts=2)
+    job_id = queue._submit(REQUEST, "interactive")
+    for _ in range(2):
+        assert queue._claim()[0] == job_id
+        time.sleep(0.02)
+
+    assert queue._claim() is None
+    job = queue._get(job_id)
+    assert job["status"] == FAILED
+    assert "попыток" in job["error"]
+    assert queue._claim() is None
+
+
+def test_interactive_jobs_are_claimed_before_bulk(tmp_path):
+    queue = _queue(tmp_path)
+    bulk = [queue._submit(REQUEST, "bulk") for _ in range(2)]
+    interactive = [queue._submit(REQUEST, "interactive") for _ in range(2)]
+
+    claimed = [queue._claim()[0] for _ in range(4)]
+    # Сначала интерактивные, внутри класса — в порядке постановки
+    assert claimed == interactive + bulk
+
+
+def test_expired_results_are_purged(tmp_path):
+    queue = _queue(tmp_path, result_ttl=0.05)
+    job_id = queue._submit(REQUEST, "interactive")
+    queue._claim()
+    queue._finish(job_id, result={})
+    time.sleep(0.1)
+    assert queue._get(job_id) is None
+    assert queue._purge_expired() == 1
+
+
+class _FlakyQueue:
+    """Очередь, чтение которой сначала падает с ошибкой базы, затем выдает задание."""
+
+    result_ttl = 60
+
+    def __init__(self):
+        self.claims = 0
+
+    async def claim(self):
+        self.claims += 1
+        if self.claims == 1:
+            raise sqlite3.OperationalError("database is locked")
+        if self.claims == 2:
+            return "job-1", 0, REQUEST, time.time()
+        return None
+
+    async def purge_expired(self) -> int:
+        raise sqlite3.DatabaseError("database disk image is malformed")
+
+
+def test_worker_survives_database_errors():
+    queue = _FlakyQueue()
+    workers = EnrichmentJobWorkers(queue, FastAPI(), concurrency=1, poll_interval=0.01)
+    runs = []
+
+    async def run_job(job_id, *args):
+        runs.append(job_id)
+        raise sqlite3.OperationalError("database is locked")
+
+    workers._run = run_job
+
+    async def run():
+        workers.start()
+        await asyncio.sleep(0.1)
+        alive = [not task.done() for task in workers._tasks]
+        await workers.stop()
+        return alive
+
+    assert asyncio.run(run()) == [True, True]
+    assert runs == ["job-1"]
+    assert queue.claims > 2
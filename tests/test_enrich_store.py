@@ -0,0 +1,140 @@
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.service.extension.enrich_store import (
+    FINGERPRINT_FIELDS,
+    EnrichmentStore,
+    started_data_fingerprint,
+)
+
+STARTED = {
+    "EvnPS_id": "200",
+    "Person_id": "100",
+    "EvnPS_setDate": "03.03.2025",
+    "EvnPS_disDate": "14.03.2025",
+    "EvnPS_NumCard": "123 2025",
+    "LpuSection_Name": "Неврологическое отделение ММЦ",
+    "Person_Birthday": "01.01.1970",
+    "_division_internal_cid": "3010101000000467",
+}
+RESULT = {"input[name='Enp']": "5100000000000001", "medical_service_data": []}
+
+
+def _store(tmp_path, max_age_seconds: float = 3600) -> EnrichmentStore:
+    return EnrichmentStore(
+        str(tmp_path / "enrich.sqlite3"), max_age_seconds=max_age_seconds
+    )
+
+
+def _rows(store: EnrichmentStore) -> int:
+    with store._connection() as connection:
+        return connection.execute("SELECT COUNT(*) FROM enrichment").fetchone()[0]
+
+
+def test_stored_result_is_returned_for_same_fingerprint(tmp_path):
+    store = _store(tmp_path)
+    fingerprint = started_data_fingerprint(STARTED)
+
+    async def run():
+        await store.put("200", fingerprint, RESULT)
+        return await store.get("200", fingerprint)
+
+    assert asyncio.run(run()) == RESULT
+
+
+@pytest.mark.parametrize("field", FINGERPRINT_FIELDS)
+def test_changed_fingerprint_field_invalidates_entry(tmp_path, field):
+    store = _store(tmp_path)
+    changed = {**STARTED, field: "изменено"}
+    assert started_data_fingerprint(changed) != started_data_fingerprint(STARTED)
+
+    async def run():
+        await store.put("200", started_data_fingerprint(STARTED), RESULT)
+        return await store.get("200", started_data_fingerprint(changed))
+
+    assert asyncio.run(run()) is None
+    # Устаревшая запись удаляется, а не копится
+    assert _rows(store) == 0
+
+
+def test_other_fields_do_not_change_fingerprint():
+    assert started_data_fingerprint(
+        {**STARTED, "Person_Surname": "ИВАНОВ"}
+    ) == started_data_fingerprint(STARTED)
+
+
+def test_entry_expires_after_max_age(tmp_path):
+    store = _store(tmp_path, max_age_seconds=60)
+    fingerprint = started_data_fingerprint(STARTED)
+
+    async def run():
+        await store.put("200", fingerprint, RESULT)
+        fresh = await store.get("200", fingerprint)
+        with store._connection() as connection:
+            connection.execute("UPDATE enrichment SET created_at = created_at - 61")
+        return fresh, await store.get("200", fingerprint)
+
+    assert asyncio.run(run()) == (RESULT, None)
+    assert _rows(store) == 0
+
+
+def test_corrupted_database_degrades_to_miss(tmp_path):
+    path = tmp_path / "enrich.sqlite3"
+    path.write_bytes(b"this is not a database" * 100)
+    store = EnrichmentStore(str(path), max_age_seconds=3600)
+
+    async def run():
+        await store.put("200", "fp", RESULT)
+        return await store.get("200", "fp")
+
+    assert asyncio.run(run()) is None
+
+
+def test_corrupted_payload_degrades_to_miss(tmp_path):
+    store = _store(tmp_path)
+    with store._connection() as connection:
+        connection.execute(
+            "INSERT INTO enrichment VALUES ('200', 'fp', X'00ff', strftime('%s', 'now'))"
+        )
+
+    assert asyncio.run(store.get("200", "fp")) is None
+
+
+def test_locked_database_degrades_to_miss(tmp_path, monkeypatch):
+    store = _store(tmp_path)
+    asyncio.run(store.put("200", "fp", RESULT))
+    connect = sqlite3.connect
+    # Ожидание блокировки сокращено, чтобы тест не ждал штатные 5 с
+    monkeypatch.setattr(
+        sqlite3, "connect", lambda path, timeout: connect(path, timeout=0.05)
+    )
+
+    holder = connect(store.path, isolation_level=None)
+    holder.execute("BEGIN EXCLUSIVE")
+    try:
+
+        async def run():
+            # Запись не проходит, но и не роняет обогащение
+            await store.put("201", "fp", RESULT)
+            # Устаревшую запись удалить нельзя — промах; чтение в WAL блокировкой не мешает
+            return await store.get("200", "other"), await store.get("200", "fp")
+
+        assert asyncio.run(run()) == (None, RESULT)
+    finally:
+        holder.execute("ROLLBACK")
+        holder.close()
+    assert asyncio.run(store.get("201", "fp")) is None
+
+
+def test_concurrent_first_connections_initialize_once(tmp_path):
+    store = _store(tmp_path)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(
+            executor.map(lambda n: store._put(str(n), "fp", RESULT), range(16))
+        )
+
+    assert results == [None] * 16
+    assert _rows(store) == 16
@@ -0,0 +1,103 @@
+import gzip
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.core import etag
+from app.core.etag import etag_json_response, etag_matches
+
+SMALL = {"items": [1, 2, 3]}
+LARGE = {
+    "items": [{"EvnPS_id": str(n), "Person_Surname": "ИВАНОВ"} for n in range(200)]
+}
+
+
+@pytest.fixture
+def http(monkeypatch):
+    monkeypatch.setattr(etag.settings, "RESPONSE_COMPRESSION_MIN_SIZE", 1024)
+    app = FastAPI()
+
+    @app.get("/small")
+    async def small(request: Request):
+        return etag_json_response(request, SMALL, headers={"X-Search-Window": "1=14d"})
+
+    @app.get("/large")
+    async def large(request: Request):
+        return etag_json_response(request, LARGE)
+
+    with TestClient(app) as client:
+        yield client
+
+
+def test_matching_if_none_match_returns_304(http):
+    first = http.get("/small", headers={"Accept-Encoding": "identity"})
+    assert first.status_code == 200
+    assert first.json() == SMALL
+    assert first.headers["X-Search-Window"] == "1=14d"
+
+    again = http.get(
+        "/small",
+        headers={"Accept-Encoding": "identity", "If-None-Match": first.headers["ETag"]},
+    )
+    assert again.status_code == 304
+    assert again.content == b""
+    # Заголовки представления отдаются и с 304
+    assert again.headers["ETag"] == first.headers["ETag"]
+    assert again.headers["X-Search-Window"] == "1=14d"
+
+    other = http.get(
+        "/small", headers={"Accept-Encoding": "identity", "If-None-Match": '"other"'}
+    )
+    assert other.status_code == 200
+
+
+def test_small_body_is_not_compressed(http):
+    response = http.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers
+    assert not response.headers["ETag"].endswith('-gzip"')
+
+
+def test_large_body_is_compressed_with_own_etag(http):
+    plain = http.get("/large", headers={"Accept-Encoding": "identity"})
+    compressed = http.get("/large", headers={"Accept-Encoding": "gzip"})
+
+    assert "Content-Encoding" not in plain.headers
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert compressed.headers["Vary"] == "Accept-Encoding"
+    assert compressed.json() == plain.json() == LARGE
+    # У сжатого представления свой ETag: кэш клиента не перепутает их
+    assert compressed.headers["ETag"] == plain.headers["ETag"][:-1] + '-gzip"'
+
+    revalidated = http.get(
+        "/large",
+        headers={
+            "Accept-Encoding": "gzip",
+            "If-None-Match": compressed.headers["ETag"],
+        },
+    )
+    assert revalidated.status_code == 304
+    # ETag несжатого представления для сжатого ответа не подходит
+    mismatched = http.get(
+        "/large",
+        headers={"Accept-Encoding": "gzip", "If-None-Match": plain.headers["ETag"]},
+    )
+    assert mismatched.status_code == 200
+
+
+def test_compressed_body_is_gzip(http):
+    with http.stream("GET", "/large", headers={"Accept-Encoding": "gzip"}) as response:
+        raw = b"".join(response.iter_raw())
+    assert gzip.decompress(raw) == etag.json_codec.dumps(LARGE)
+
+
+def test_refused_encoding_is_not_used(http):
+    response = http.get("/large", headers={"Accept-Encoding": "gzip;q=0, identity"})
+    assert "Content-Encoding" not in response.headers
+
+
+def test_etag_matches_lists_weak_tags_and_wildcard():
+    assert etag_matches('"a", W/"b"', '"b"')
+    assert etag_matches("*", '"c"')
+    assert not etag_matches('"a"', '"b"')
+    assert not etag_matches(None, '"b"')
@@ -0,0 +1,162 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+from app.core import dependencies, fairness
+from app.core.fairness import (
+    ClientRateLimiter,
+    FairScheduler,
+    client_kind,
+    identify_client,
+)
+from app.core.metrics import CLIENT_THROTTLED
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+def _request(headers: dict[str, str], host: str = "10.0.0.5") -> Request:
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": "/extension/search",
+            "headers": [
+                (name.lower().encode(), value.encode())
+                for name, value in headers.items()
+            ],
+            "client": (host, 50000),
+        }
+    )
+
+
+def test_identify_client_prefers_key_then_extension_then_ip():
+    by_key = identify_client(
+        _request({"X-API-KEY": "secret", "Origin": "chrome-extension://abc"})
+    )
+    assert by_key.startswith("key:") and "secret" not in by_key
+    assert (
+        identify_client(_request({"Origin": "chrome-extension://abcdef"}))
+        == "ext:abcdef"
+    )
+    assert (
+        identify_client(_request({"X-Forwarded-For": "192.0.2.1, 10.0.0.1"}))
+        == "ip:192.0.2.1"
+    )
+    assert identify_client(_request({})) == "ip:10.0.0.5"
+
+
+def test_client_kind_is_bounded_label():
+    assert client_kind("key:0123456789ab") == "key"
+    assert client_kind("ext:abcdef") == "ext"
+    assert client_kind("ip:192.0.2.1") == "ip"
+    assert client_kind("jobs:bulk") == "jobs"
+    assert client_kind("system") == "system"
+
+
+def test_rate_limiter_refills_tokens(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(
+        fairness,
+        "time",
+        SimpleNamespace(monotonic=clock.monotonic, perf_counter=time.perf_counter),
+    )
+    limiter = ClientRateLimiter(rate=2, burst=3)
+
+    assert [limiter.acquire("a") for _ in range(3)] == [0, 0, 0]
+    assert limiter.acquire("a") == 0.5
+    # Другой клиент расходует свой бакет
+    assert limiter.acquire("b") == 0
+
+    clock.now += 0.5
+    assert limiter.acquire("a") == 0
+    assert limiter.acquire("a") > 0
+    # Бакет пополняется не больше чем до burst
+    clock.now += 60
+    assert [limiter.acquire("a") for _ in range(4)][-1] > 0
+
+
+def test_rate_limiter_forgets_oldest_clients():
+    limiter = ClientRateLimiter(rate=1, burst=1, max_clients=2)
+    for client in ("a", "b", "c"):
+        limiter.acquire(client)
+    assert list(limiter._buckets) == ["b", "c"]
+
+
+def test_throttled_client_gets_429(monkeypatch):
+    monkeypatch.setattr(
+        dependencies, "rate_limiter", ClientRateLimiter(rate=0.5, burst=2)
+    )
+    app = FastAPI()
+
+    @app.get("/extension/ping")
+    async def ping(client: str = Depends(dependencies.limit_client)):
+        return {"client": client}
+
+    throttled = CLIENT_THROTTLED.labels(client_kind="ext")
+    before = throttled._value.get()
+    with TestClient(app) as http:
+        headers = {"Origin": "chrome-extension://operator"}
+        answers = [http.get("/extension/ping", headers=headers) for _ in range(3)]
+        other = http.get(
+            "/extension/ping", headers={"Origin": "chrome-extension://other"}
+        )
+
+    assert [answer.status_code for answer in answers] == [200, 200, 429]
+    assert answers[0].json() == {"client": "ext:operator"}
+    assert answers[2].headers["Retry-After"] == "2"
+    assert other.status_code == 200
+    assert throttled._value.get() == before + 1
+
+
+def test_fair_scheduler_serves_waiting_clients_round_robin():
+    scheduler = FairScheduler(slots=1)
+    order = []
+
+    async def call(client: str):
+        await scheduler.acquire(client)
+        order.append(client)
+        await asyncio.sleep(0)
+        scheduler.release()
+
+    async def run():
+        await scheduler.acquire("holder")
+        # Клиент a поставил в очередь серию вызовов раньше b и c
+        tasks = [
+            asyncio.create_task(call(client)) for client in ("a", "a", "a", "b", "c")
+        ]
+        await asyncio.sleep(0)
+        assert scheduler.waiting == 5
+        scheduler.release()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert order == ["a", "b", "c", "a", "a"]
+    assert scheduler.in_use == 0
+
+
+def test_fair_scheduler_timeout_leaves_queue():
+    scheduler = FairScheduler(slots=1)
+
+    async def run():
+        await scheduler.acquire("holder")
+        try:
+            await scheduler.acquire("a", timeout=0.01)
+        except TimeoutError:
+            pass
+        else:
+            raise AssertionError("слот не должен был освободиться")
+        assert scheduler.waiting == 0
+        scheduler.release()
+
+    asyncio.run(run())
+    assert scheduler.in_use == 0
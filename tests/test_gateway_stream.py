@@ -0,0 +1,76 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.core import deadline_scope
+from app.core.deadline import DeadlineExceeded
+from app.core.fairness import gateway_scheduler
+from app.service.gateway.gateway_service import GatewayService
+
+PAYLOAD = {
+    "params": {"c": "Search", "m": "searchData"},
+    "data": {"Person_Surname": "Иванов"},
+}
+
+
+class _SlowBody(httpx.AsyncByteStream):
+    def __init__(self, chunks: list[bytes], delay: float):
+        self.chunks = chunks
+        self.delay = delay
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            await asyncio.sleep(self.delay)
+            yield chunk
+
+
+def _service(chunks: list[bytes], delay: float = 0.0) -> GatewayService:
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, stream=_SlowBody(chunks, delay))
+
+    client = httpx.AsyncClient(
+        transport=httpx.MockTransport(handler), base_url="http://gateway.test"
+    )
+    return GatewayService(client=client)
+
+
+async def _collect(service: GatewayService) -> list:
+    return [item async for item in service.stream_items(method="post", json=PAYLOAD)]
+
+
+def test_stream_items_yields_rows_and_releases_slot():
+    service = _service([b'{"data": [{"a": 1},', b' {"a": 2}]}'])
+    assert asyncio.run(_collect(service)) == [{"a": 1}, {"a": 2}]
+    assert gateway_scheduler.in_use == 0
+
+
+def test_stream_items_stops_at_deadline():
+    service = _service([b'{"data": ['] + [b'{"a": 1},'] * 20 + [b"{}]}"], delay=0.05)
+
+    async def run():
+        with deadline_scope(0.2):
+            await _collect(service)
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(run())
+    assert gateway_scheduler.in_use == 0
+
+
+def test_stream_items_waits_for_fair_slot_within_deadline():
+    service = _service([b'{"data": []}'])
+
+    async def run():
+        # Все слоты заняты другим клиентом: ожидание слота расходует бюджет запроса
+        for _ in range(gateway_scheduler.slots):
+            await gateway_scheduler.acquire("other")
+        try:
+            with deadline_scope(0.1):
+                await _collect(service)
+        finally:
+            for _ in range(gateway_scheduler.slots):
+                gateway_scheduler.release()
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(run())
+    assert gateway_scheduler.in_use == 0
@@ -0,0 +1,89 @@
+import asyncio
+import os
+from datetime import date, timedelta
+
+import pytest
+
+from app.service.extension import indexer
+from app.service.extension.indexer import (
+    IndexBuilderLock,
+    load_search_index_snapshot,
+    read_snapshot,
+    refresh_search_index,
+    write_snapshot,
+)
+from app.service.extension.search_index import HospitalizationIndex
+
+ROWS = [{"EvnPS_id": "1", "Person_Surname": "Иванов", "EvnPS_disDate": "14.03.2025"}]
+
+
+@pytest.fixture
+def index(monkeypatch):
+    index = HospitalizationIndex()
+    monkeypatch.setattr(indexer, "search_index", index)
+    return index
+
+
+@pytest.mark.skipif(indexer.fcntl is None, reason="flock недоступен")
+def test_only_one_worker_builds_index(tmp_path):
+    path = tmp_path / "search_index.json.z.lock"
+    builder, other = IndexBuilderLock(path), IndexBuilderLock(path)
+
+    assert builder.acquire()
+    assert builder.acquire()
+    assert not other.acquire()
+    # Построитель ушел — его место занимает следующий воркер
+    builder.release()
+    assert other.acquire()
+    other.release()
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = tmp_path / "search_index.json.z"
+    window = (date(2025, 2, 12), date(2025, 3, 14))
+    write_snapshot(path, ROWS, window)
+    assert read_snapshot(path) == (ROWS, window)
+    assert not (tmp_path / "search_index.json.z.tmp").exists()
+
+
+def test_follower_loads_only_newer_snapshot(tmp_path, index):
+    path = tmp_path / "search_index.json.z"
+
+    async def run():
+        missing = await load_search_index_snapshot(path, None)
+        write_snapshot(path, ROWS, (date(2025, 2, 12), date(2025, 3, 14)))
+        loaded = await load_search_index_snapshot(path, None)
+        index.replace([], index.window)
+        unchanged = await load_search_index_snapshot(path, loaded)
+        return missing, loaded, unchanged
+
+    missing, loaded, unchanged = asyncio.run(run())
+    assert missing is None
+    assert loaded == os.stat(path).st_mtime
+    # Снимок не менялся — индекс не перезагружается
+    assert unchanged == loaded
+    assert len(index) == 0
+
+
+def test_builder_writes_snapshot_for_followers(tmp_path, index, monkeypatch):
+    calls = []
+
+    async def fetch(cid, query, date_range, gateway_service):
+        calls.append(cid)
+        return [{**ROWS[0], "EvnPS_id": cid}]
+
+    monkeypatch.setattr(indexer, "fetch_data_for_building", fetch)
+    path = tmp_path / "search_index.json.z"
+    assert asyncio.run(refresh_search_index(None, path))
+
+    rows, window = read_snapshot(path)
+    assert sorted(row["EvnPS_id"] for row in rows) == sorted(calls)
+    assert window == (
+        date.today() - timedelta(days=indexer.settings.SEARCH_INDEX_WINDOW_DAYS),
+        date.today(),
+    )
+
+    follower = HospitalizationIndex()
+    monkeypatch.setattr(indexer, "search_index", follower)
+    asyncio.run(load_search_index_snapshot(path, None))
+    assert len(follower) == len(index) == len(calls)
@@ -0,0 +1,86 @@
+import asyncio
+import json
+
+import pytest
+
+from app.core.json_stream import JSONArrayStreamParser, iter_json_array
+
+
+def _feed_all(parser: JSONArrayStreamParser, chunks: list[bytes]) -> list:
+    items = []
+    for chunk in chunks:
+        items.extend(parser.feed(chunk))
+    return items
+
+
+def test_number_split_at_decimal_point():
+    parser = JSONArrayStreamParser()
+    assert parser.feed(b'{"data":[1.') == []
+    assert parser.feed(b"5, 2]}") == [1.5, 2]
+    assert parser.done
+
+
+@pytest.mark.parametrize(
+    "items",
+    [
+        [1.5, -2e3, 12345, 0],
+        [True, False, None],
+        ["a,]", {"x": [1, 2]}, [3], 7],
+    ],
+)
+def test_scalars_survive_every_chunk_split(items):
+    body = json.dumps({"data": items}).encode()
+    for cut in range(1, len(body)):
+        for second_cut in range(cut, len(body)):
+            parser = JSONArrayStreamParser()
+            chunks = [body[:cut], body[cut:second_cut], body[second_cut:]]
+            assert _feed_all(parser, chunks) == items, chunks
+            assert parser.done
+
+
+def test_bare_array_and_missing_key():
+    parser = JSONArrayStreamParser()
+    assert _feed_all(parser, [b" [1, ", b'{"a": 2}]']) == [1, {"a": 2}]
+
+    parser = JSONArrayStreamParser()
+    assert _feed_all(parser, [b'{"error": "x"}']) == []
+    assert not parser.found
+
+
+async def _chunks(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+
+def _iterate(*chunks: bytes) -> list:
+    async def run():
+        return [item async for item in iter_json_array(_chunks(*chunks))]
+
+    return asyncio.run(run())
+
+
+def test_iter_json_array_reads_complete_array():
+    assert _iterate(b'{"data":[{"a":1},', b'{"a":2}]}') == [{"a": 1}, {"a": 2}]
+    assert _iterate(b'{"data": []}') == []
+
+
+@pytest.mark.parametrize(
+    "chunks",
+    [
+        [b'{"data":[{"a":1},{"a":2'],
+        [b'{"data":[{"a":1},', b'{"a":2},'],
+        [b'{"data":['],
+        [b"[1, 2"],
+    ],
+)
+def test_iter_json_array_rejects_truncated_array(chunks):
+    with pytest.raises(ValueError, match="оборвался"):
+        _iterate(*chunks)
+
+
+@pytest.mark.parametrize(
+    "body", [b"<html>502 Bad Gateway</html>", b'{"error": "x"}', b""]
+)
+def test_iter_json_array_rejects_body_without_array(body):
+    with pytest.raises(ValueError, match="нет массива"):
+        _iterate(body)
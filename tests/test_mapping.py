@@ -0,0 +1,198 @@
+"""
+Золотые тесты этапа сопоставления: map_case должен давать ту же форму, что прежняя
+асинхронная сборка (_build_enriched_data на get_*-помощниках из utils.py до переноса
+сопоставления в mapping.py). Ожидаемые формы в golden/mapping_cases.json получены прогоном
+прежнего кода на тех же записях.
+"""
+
+import copy
+import json
+from pathlib import Path
+
+import pytest
+
+from app.service.extension.mapping import CaseRecords, map_case, map_discharge_summary
+
+GOLDEN = json.loads(
+    (Path(__file__).parent / "golden" / "mapping_cases.json").read_text(
+        encoding="utf-8"
+    )
+)
+
+_SURGERY_SUMMARY = {
+    "pure": {"item_145": "Операция: грыжесечение", "item_146": "Выписан"}
+}
+
+CASES = {
+    "neurology_inpatient_outcome_corrected": {
+        "started_data": {
+            "Person_id": "100",
+            "EvnPS_id": "200",
+            "LpuSection_Name": "Неврологическое отделение ММЦ",
+            "Person_Birthday": "01.01.1970",
+            "EvnPS_setDate": "03.03.2025",
+            "EvnPS_disDate": "14.03.2025",
+            "EvnPS_NumCard": "123 2025",
+            "_division_internal_cid": "3010101000000467",
+        },
+        "person_data": {"Person_EdNum": "5100000000000001", "Sex_Name": "Мужской"},
+        "movement_data": {
+            "Diag_Code": "M51.1",
+            "LpuSectionBedProfile_Name": "неврологические",
+            "LpuSectionProfile_Name": "неврологии",
+            "LeaveType_Code": "101",
+        },
+        "referred_data": {"PrehospDirect_id": "1", "PrehospType_id": "2"},
+        "disease_data": {"ResultDesease_id": "3010101000000040", "DeseaseType_id": "3"},
+        "medical_service_data": [],
+        "discharge_summary": {"pure": {"item_145": None, "item_146": "Улучшение"}},
+        "additional_diagnosis": [{"diagnosis": "E11.9"}],
+        "referred_org_name": None,
+    },
+    "surgery_other_mo_with_operations": {
+        "started_data": {
+            "Person_id": "101",
+            "EvnPS_id": "201",
+            "LpuSection_Name": "Хирургическое отделение №1 стационар ММЦ",
+            "Person_Birthday": "12.05.1980",
+            "EvnPS_setDate": "05.03.2025",
+            "EvnPS_disDate": "10.03.2025",
+            "EvnPS_NumCard": "77 2025",
+            "_division_internal_cid": "3010101000000471",
+        },
+        "person_data": {"Person_EdNum": "5100000000000002", "Sex_Name": "Женский"},
+        "movement_data": {
+            "Diag_Code": "K40.9",
+            "LpuSectionBedProfile_Name": "хирургические",
+            "LpuSectionProfile_Name": "хирургии",
+            "LeaveType_Code": "101",
+        },
+        "referred_data": {
+            "PrehospDirect_id": "2",
+            "Org_did": "7",
+            "PrehospType_id": "1",
+        },
+        "disease_data": {"ResultDesease_id": "3010101000000048", "DeseaseType_id": "1"},
+        "medical_service_data": [
+            {"Usluga_Code": "A16.30.001", "Usluga_Name": "Грыжесечение"}
+        ],
+        "discharge_summary": _SURGERY_SUMMARY,
+        "additional_diagnosis": None,
+        "referred_org_name": "ЧУЗ РЖД-Медицина г. Кандалакша",
+    },
+    "day_hospital_profile_correction": {
+        "started_data": {
+            "Person_id": "102",
+            "EvnPS_id": "202",
+            "LpuSection_Name": "ДС хирургического профиля",
+            "Person_Birthday": "30.11.1991",
+            "EvnPS_setDate": "07.03.2025",
+            "EvnPS_disDate": "07.03.2025",
+            "EvnPS_NumCard": "5",
+            "_division_internal_cid": "3010101000000469",
+        },
+        "person_data": {"Person_EdNum": "5100000000000003", "Sex_Name": "Мужской"},
+        "movement_data": {
+            "Diag_Code": "J34.2",
+            "LpuSectionBedProfile_Name": "хирургические",
+            "LpuSectionProfile_Name": "хирургии",
+            "LeaveType_Code": "201",
+        },
+        "referred_data": {
+            "PrehospDirect_id": "2",
+            "Org_did": "8",
+            "PrehospType_id": "3",
+        },
+        "disease_data": {"ResultDesease_id": "3010101000000043", "DeseaseType_id": "2"},
+        "medical_service_data": [],
+        "discharge_summary": None,
+        "additional_diagnosis": [],
+        "referred_org_name": "Неизвестная организация",
+    },
+    "eko_unknown_division": {
+        "started_data": {
+            "Person_id": "103",
+            "EvnPS_id": "203",
+            "LpuSection_Name": "ЭКО-ВРТ ММЦ",
+            "Person_Birthday": "02.02.1988",
+            "EvnPS_setDate": "09.03.2025",
+            "EvnPS_NumCard": "9 2025",
+            "_division_internal_cid": "999",
+        },
+        "person_data": {},
+        "movement_data": {
+            "Diag_Code": "N97.9",
+            "LpuSectionProfile_Name": "акушерству и гинекологии",
+        },
+        "referred_data": {},
+        "disease_data": {},
+        "medical_service_data": [],
+        "discharge_summary": {"pure": {}},
+        "additional_diagnosis": None,
+        "referred_org_name": None,
+    },
+    "rehabilitation_bed_correction": {
+        "started_data": {
+            "Person_id": "104",
+            "EvnPS_id": "204",
+            "LpuSection_Name": "Отделение реабилитации и восстановительного лечения ММЦ",
+            "Person_Birthday": "15.07.1955",
+            "EvnPS_setDate": "11.03.2025",
+            "EvnPS_disDate": "25.03.2025",
+            "EvnPS_NumCard": "311 2025",
+            "_division_internal_cid": "3010101000000467",
+        },
+        "person_data": {"Person_EdNum": "5100000000000005", "Sex_Name": "Женский"},
+        "movement_data": {
+            "Diag_Code": "I69.3",
+            "LpuSectionBedProfile_Name": "реабилитационные соматические",
+            "LpuSectionProfile_Name": "медицинской реабилитации",
+            "LeaveType_Code": "102",
+        },
+        "referred_data": {"PrehospDirect_id": "1", "PrehospType_id": "2"},
+        "disease_data": {"ResultDesease_id": "3010101000000037", "DeseaseType_id": "3"},
+        "medical_service_data": [],
+        "discharge_summary": {"pure": {"item_145": None}},
+        "additional_diagnosis": None,
+        "referred_org_name": None,
+    },
+}
+
+
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_map_case_matches_baseline(name):
+    form = map_case(CaseRecords(**copy.deepcopy(CASES[name])))
+    # Сравнение через JSON: так форма уходит клиенту
+    assert json.loads(json.dumps(form, ensure_ascii=False)) == GOLDEN[name]
+
+
+def test_golden_covers_all_cases():
+    assert sorted(GOLDEN) == sorted(CASES)
+
+
+def test_discharge_summary_drops_operations_only_with_services():
+    summary = {"pure": {"item_145": "Операция", "item_146": "Выписан"}}
+    assert map_discharge_summary(summary, []) == {
+        "item_145": "Операция",
+        "item_146": "Выписан",
+    }
+    assert map_discharge_summary(summary, [{"Usluga_Code": "A1"}]) == {
+        "item_145": None,
+        "item_146": "Выписан",
+    }
+    # Исходная запись не меняется: эпикриз может быть взят из кэша шлюза
+    assert summary["pure"]["item_145"] == "Операция"
+
+
+def test_discharge_summary_without_record():
+    assert map_discharge_summary(None, []) == {}
+    assert map_discharge_summary(None, [{"Usluga_Code": "A1"}]) == {"item_145": None}
+    # Прежняя сборка падала здесь с TypeError; теперь пустой раздел просто пропускается
+    assert map_discharge_summary({"pure": None}, [{"Usluga_Code": "A1"}]) is None
+
+
+def test_case_records_defaults_are_not_shared():
+    first = CaseRecords(started_data={})
+    second = CaseRecords(started_data={})
+    assert first.person_data is None and first.medical_service_data is None
+    assert map_case(first) == map_case(second)
@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from app.model import ExtensionStartedData
+from app.service.extension import pagination
+
+
+def _rows(*ids: str) -> list[dict]:
+    return [
+        {
+            "EvnPS_id": event_id,
+            "EvnPS_disDate": "14.03.2025",
+            "_division_internal_cid": "1",
+        }
+        for event_id in ids
+    ]
+
+
+class _Search:
+    """Подставной полный поиск: отдает текущий снимок результата и считает вызовы."""
+
+    def __init__(self, rows: list[dict]):
+        self.rows = rows
+        self.calls = 0
+
+    async def __call__(self, patient, gateway_service):
+        self.calls += 1
+        return list(self.rows)
+
+
+@pytest.fixture
+def search(monkeypatch):
+    search = _Search(_rows("1", "2", "3", "4", "5"))
+    monkeypatch.setattr(pagination, "fetch_started_data", search)
+    pagination._cursor_cache.clear()
+    yield search
+    pagination._cursor_cache.clear()
+
+
+def _page(last_name: str = "Иванов", cursor: str | None = None) -> dict:
+    patient = ExtensionStartedData(last_name=last_name, limit=2, cursor=cursor)
+    return asyncio.run(pagination.fetch_started_data_page(patient, None))
+
+
+def _ids(page: dict) -> list[str]:
+    return [row["EvnPS_id"] for row in page["items"]]
+
+
+def test_cursor_walks_pages_from_cache(search):
+    first = _page()
+    second = _page(cursor=first["next_cursor"])
+    third = _page(cursor=second["next_cursor"])
+
+    assert [_ids(first), _ids(second), _ids(third)] == [["1", "2"], ["3", "4"], ["5"]]
+    assert third["next_cursor"] is None
+    assert search.calls == 1
+
+
+def test_same_query_and_snapshot_give_same_cursor(search):
+    first = _page()
+    pagination._cursor_cache.clear()
+    assert _page()["next_cursor"] == first["next_cursor"]
+
+
+def test_cursor_survives_cache_loss_when_result_unchanged(search):
+    cursor = _page()["next_cursor"]
+    # Курсор истек или запрос попал в другой воркер: поиск повторяется с тем же результатом
+    pagination._cursor_cache.clear()
+    assert _ids(_page(cursor=cursor)) == ["3", "4"]
+    assert search.calls == 2
+
+
+def test_cursor_is_rejected_for_other_query(search):
+    cursor = _page()["next_cursor"]
+    with pytest.raises(ValueError, match="другому поисковому запросу"):
+        _page(last_name="Петров", cursor=cursor)
+
+
+def test_cursor_is_rejected_after_result_changes(search):
+    cursor = _page()["next_cursor"]
+    pagination._cursor_cache.clear()
+    search.rows = _rows("0", "1", "2", "3", "4", "5")
+
+    with pytest.raises(ValueError, match="изменился"):
+        _page(cursor=cursor)
+    # Поиск заново начинается с первой страницы нового снимка
+    restarted = _page()
+    assert _ids(restarted) == ["0", "1"]
+    assert restarted["next_cursor"] != cursor
+
+
+def test_malformed_cursor_is_rejected(search):
+    with pytest.raises(ValueError, match="Некорректный курсор"):
+        _page(cursor="garbage")
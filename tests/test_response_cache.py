@@ -0,0 +1,191 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.service.gateway.response_cache import (
+    GatewayResponseCache,
+    revalidate_scope,
+    stale_scope,
+)
+
+METHOD = "Org.getOrgList"
+PAYLOAD = {"params": {"c": "Org", "m": "getOrgList"}, "data": {"Org_id": "7"}}
+
+
+class _Fetch:
+    """Подставной вызов шлюза: отдает очередной ответ или бросает ошибку, считает вызовы."""
+
+    def __init__(self, *outcomes, delay: float = 0.0):
+        self.outcomes = list(outcomes)
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        outcome = self.outcomes.pop(0) if len(self.outcomes) > 1 else self.outcomes[0]
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+
+def _cache() -> GatewayResponseCache:
+    return GatewayResponseCache(
+        {METHOD: 10}, stale_while_revalidate=5, stale_if_error=100
+    )
+
+
+def _age(cache: GatewayResponseCache, seconds: float) -> None:
+    """Состаривает все записи кэша на seconds секунд."""
+    for key, entry in cache._entries.items():
+        cache._entries[key] = entry._replace(stored_at=entry.stored_at - seconds)
+
+
+def _unavailable() -> httpx.ConnectError:
+    return httpx.ConnectError("connection refused")
+
+
+def _status_error(status_code: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "http://gateway.test/api")
+    return httpx.HTTPStatusError(
+        "error", request=request, response=httpx.Response(status_code, request=request)
+    )
+
+
+def test_fresh_entry_is_served_without_fetch():
+    cache = _cache()
+    fetch = _Fetch({"v": 1})
+
+    async def run():
+        first = await cache.fetch(METHOD, PAYLOAD, fetch)
+        first["v"] = "изменен вызывающим"
+        return await cache.fetch(METHOD, PAYLOAD, fetch)
+
+    assert asyncio.run(run()) == {"v": 1}
+    assert fetch.calls == 1
+
+
+def test_stale_while_revalidate_serves_old_and_refreshes_once():
+    cache = _cache()
+
+    async def run():
+        await cache.fetch(METHOD, PAYLOAD, _Fetch({"v": 1}))
+        _age(cache, 12)
+        refresh = _Fetch({"v": 2}, delay=0.05)
+        with stale_scope() as stale:
+            # Параллельные запросы получают старую запись сразу, обновление в фоне — одно
+            served = await asyncio.gather(
+                *(cache.fetch(METHOD, PAYLOAD, refresh) for _ in range(5))
+            )
+        await asyncio.sleep(0.1)
+        return (
+            served,
+            refresh.calls,
+            stale,
+            await cache.fetch(METHOD, PAYLOAD, _Fetch(_unavailable())),
+        )
+
+    served, refresh_calls, stale, after = asyncio.run(run())
+    assert served == [{"v": 1}] * 5
+    assert refresh_calls == 1
+    # Окно stale-while-revalidate — обычная работа кэша, устаревшими такие ответы не считаются
+    assert stale == {}
+    assert after == {"v": 2}
+
+
+def test_failed_background_refresh_keeps_entry():
+    cache = _cache()
+
+    async def run():
+        await cache.fetch(METHOD, PAYLOAD, _Fetch({"v": 1}))
+        _age(cache, 12)
+        refresh = _Fetch(_unavailable())
+        served = await cache.fetch(METHOD, PAYLOAD, refresh)
+        await asyncio.sleep(0.01)
+        return served, refresh.calls, cache._refreshing
+
+    served, refresh_calls, refreshing = asyncio.run(run())
+    assert served == {"v": 1}
+    assert refresh_calls == 1
+    assert refreshing == {}
+    assert len(cache) == 1
+
+
+def test_stale_if_error_serves_old_entry_and_marks_it():
+    cache = _cache()
+
+    async def run():
+        await cache.fetch(METHOD, PAYLOAD, _Fetch({"v": 1}))
+        _age(cache, 50)
+        with stale_scope() as stale:
+            served = await cache.fetch(METHOD, PAYLOAD, _Fetch(_status_error(502)))
+        return served, stale
+
+    served, stale = asyncio.run(run())
+    assert served == {"v": 1}
+    assert list(stale) == [METHOD]
+    assert 50 <= stale[METHOD] < 51
+
+
+def test_client_error_is_not_hidden_by_stale_entry():
+    cache = _cache()
+
+    async def run():
+        await cache.fetch(METHOD, PAYLOAD, _Fetch({"v": 1}))
+        _age(cache, 50)
+        await cache.fetch(METHOD, PAYLOAD, _Fetch(_status_error(404)))
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(run())
+
+
+def test_entry_past_stale_if_error_is_dropped():
+    cache = _cache()
+
+    async def run():
+        await cache.fetch(METHOD, PAYLOAD, _Fetch({"v": 1}))
+        _age(cache, 200)
+        await cache.fetch(METHOD, PAYLOAD, _Fetch(_unavailable()))
+
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(run())
+    assert len(cache) == 0
+
+
+def test_revalidate_scope_bypasses_fresh_entry_but_keeps_fallback():
+    cache = _cache()
+
+    async def run():
+        await cache.fetch(METHOD, PAYLOAD, _Fetch({"v": 1}))
+        with revalidate_scope():
+            updated = await cache.fetch(METHOD, PAYLOAD, _Fetch({"v": 2}))
+            with stale_scope() as stale:
+                fallback = await cache.fetch(METHOD, PAYLOAD, _Fetch(_unavailable()))
+        return updated, fallback, stale
+
+    updated, fallback, stale = asyncio.run(run())
+    assert updated == {"v": 2}
+    assert fallback == {"v": 2}
+    assert list(stale) == [METHOD]
+
+
+def test_stale_marker_is_scoped_to_request():
+    cache = _cache()
+
+    async def request(stale_entry: bool):
+        with stale_scope() as stale:
+            await cache.fetch(
+                METHOD, PAYLOAD, _Fetch(_unavailable() if stale_entry else {"v": 2})
+            )
+        return stale
+
+    async def run():
+        await cache.fetch(METHOD, PAYLOAD, _Fetch({"v": 1}))
+        _age(cache, 50)
+        with revalidate_scope():
+            return await asyncio.gather(request(True), request(False))
+
+    failed, fresh = asyncio.run(run())
+    assert list(failed) == [METHOD]
+    assert fresh == {}
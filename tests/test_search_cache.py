@@ -0,0 +1,44 @@
+from app.service.extension.search_cache import SearchCache
+
+FULL_RANGE = "01.01.2025 - 31.03.2025"
+FEBRUARY = "01.02.2025 - 28.02.2025"
+
+
+def _row(event_id: str, admitted: str, discharged: str) -> dict:
+    return {
+        "EvnPS_id": event_id,
+        "EvnPS_setDate": admitted,
+        "EvnPS_disDate": discharged,
+    }
+
+
+def test_superset_is_filtered_by_discharge_date():
+    cache = SearchCache(ttl=60)
+    cache.set(
+        "Иванов",
+        "1",
+        FULL_RANGE,
+        [
+            _row("jan", "05.01.2025", "15.01.2025"),
+            _row("feb", "01.02.2025", "10.02.2025"),
+            _row("mar", "05.03.2025", "15.03.2025"),
+        ],
+    )
+    assert [row["EvnPS_id"] for row in cache.get("иванов", "1", FEBRUARY)] == ["feb"]
+
+
+def test_stay_spanning_range_end_skips_superset():
+    cache = SearchCache(ttl=60)
+    # Госпитализация началась в феврале, выписка в марте: движение могло закончиться в феврале,
+    # и шлюз по EvnSection_disDate_Range вернул бы ее за февраль
+    cache.set(
+        "Иванов",
+        "1",
+        FULL_RANGE,
+        [
+            _row("feb", "01.02.2025", "10.02.2025"),
+            _row("feb-mar", "20.02.2025", "05.03.2025"),
+        ],
+    )
+    assert cache.get("Иванов", "1", FEBRUARY) is None
+    assert len(cache.get("Иванов", "1", FULL_RANGE)) == 2
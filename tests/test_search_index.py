@@ -0,0 +1,42 @@
+from datetime import date, timedelta
+
+from app.service.extension.search_index import HospitalizationIndex
+
+
+def _index() -> HospitalizationIndex:
+    today = date.today()
+    index = HospitalizationIndex()
+    index.replace(
+        [
+            {
+                "EvnPS_id": "1",
+                "Person_Surname": "Иванов",
+                "EvnPS_disDate": (today - timedelta(days=3)).strftime("%d.%m.%Y"),
+                "_division_internal_cid": "10",
+            },
+        ],
+        (today - timedelta(days=30), today),
+    )
+    return index
+
+
+def _range(days_back: int) -> str:
+    today = date.today()
+    return f"{(today - timedelta(days=days_back)).strftime('%d.%m.%Y')} - {today.strftime('%d.%m.%Y')}"
+
+
+def test_range_inside_window_is_served_unmarked():
+    rows = _index().search("иванов", _range(10))
+    assert [row["EvnPS_id"] for row in rows] == ["1"]
+    assert "_search_window" not in rows[0]
+
+
+def test_range_wider_than_window_falls_back_to_gateway():
+    assert _index().search("Иванов", _range(400)) is None
+
+
+def test_partial_answer_is_marked_and_does_not_touch_index_rows():
+    index = _index()
+    rows = index.search("Иван", _range(400), mode="prefix", allow_partial=True)
+    assert rows[0]["_search_window"] == "index"
+    assert "_search_window" not in index.search("Иванов", _range(10))[0]